@@ -250,7 +250,7 @@ def holdem_cards_input_from_string(cards_string, flop_string, turn_string, river
 
     # TOOD: If we turn cards into canonical form, this is where we do it.
     # NOTE: Canonical means equivalent inputs map to same exact cards. Therefore, matters how many streets are available.
-    # NOTE: We port this from C++, so will pass and recieve as one long string. Also needed: first and last street.
+    # NOTE: Suit isomorphism from hand_isomorphism (via holdem_lib). Streets given are the rounds dealt.
     if use_canonical_form:
         #print('Calculating canonical form...')
         #print([hand_string(cards_array), hand_string(flop_array), hand_string(turn_array), hand_string(river_array)])
@@ -22,6 +22,8 @@ from poker_util import *
 # NOTE: For 200x counts... stdev is +-0.02 for some cases. So we can be way off w/r/t predictions... but averages out over many hands.
 # Noise is ok, and even 500x counts... really slows down the play. Even with caching. Maybe on a fast machine... 
 SIMULATE_ALLINS_COUNT = 200 # 500 # 200 # 1000 -- accurate, but takes too long. We should cache... since X vs Y lookup (for bet streets)
+# Stratified runouts (equal share for every turn card). ~35% less noise vs known hand on the flop. Only a little vs random hand.
+SIMULATE_ALLINS_SAMPLING = SAMPLING_STRATIFIED
 
 # Heuristics, to evaluate hand actions. On 0-1000 scale, where wheel is 1000 points, and bad hand is 50-100 points.
 # Meant to map to rough % of winning at showdown. Tuned for ring game, so random hand << 500.
@@ -38,7 +40,7 @@ class DeuceLowball(PayoutTable):
         return hand.deuce_heuristic
 
     # Compare hands.
-    # TODO: Hand split pots, other % payouts. Should really output [hand_id: % pot]
+    # NOTE: Returns None on ties. For split pots, see showdown_shares.
     def showdown(self, hands):
         #print('using DeuceLowball to compare hands')
         # As a hack... output hand with best (2-7) rank. Ties go to best position...
@@ -55,6 +57,14 @@ class DeuceLowball(PayoutTable):
                 #raise NotImplementedError()
         return best_hand
 
+    # Share of the pot for each hand [same order]. Best (2-7) hand wins, ties split evenly.
+    def showdown_shares(self, hands):
+        for hand in hands:
+            hand.evaluate()
+        best_rank = max([hand.rank for hand in hands])
+        num_winners = len([hand for hand in hands if hand.rank == best_rank])
+        return [(1.0 / num_winners if hand.rank == best_rank else 0.0) for hand in hands]
+
 # Return a string, encoding action for a round, or for a hand
 def encode_bets_string(actions, format='deuce'):
     if format=='nlh':
@@ -305,13 +315,12 @@ class PokerAction:
         self.running_average = running_average # NOTE: A step behind, but.... that's ok.
     
     # Simulate allin value vs random opponent hand. How good is our hand?
-    def simulate_allin_vs_oppn(self, num_samples = SIMULATE_ALLINS_COUNT, allin_cache=None):
+    def simulate_allin_vs_oppn(self, num_samples = SIMULATE_ALLINS_COUNT, allin_cache=None, rng=None):
         # Currently, allin values only implemented for some games
         if not(self.format == 'holdem' or self.format == 'nlh'):
             return
 
         # Create objects from current hand... 
-        # TODO: Allin simulation should be a library sub-routine...
         # Project community hand, if available. Can only evaluate if flop or more (otherwise, no 5 card hand)
         flop = []
         turn = []
@@ -334,7 +343,7 @@ class PokerAction:
         # If cache exists, look up cache, in case already computed.
         # NOTE: Category values not used. Will be []
         if allin_cache:
-            (allin_value, allin_stdev, category_values) = allin_cache.lookup(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river)
+            (allin_value, allin_stdev, category_values) = allin_cache.lookup(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, min_samples=num_samples)
             
             # If cache hit... just output and return.
             if allin_value != None:
@@ -347,43 +356,13 @@ class PokerAction:
                 return
 
 
-        # Information that's fixed in stone for simulation
-        all_dealt_cards = community.cards() + our_hand.dealt_cards + oppn_hand.dealt_cards
-        #print('removing %d dealt cards from the deck: %s' % (len(all_dealt_cards), hand_string(all_dealt_cards)))
-        hand_round = community.round
-
-        # Deck with remaining cards
-        deck = PokerDeck(shuffle=False)
-        for card in all_dealt_cards:
-            deck.remove_card(card)
-        #print('deck contains %d cards after removal' % len(deck.cards))
-
-        # Ok, now we're ready to deal to the end, record, return, shuffle, repeat X times
-        # TODO: This should be a library sub-routine
-        hand_results = []
-        for i in range(num_samples):
-            # NOTE: Clear oppn cards, if simulating allin vs random hand
-            community.rewind(deck=deck, round=hand_round)
-            deck.shuffle()
-            #print('deck now %d cards' % len(deck.cards))
-            community.deal(deck=deck,runway=True)
-            our_hand.evaluate()
-            oppn_hand.evaluate()
-            #print(our_hand)
-            #print(oppn_hand)
-            if our_hand.rank > oppn_hand.rank:
-                result = 0.0
-                #print('oppn wins')
-            elif our_hand.rank < oppn_hand.rank:
-                result = 1.0
-                #print('our hand wins')
-            else:
-                result = 0.5
-                #print('we ties')
-            hand_results.append(result)
+        # Deal to the end, num_samples times, and compare hands. All at once, with int arrays (see holdem_equity)
+        now = time.time()
+        equity = holdem_equity(our_hand.dealt_cards, community.cards(), oppn_cards=oppn_hand.dealt_cards, num_samples=num_samples,
+                               sampling=SIMULATE_ALLINS_SAMPLING, rng=rng)
 
-        allin_value = np.mean(hand_results)
-        allin_stdev = np.std(hand_results)
+        allin_value = equity.value
+        allin_stdev = equity.stdev
         allin_error = allin_stdev / np.sqrt(num_samples)
 
         # print('allin value [vs oppn] is %.4f +-%.4f (%.4f stdev)' % (allin_value, allin_error, allin_stdev))
@@ -393,16 +372,16 @@ class PokerAction:
 
         # If cache exists, update the cache
         if allin_cache:
-            allin_cache.insert(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, allin_value, allin_stdev)
+            allin_cache.insert(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, allin_value, allin_stdev,
+                              sample_count=equity.sample_size, exact=equity.exact, seconds=time.time() - now)
 
     # Simulate allin value vs random opponent hand. How good is our hand?
-    def simulate_allin_vs_random(self, num_samples = SIMULATE_ALLINS_COUNT, allin_cache=None):
+    def simulate_allin_vs_random(self, num_samples = SIMULATE_ALLINS_COUNT, allin_cache=None, rng=None):
         # Currently, allin values only implemented for some games
         if not(self.format == 'holdem' or self.format == 'nlh'):
             return
 
         # Create objects from current hand... 
-        # TODO: Allin simulation should be a library sub-routine...
         # Project community hand, if available. Can only evaluate if flop or more (otherwise, no 5 card hand)
         flop = []
         turn = []
@@ -423,7 +402,7 @@ class PokerAction:
 
         # If cache exists, look up cache, in case already computed.
         if allin_cache:
-            (allin_value, allin_stdev, category_values) = allin_cache.lookup(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river)
+            (allin_value, allin_stdev, category_values) = allin_cache.lookup(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, min_samples=num_samples)
             
             # If cache hit... just output and return.
             if allin_value != None:
@@ -435,51 +414,14 @@ class PokerAction:
                 self.category_values_vs_random = category_values
                 return
 
-        # Information that's fixed in stone for simulation
-        all_dealt_cards = community.cards() + our_hand.dealt_cards + oppn_hand.dealt_cards
-        #print('removing %d dealt cards from the deck: %s' % (len(all_dealt_cards), hand_string(all_dealt_cards)))
-        hand_round = community.round
-
-        # Deck with remaining cards
-        deck = PokerDeck(shuffle=False)
-        for card in all_dealt_cards:
-            deck.remove_card(card)
-
-        # Ok, now we're ready to deal to the end, record, return, shuffle, repeat X times
-        # Calculate wins/losses, and also hand categories made [house, flush, etc]
-        # TODO: This should be a library sub-routine
-        hand_results = []
-        category_results = [0.0 for category in HIGH_HAND_CATEGORIES]
-        for i in range(num_samples):
-            community.rewind(deck=deck, round=hand_round)
-            # Clear oppn cards, since simulating allin vs random hand
-            deck.return_cards(cards_return=oppn_hand.dealt_cards, shuffle=False)
-            oppn_hand.dealt_cards = []
-
-            # deal new hand and evaluate
-            deck.shuffle()
-            oppn_hand.dealt_cards = deck.deal(2) # new cards for opponent
-            community.deal(deck=deck,runway=True)
-            our_hand.evaluate()
-            oppn_hand.evaluate()
-            if our_hand.rank > oppn_hand.rank:
-                result = 0.0
-            elif our_hand.rank < oppn_hand.rank:
-                result = 1.0
-            else:
-                result = 0.5
-            hand_results.append(result)
-
-            # Record the category of our hand
-            category = our_hand.category
-            category_index = high_hand_categories_index[category]
-            category_results[category_index] += 1.0
-
-        # For correctness, clear 'Random' opponent hand after we're done.
-        oppn_hand.dealt_cards = []
+        # Deal random opponent hand, and to the end, num_samples times. Calculate wins/losses,
+        # and also hand categories made [house, flush, etc]. All at once, with int arrays (see holdem_equity)
+        now = time.time()
+        equity = holdem_equity(our_hand.dealt_cards, community.cards(), oppn_cards=None, num_samples=num_samples,
+                               sampling=SIMULATE_ALLINS_SAMPLING, rng=rng)
 
-        allin_value = np.mean(hand_results)
-        allin_stdev = np.std(hand_results)
+        allin_value = equity.value
+        allin_stdev = equity.stdev
         allin_error = allin_stdev / np.sqrt(num_samples)
 
         # print('allin value [vs random] is %.4f +-%.4f (%.4f stdev)' % (allin_value, allin_error, allin_stdev))
@@ -488,22 +430,23 @@ class PokerAction:
         self.allin_stdev_vs_random = allin_stdev
 
         # Categories (% to make specific hands like pair, flush, etc)
-        category_values = [category_results[high_hand_categories_index[category]] / num_samples for category in HIGH_HAND_CATEGORIES]
-        #category_values_debug = [[categoryName[category], category_results[high_hand_categories_index[category]] / num_samples] for category in HIGH_HAND_CATEGORIES]
+        category_values = equity.category_values
+        #category_values_debug = [[categoryName[category], category_values[high_hand_categories_index[category]]] for category in HIGH_HAND_CATEGORIES]
         #print('\n%s category odds %s' % (our_hand, category_values_debug))
 
         self.category_values_vs_random = category_values
 
         # If cache exists, update the cache
         if allin_cache:
-            allin_cache.insert(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, allin_value, allin_stdev, category_values)
+            allin_cache.insert(our_hand.dealt_cards, oppn_hand.dealt_cards, flop, turn, river, allin_value, allin_stdev, category_values,
+                              sample_count=equity.sample_size, exact=equity.exact, seconds=time.time() - now)
 
     # For training, optionally simulate in-place to get
     # - Allin value vs current opponent
     # - Allin value vs random opponent hand (just our own hand strength)
     # NOTE: Easy to add more outputs... as long as no new loop (over random hands) is needed
     # TODO: This is expensive. Make sure to include an option to disable this run run faster.
-    def simulate_allin_values(self, allin_cache=None):
+    def simulate_allin_values(self, allin_cache=None, rng=None):
         # Currently, allin values only implemented for some games
         if not(self.format == 'holdem' or self.format == 'nlh'):
             return
@@ -513,11 +456,11 @@ class PokerAction:
 
         # check if we computed this already
         if not(hasattr(self, 'allin_vs_random') and self.allin_vs_random >= 0.0):
-            self.simulate_allin_vs_random(allin_cache=allin_cache)
+            self.simulate_allin_vs_random(allin_cache=allin_cache, rng=rng)
 
         # check if we computed this already
         if not(hasattr(self, 'allin_vs_oppn') and self.allin_vs_oppn >= 0.0):
-            self.simulate_allin_vs_oppn(allin_cache=allin_cache)
+            self.simulate_allin_vs_oppn(allin_cache=allin_cache, rng=rng)
 
         # print('%.2fs to simulate allin values (%d times)' % (time.time() - now, SIMULATE_ALLINS_COUNT))
         
@@ -528,13 +471,13 @@ class PokerAction:
         return('%s(%s)\tPot: %d\tBet: %d' % (self.name, self.actor_name, self.pot_size, self.bet_size))
 
     # Return array of outputs, corresponding to CSV header map order. Empty fields are ''
-    def csv_output(self, header_map, allin_cache = None):
+    def csv_output(self, header_map, allin_cache = None, rng = None):
         # If available for this game (Holdem, etc), output allin values for our hand.
         # NOTE: Since we simulate in-place, this can be very expensive. 
         # TODO: Track time spent on this activity.
         # ~> turn off if running in production (not for data generation purposes)
         # In general... include an option to turn off "csv_output" for faster performance (in ACPC, etc)
-        self.simulate_allin_values(allin_cache=allin_cache)
+        self.simulate_allin_values(allin_cache=allin_cache, rng=rng)
 
         output_map = {}
         if hasattr(self, 'hand') and self.hand:
@@ -33,16 +33,21 @@ Methods, useful for organizing & evaluating a draw poker match. Include everythi
 # TODO: Make sure we can handle multiple types of players, not just AI player. (For example, manual-input player)
 # TODO: Think about saving 'game state,' loading 'game state' and pausing action. Useful for API, and for simulation.
 class TripleDrawDealer():
-    def __init__(self, deck, player_button, player_blind, format = 'deuce'):
+    def __init__(self, deck, player_button, player_blind, format = 'deuce', rng = None):
         self.deck = deck # Assume it's shuffled, if needs to be shuffled
         self.player_button = player_button # player to act last on every street
         self.player_blind = player_blind # player to act first, except when posting forced blind
         self.format = format # 'deuce' triple draw, or 'holdem', etc?
+        self.rng = rng if rng is not None else deck.rng # PokerRandom context, same as the deck by default
 
         # Hack, for convenience.
         # to distinguish between B = button and F = blind player, first to act
         self.player_button.name = 'B'
         self.player_blind.name = 'F'
+
+        # Players make random choices from the dealer's stream. So whole hand repeats from one seed.
+        self.player_button.rng = self.rng
+        self.player_blind.rng = self.rng
         
 
         # For debug. Start just by listing actions taken, in readable format.
@@ -5,6 +5,7 @@ import time
 import math
 import re
 import random
+import argparse # command line arguements parsing
 import numpy as np
 import scipy.stats as ss
 from poker_lib import *
@@ -37,7 +38,8 @@ SKIP_LINE_PROBABILITY = 0.80
 NUM_SHOW_ERRORS = 100 
 
 # Get relevant data, simulate draw, and notice differences.
-def evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier):
+# rng = PokerRandom context (default: global random streams)
+def evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier, rng=None):
     ########################################
     # HACK: Use this to look at a hand... if we want to
     # line[csv_key_map['dealt_cards']] = '[8s,4c,5c,3c,Ac]' # Hand we look at
@@ -50,7 +52,7 @@ def evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier):
     hand_cards = [Card(suit=suitFromChar[card_str[1]], value=valueFromChar[card_str[0]]) for card_str in hand_array]
 
     # To keep deck true... need to extract cards from the deck, for what's already our hand...
-    deck = PokerDeck(shuffle=True)
+    deck = BitmaskPokerDeck(shuffle=True, rng=rng)
     deal_cards = deck.deal_cards(hand_cards)
     draw_hand = PokerHand()
     draw_hand.deal(deal_cards)
@@ -95,7 +97,8 @@ def evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier):
 
 # Go line-by-line, simulate results, and see if AI made right choice.
 # Rank errors by magnitude.
-def evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=50):
+def evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=50, rng=None):
+    rng = poker_random(rng)
     # Load input into CSV reader
     csv_reader = csv.reader(open(input_filename, 'rU'))
     csv_key = None
@@ -127,7 +130,7 @@ def evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=50
             csv_key_map = CreateMapFromCSVKey(csv_key)
         else:
             # For debugging, or just down-sample, skip lines with probability...
-            if random.random() < SKIP_LINE_PROBABILITY:
+            if rng.random.random() < SKIP_LINE_PROBABILITY:
                 continue
 
             # Skip any mall-formed lines.
@@ -135,7 +138,7 @@ def evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=50
 		sys.stdout.flush()
                 print('\n----------------')
                 # Run simulation, and save results...
-                result = evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier)
+                result = evaluate_draw_line(line, csv_key_map, tries_per_draw, cashier, rng=rng)
                 print(result) 
 
                 # Remember, for unpacking later.
@@ -190,13 +193,17 @@ def evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=50
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate draws made in played hands, and rank the errors.')
+    parser.add_argument('input', help='input CSV, with POKER_GAME_HEADER header')
+    parser.add_argument('-seed', '--seed', type=int, default=None, help='random seed, for reproducible line skips and simulations')
+    args = parser.parse_args()
+
     tries_per_draw = 2000 
     max_input = 3000 # hands to examine
     # Load CSV with POKER_GAME_HEADER header.
-    if len(sys.argv) >= 2:
-        input_filename = sys.argv[1]
-
-        output_filename = 'errors_%d_%s' % (max_input, input_filename)
+    input_filename = args.input
+    output_filename = 'errors_%d_%s' % (max_input, input_filename)
+    rng = PokerRandom(args.seed) if args.seed is not None else None
 
     # For each hand, analyze the move. Record errors, and magnitudes of errors (skip hands with agreement or small error)
-    evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=max_input)
+    evaluate_draws(input_filename, output_filename, tries_per_draw, max_input=max_input, rng=rng)
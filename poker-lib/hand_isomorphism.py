@@ -0,0 +1,285 @@
+import sys
+import math
+import numpy as np
+from poker_lib import *
+
+"""
+Suit isomorphism for Hold'em, and other games where cards are dealt in rounds. Pure Python, with small lookup tables.
+
+Two situations are equivalent, if one becomes the other by permuting suits. Example: [AsKs] on [Qs7h2d] is the same as
+[AhKh] on [Qh7c2s]. Up to 24 equivalent situations, for each one that matters.
+
+After Kevin Waugh, "A Fast and Optimal Hand Isomorphism Algorithm" (2013):
+- For each suit, "shape" is the number of cards of that suit dealt in each round. Suits are sorted by shape.
+- Cards of one suit, over all rounds, get an index given the shape (colex index of ranks in each round, among unused ranks).
+- Suits with the same shape are interchangeable, so their indices form a multiset (combination with repetition).
+- Each sorted tuple of 4 shapes ("configuration") gets a block of indices. Index = configuration offset + index in block.
+
+So every round gets a dense index in [0, size). For Hold'em [2, 3, 1, 1]:
+169 preflop, 1,286,792 flop, 55,190,538 turn, 2,428,287,420 river.
+(Or 13,960,050 and 123,156,254 with board as one round, [2, 4] and [2, 5], if order of board cards does not matter.)
+"""
+
+NUM_RANKS = 13
+NUM_SUITS = 4
+
+# Bits per 13-bit rank mask, and colex index of mask among all masks with the same number of bits.
+rank_mask_bits = [bin(mask).count('1') for mask in range(1 << NUM_RANKS)]
+def colex_index_of_mask(mask):
+    index = 0
+    bit = 0
+    for rank in range(NUM_RANKS):
+        if mask & (1 << rank):
+            bit += 1
+            index += choose(rank, bit)
+    return index
+rank_mask_colex_index = [colex_index_of_mask(mask) for mask in range(1 << NUM_RANKS)]
+
+# Remove "used" ranks from mask, and shift the rest down. Example: mask 0b1010, used 0b0010 -> 0b101
+def compress_rank_mask(mask, used):
+    if not used:
+        return mask
+    compressed = 0
+    position = 0
+    for rank in range(NUM_RANKS):
+        if not (used & (1 << rank)):
+            if mask & (1 << rank):
+                compressed |= (1 << position)
+            position += 1
+    return compressed
+
+# Indexes situations dealt in rounds, up to suit isomorphism. Example: HandIndexer([2, 3, 1, 1]) for Hold'em.
+# Input is array of rounds (array of [Card]), up to any round. Index is for the last round given.
+class HandIndexer(object):
+    def __init__(self, cards_per_round):
+        self.cards_per_round = list(cards_per_round)
+        self.num_rounds = len(self.cards_per_round)
+        self.round_size = []
+        self.configuration_offsets = [] # for each round, {configuration: offset}
+        self.shape_sizes = {} # number of ways to deal one suit in this shape
+        for round in range(self.num_rounds):
+            shapes = self.round_shapes(round)
+            for shape in shapes:
+                self.shape_sizes[shape] = self.compute_shape_size(shape)
+            offsets = {}
+            offset = 0
+            for configuration in self.round_configurations(shapes, round):
+                offsets[configuration] = offset
+                offset += self.configuration_size(configuration)
+            self.configuration_offsets.append(offsets)
+            self.round_size.append(offset)
+
+    # All possible shapes for one suit, through given round. Largest first.
+    def round_shapes(self, round):
+        shapes = [()]
+        for r in range(round + 1):
+            shapes = [shape + (count,) for shape in shapes for count in range(self.cards_per_round[r] + 1)
+                      if sum(shape) + count <= NUM_RANKS]
+        shapes.sort(reverse=True)
+        return shapes
+
+    def compute_shape_size(self, shape):
+        size = 1
+        used = 0
+        for count in shape:
+            size *= choose(NUM_RANKS - used, count)
+            used += count
+        return size
+
+    # Sorted tuples of NUM_SUITS shapes, which deal exactly cards_per_round. In a fixed order, for offsets.
+    def round_configurations(self, shapes, round):
+        configurations = []
+        def add_suits(configuration, start, remaining):
+            if len(configuration) == NUM_SUITS:
+                if not any(remaining):
+                    configurations.append(tuple(configuration))
+                return
+            for i in range(start, len(shapes)):
+                shape = shapes[i]
+                if all([shape[r] <= remaining[r] for r in range(round + 1)]):
+                    add_suits(configuration + [shape], i, [remaining[r] - shape[r] for r in range(round + 1)])
+        add_suits([], 0, self.cards_per_round[:round + 1])
+        return configurations
+
+    # Product over groups of equal shapes: multisets of k suit indices, from shape_size choices.
+    def configuration_size(self, configuration):
+        size = 1
+        for (shape, count) in self.shape_groups(configuration):
+            size *= choose(self.shape_sizes[shape] + count - 1, count)
+        return size
+
+    # [(shape, number of suits)] in configuration order
+    def shape_groups(self, configuration):
+        groups = []
+        for shape in configuration:
+            if groups and groups[-1][0] == shape:
+                groups[-1] = (shape, groups[-1][1] + 1)
+            else:
+                groups.append((shape, 1))
+        return groups
+
+    # For each suit (in suitsArray order): (shape, index of its cards given the shape), and rank mask per round.
+    def suit_shapes_and_indices(self, rounds_cards):
+        assert len(rounds_cards) <= self.num_rounds, 'Too many rounds %s for indexer %s' % (len(rounds_cards), self.cards_per_round)
+        masks = [[0] * len(rounds_cards) for suit in range(NUM_SUITS)]
+        for r in range(len(rounds_cards)):
+            assert len(rounds_cards[r]) == self.cards_per_round[r], 'Need %d cards in round %d. Given %s' % (self.cards_per_round[r], r, hand_string(rounds_cards[r]))
+            for card in rounds_cards[r]:
+                masks[suits_to_matrix[card.suit]][r] |= (1 << card.value)
+        suits = []
+        for suit in range(NUM_SUITS):
+            shape = []
+            index = 0
+            multiplier = 1
+            used = 0
+            for r in range(len(rounds_cards)):
+                mask = masks[suit][r]
+                count = rank_mask_bits[mask]
+                index += multiplier * rank_mask_colex_index[compress_rank_mask(mask, used)]
+                multiplier *= choose(NUM_RANKS - rank_mask_bits[used], count)
+                used |= mask
+                shape.append(count)
+            suits.append((tuple(shape), index, masks[suit]))
+        return suits
+
+    # Dense index in [0, round_size[round]), for the last round given.
+    def index(self, rounds_cards):
+        suits = self.suit_shapes_and_indices(rounds_cards)
+        suits.sort(key=lambda suit: (suit[0], suit[1]), reverse=True)
+        configuration = tuple([suit[0] for suit in suits])
+        index = 0
+        position = 0
+        for (shape, count) in self.shape_groups(configuration):
+            # Multiset of suit indices a_1 >= ... >= a_k --> distinct b_i = a_i + (k - i). Colex index of b.
+            group_index = 0
+            for i in range(count):
+                group_index += choose(suits[position + i][1] + count - 1 - i, count - i)
+            index = index * choose(self.shape_sizes[shape] + count - 1, count) + group_index
+            position += count
+        return self.configuration_offsets[len(rounds_cards) - 1][configuration] + index
+
+    # {suit: canonical suit}. Suits sorted by (shape, index) get suitsArray order.
+    def canonical_suits(self, rounds_cards):
+        suits = self.suit_shapes_and_indices(rounds_cards)
+        suits_order = sorted(range(NUM_SUITS), key=lambda suit: (suits[suit][0], suits[suit][1]), reverse=True)
+        canonical_suit = {}
+        for i in range(NUM_SUITS):
+            canonical_suit[suitsArray[suits_order[i]]] = suitsArray[i]
+        return canonical_suit
+
+    # Same situation, with suits relabeled by canonical_suits.
+    # Cards in each round sorted, high to low. Equivalent situations give exactly the same cards.
+    def canonical_form(self, rounds_cards):
+        canonical_suit = self.canonical_suits(rounds_cards)
+        canonical_rounds = []
+        for round_cards in rounds_cards:
+            cards = [Card(suit=canonical_suit[card.suit], value=card.value) for card in round_cards]
+            cards.sort(key=lambda card: (card.value, -suits_to_matrix[card.suit]), reverse=True)
+            canonical_rounds.append(cards)
+        return canonical_rounds
+
+# Indexers are built once per shape of the deal (takes a moment for many rounds).
+hand_indexers = {}
+def hand_indexer(cards_per_round):
+    cards_per_round = tuple(cards_per_round)
+    if not cards_per_round in hand_indexers:
+        hand_indexers[cards_per_round] = HandIndexer(cards_per_round)
+    return hand_indexers[cards_per_round]
+
+HOLDEM_CARDS_PER_ROUND = [2, 3, 1, 1]
+HOLDEM_BOARD_CARDS_PER_ROUND = [3, 1, 1]
+
+# Hold'em cards, as rounds. Empty arrays after the last round dealt. Hole cards optional (board only).
+def holdem_rounds(cards_array, flop_array, turn_array, river_array):
+    rounds = [cards_array, flop_array, turn_array, river_array]
+    if not cards_array:
+        rounds = rounds[1:]
+    while rounds and not rounds[-1]:
+        rounds.pop()
+    assert all(rounds), 'Illegal collection of hand, flop, turn, river %s' % [hand_string(cards) for cards in [cards_array, flop_array, turn_array, river_array]]
+    return rounds
+
+# Given arrays of cards, some of them empty, return same format, after canonical
+# Valid inputs: empty input, preflop only, preflop + board, board only [turn only not allowed]
+def holdem_cards_canonical_form(cards_array, flop_array, turn_array, river_array):
+    rounds = holdem_rounds(cards_array, flop_array, turn_array, river_array)
+    if not rounds:
+        return (cards_array, flop_array, turn_array, river_array)
+    canonical_rounds = hand_indexer([len(cards) for cards in rounds]).canonical_form(rounds)
+    canonical_rounds += [[] for r in range(4 - len(canonical_rounds))]
+    if not cards_array:
+        canonical_rounds = [[]] + canonical_rounds[:3]
+    return tuple(canonical_rounds)
+
+# Dense index for Hold'em situation, on the current street. [0, 169) preflop, etc.
+def holdem_hand_index(cards_array, flop_array=[], turn_array=[], river_array=[]):
+    rounds = holdem_rounds(cards_array, flop_array, turn_array, river_array)
+    if cards_array:
+        return hand_indexer(HOLDEM_CARDS_PER_ROUND).index(rounds)
+    return hand_indexer(HOLDEM_BOARD_CARDS_PER_ROUND).index(rounds)
+
+# Key for any collection of card groups (some of them empty). Equal for suit-equivalent situations.
+# Example: (our hand, opponent hand, flop, turn, river) for allin values cache.
+def isomorphic_key(card_groups):
+    group_sizes = tuple([len(cards) for cards in card_groups])
+    rounds = [cards for cards in card_groups if cards]
+    if not rounds:
+        return (group_sizes, 0)
+    return (group_sizes, hand_indexer([len(cards) for cards in rounds]).index(rounds))
+
+#######################################################################
+## Five-card draw hands (video poker, 2-7 triple draw). One round of 5 cards --> 134,459 classes.
+## Canonical hand is sorted, so it comes with a positional permutation: canonical card j is caller's card permutation[j].
+## Values for the 32 all_draw_patterns, computed on the canonical hand, map back to the caller's card order.
+#######################################################################
+FIVE_CARD_CARDS_PER_ROUND = [5]
+NUM_FIVE_CARD_CLASSES = 134459
+
+# Draw pattern (set of positions kept) --> index in all_draw_patterns
+draw_pattern_indices = dict([(frozenset(all_draw_patterns[i]), i) for i in range(len(all_draw_patterns))])
+
+# Returns (canonical cards, class index in [0, 134459), permutation).
+def five_card_canonical_form(hand_array):
+    assert len(hand_array) == 5, 'Need 5 cards for draw hand. Given %s' % hand_string(hand_array)
+    indexer = hand_indexer(FIVE_CARD_CARDS_PER_ROUND)
+    canonical_suit = indexer.canonical_suits([hand_array])
+    canonical_cards = [Card(suit=canonical_suit[card.suit], value=card.value) for card in hand_array]
+    permutation = sorted(range(5), key=lambda i: (canonical_cards[i].value, -suits_to_matrix[canonical_cards[i].suit]), reverse=True)
+    return ([canonical_cards[i] for i in permutation], indexer.index([hand_array]), permutation)
+
+def five_card_class_index(hand_array):
+    return hand_indexer(FIVE_CARD_CARDS_PER_ROUND).index([hand_array])
+
+# For each draw pattern in caller's card order, the index of the same draw in canonical order.
+# So values_for_hand = canonical_values[order], for any 32-vector (or (32, ...) array) of draw values.
+draw_pattern_orders_cache = {}
+def draw_pattern_order(permutation):
+    permutation = tuple(permutation)
+    if not permutation in draw_pattern_orders_cache:
+        canonical_position = dict([(permutation[j], j) for j in range(5)])
+        order = [draw_pattern_indices[frozenset([canonical_position[i] for i in draw_pattern])] for draw_pattern in all_draw_patterns]
+        draw_pattern_orders_cache[permutation] = np.array(order, dtype=np.int32)
+    return draw_pattern_orders_cache[permutation]
+
+# Cache of per-draw values (simulation results, model outputs, exact tables), stored once per class.
+# Values are kept in canonical order, and returned in caller's order.
+class DrawValuesCache(object):
+    def __init__(self):
+        self.values_map = {}
+
+    # Values given in caller's card order, for all 32 draw patterns.
+    def insert(self, hand_array, draw_values):
+        (canonical_cards, index, permutation) = five_card_canonical_form(hand_array)
+        canonical_values = np.zeros_like(np.asarray(draw_values))
+        canonical_values[draw_pattern_order(permutation)] = draw_values
+        self.values_map[index] = canonical_values
+
+    # None, if class not yet seen.
+    def lookup(self, hand_array):
+        (canonical_cards, index, permutation) = five_card_canonical_form(hand_array)
+        if not index in self.values_map:
+            return None
+        return self.values_map[index][draw_pattern_order(permutation)]
+
+    def __len__(self):
+        return len(self.values_map)
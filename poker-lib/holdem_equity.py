@@ -0,0 +1,690 @@
+import os
+import sys
+import time
+import math
+import itertools
+import argparse # command line arguements parsing
+import multiprocessing
+import numpy as np
+from poker_lib import *
+from poker_tables import *
+from hand_isomorphism import * # dedupe batch situations, up to suit permutation
+
+"""
+Vectorized equity for Texas Hold'em: our hand vs a known opponent hand, or vs a random hand.
+
+Instead of rewind, shuffle, deal and evaluate for every sample... sample all runouts (and opponent hands)
+as [0, 51] card index arrays in one go, and evaluate 7-card hands in batch (see poker_tables).
+
+Results are win/tie/loss rates, allin value (win + 1/2 tie), stdev of per-sample results, and
+odds of making each of the HIGH_HAND_CATEGORIES. Same outputs as the old per-sample simulations.
+
+If few enough (board, opponent hand) completions remain [turn and river vs random hand, flop vs known hand],
+enumerate all of them instead. Exact values, and zero stdev.
+
+Preflop, look up precomputed tables instead (if generated). Run this file directly to generate them.
+
+Sampling is plain Monte Carlo, or stratified [sampling=SAMPLING_STRATIFIED]: every remaining card gets an equal share
+as the first runout card (turn, from the flop), and rivers don't repeat within each turn. Same expected values, less noise.
+Stratified stdev is within strata, so stdev / sqrt(samples) is still the error of the average.
+
+For many situations at once, equity_batch() runs each street as one (situations x runouts) batch.
+
+Against weighted ranges of hands (instead of a random hand), see range_equity() below.
+"""
+
+# Default number of runouts to sample.
+HOLDEM_EQUITY_SAMPLES = 1000
+
+# Enumerate all completions, if there are at most this many. Turn vs random hand is 46 rivers x 990 hands = 45,540
+HOLDEM_EQUITY_EXACT_THRESHOLD = 50000
+
+# Results of an equity calculation.
+class HoldemEquityResult(object):
+    def __init__(self):
+        self.win = 0.0
+        self.tie = 0.0
+        self.loss = 0.0
+        self.value = 0.0 # win + 0.5 * tie
+        self.stdev = 0.0 # stdev of per-sample results (1.0, 0.5, 0.0). Not the stdev of the average.
+        self.category_values = [0.0 for category in HIGH_HAND_CATEGORIES] # odds of our final hand, by category
+        self.oppn_category_values = None # odds of opponent's final hand, by category [not from the vs random hand table]
+        self.sample_size = 0 # or number of completions, if exact
+        self.exact = False
+        self.combo_values = None # range equity (exact): value for each of our 1326 combos, NaN if not in range
+
+    def __str__(self):
+        return 'equity %.4f (win %.4f, tie %.4f, loss %.4f) +-%.4f stdev, %d samples' % (self.value, self.win, self.tie, self.loss,
+                                                                                       self.stdev, self.sample_size)
+
+# Per-sample stdev of (M, N) results, within strata [(M, N) labels in [0, num_strata)]. Pooled over strata, with
+# one degree of freedom per stratum. Plain stdev if too few samples per stratum.
+def stratified_stdev(results, strata, num_strata):
+    (num_rows, num_samples) = results.shape
+    labels = (strata + num_strata * np.arange(num_rows)[:, np.newaxis]).ravel()
+    counts = np.bincount(labels, minlength=num_rows * num_strata)
+    means = np.bincount(labels, weights=results.ravel(), minlength=num_rows * num_strata) / np.maximum(counts, 1)
+    squares = ((results.ravel() - means[labels]) ** 2).reshape((num_rows, num_samples)).sum(axis=1)
+    degrees = num_samples - (counts.reshape((num_rows, num_strata)) > 0).sum(axis=1)
+    return np.where(degrees > 0, np.sqrt(squares / np.maximum(degrees, 1)), results.std(axis=1))
+
+# Fill results, from (N,) arrays of our ranks, and opponent ranks.
+# If strata [(N,) labels, with num_strata] given, stdev is within strata.
+def equity_result_from_ranks(our_ranks, oppn_ranks, strata=None, num_strata=0):
+    num_samples = len(our_ranks)
+    results = np.where(our_ranks < oppn_ranks, 1.0, np.where(our_ranks == oppn_ranks, 0.5, 0.0))
+    equity = HoldemEquityResult()
+    equity.sample_size = num_samples
+    equity.win = np.count_nonzero(our_ranks < oppn_ranks) / float(num_samples)
+    equity.tie = np.count_nonzero(our_ranks == oppn_ranks) / float(num_samples)
+    equity.loss = 1.0 - equity.win - equity.tie
+    equity.value = np.mean(results)
+    equity.stdev = np.std(results) if strata is None else stratified_stdev(results[np.newaxis, :], strata[np.newaxis, :], num_strata)[0]
+    category_counts = np.bincount(high_hand_category_index_by_rank[our_ranks], minlength=len(HIGH_HAND_CATEGORIES))
+    equity.category_values = list(category_counts / float(num_samples))
+    oppn_category_counts = np.bincount(high_hand_category_index_by_rank[oppn_ranks], minlength=len(HIGH_HAND_CATEGORIES))
+    equity.oppn_category_values = list(oppn_category_counts / float(num_samples))
+    return equity
+
+# All (board completion, opponent hand completion) pairs, from remaining card indices.
+# Returns (N, board_needed) and (N, oppn_needed) arrays. Every pair equally likely.
+def enumerate_completions(remaining_indices, board_needed, oppn_needed):
+    num_remaining = len(remaining_indices)
+    board_positions = combination_indices(num_remaining, board_needed).astype(np.int64)
+    oppn_positions = combination_indices(num_remaining - board_needed, oppn_needed).astype(np.int64)
+    num_boards = len(board_positions)
+    num_oppn = len(oppn_positions)
+
+    # For each board, positions of cards still left for the opponent
+    left_mask = np.ones((num_boards, num_remaining), dtype=bool)
+    left_mask[np.arange(num_boards)[:, np.newaxis], board_positions] = False
+    left_positions = np.tile(np.arange(num_remaining), (num_boards, 1))[left_mask].reshape((num_boards, num_remaining - board_needed))
+
+    boards = np.repeat(remaining_indices[board_positions], num_oppn, axis=0)
+    oppn_hands = remaining_indices[left_positions[:, oppn_positions]].reshape((num_boards * num_oppn, oppn_needed))
+    return (boards, oppn_hands)
+
+# Equity for our 2 cards, vs opponent's 2 cards (or random hand if None/empty), with 0-5 community cards known.
+# Samples rest of the board (and opponent hand) num_samples times, from the remaining deck.
+# Unless there are at most exact_threshold completions. Then enumerate all of them (exact value, stdev 0.0).
+# Preflop, use precomputed tables if available (see below).
+# rng = PokerRandom context for sampling (default: global np.random). sampling = SAMPLING_MC or SAMPLING_STRATIFIED
+def holdem_equity(our_cards, community_cards, oppn_cards=None, num_samples=HOLDEM_EQUITY_SAMPLES,
+                  exact_threshold=HOLDEM_EQUITY_EXACT_THRESHOLD, use_preflop_tables=True, sampling=SAMPLING_MC, rng=None):
+    assert len(our_cards) == 2, 'Need holdem hand for equity. Given %s' % hand_string(our_cards)
+    assert len(community_cards) in [0, 3, 4, 5], 'Illegal community cards %s' % hand_string(community_cards)
+    if not oppn_cards:
+        oppn_cards = []
+
+    if use_preflop_tables and not community_cards:
+        equity = preflop_equity_lookup(our_cards, oppn_cards)
+        if equity:
+            return equity
+
+    dead_cards = list(our_cards) + list(community_cards) + list(oppn_cards)
+    dead_mask = 0
+    for card in dead_cards:
+        dead_mask |= (1 << card.index)
+    remaining_indices = np.array([index for index in range(52) if not (dead_mask & (1 << index))], dtype=np.int64)
+
+    board_needed = 5 - len(community_cards)
+    oppn_needed = 2 - len(oppn_cards)
+
+    num_completions = choose(len(remaining_indices), board_needed) * choose(len(remaining_indices) - board_needed, oppn_needed)
+    exact = (num_completions <= exact_threshold)
+    if exact:
+        (board_draws, oppn_draws) = enumerate_completions(remaining_indices, board_needed, oppn_needed)
+        draws = np.hstack((board_draws, oppn_draws))
+        num_samples = num_completions
+    else:
+        draws = sample_cards(remaining_indices, num_samples, board_needed + oppn_needed, sampling=sampling, rng=rng)
+
+    # Board is known community cards + first cards of the draw. Opponent (if random) gets the rest.
+    board = np.empty((num_samples, 5), dtype=np.int64)
+    board[:, :len(community_cards)] = [card.index for card in community_cards]
+    board[:, len(community_cards):] = draws[:, :board_needed]
+    oppn_hands = np.empty((num_samples, 2), dtype=np.int64)
+    oppn_hands[:, :len(oppn_cards)] = [card.index for card in oppn_cards]
+    oppn_hands[:, len(oppn_cards):] = draws[:, board_needed:]
+
+    our_hands = np.empty((num_samples, 2), dtype=np.int64)
+    our_hands[:, :] = [card.index for card in our_cards]
+    our_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((our_hands, board))])
+    oppn_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((oppn_hands, board))])
+    if sampling == SAMPLING_STRATIFIED and not exact:
+        equity = equity_result_from_ranks(our_ranks, oppn_ranks, strata=draws[:, 0], num_strata=52)
+    else:
+        equity = equity_result_from_ranks(our_ranks, oppn_ranks)
+    if exact:
+        equity.exact = True
+        equity.stdev = 0.0
+    return equity
+
+#######################################################################
+## Preflop equity tables.
+## Vs random hand, preflop equity depends only on the 169 hand classes (AA, AKs, AKo, ... 32o).
+## Vs a known hand, only on the two hands up to suit permutation: 93,769 ordered matchups, ~47k if we store
+## one direction of each [equity of the other direction is 1 - win - tie].
+## Category odds can not be derived that way [AsKs makes fewer flushes vs QsJs than vs random], so matchups store
+## category odds for both hands.
+## Exact enumeration is too expensive preflop (2.1M boards x 990 opponent hands, per class), so tables are
+## Monte Carlo estimates with many samples. Sample counts are saved with the tables.
+#######################################################################
+PREFLOP_CLASSES_FILE = 'preflop_classes.npz'
+PREFLOP_MATCHUPS_FILE = 'preflop_matchups.npz'
+PREFLOP_CLASS_SAMPLES = 2000000
+PREFLOP_MATCHUP_SAMPLES = 50000
+NUM_PREFLOP_CLASSES = 169
+
+# 13x13 grid of hand classes: pairs on the diagonal, suited hands (high, low), offsuit hands (low, high)
+def preflop_class_index(cards):
+    (high, low) = sorted([cards[0].value, cards[1].value], reverse=True)
+    if high != low and cards[0].suit == cards[1].suit:
+        return high * 13 + low
+    return low * 13 + high
+
+def preflop_class_string(class_index):
+    (row, column) = (class_index // 13, class_index % 13)
+    if row == column:
+        return valueSymbol[row] + valueSymbol[column]
+    elif row > column:
+        return valueSymbol[row] + valueSymbol[column] + 's'
+    return valueSymbol[column] + valueSymbol[row] + 'o'
+
+# One representative hand for each class. Suited in clubs, others clubs & diamonds.
+def preflop_class_cards(class_index):
+    (row, column) = (class_index // 13, class_index % 13)
+    if row > column:
+        return [Card(suit=CLUB, value=row), Card(suit=CLUB, value=column)]
+    return [Card(suit=CLUB, value=max(row, column)), Card(suit=DIAMOND, value=min(row, column))]
+
+# Card index [0, 51] under each of the 24 permutations of suits. (24, 52)
+suit_permutation_indices = np.array([[perm[index // 13] * 13 + index % 13 for index in range(52)]
+                                     for perm in itertools.permutations(range(4))], dtype=np.int64)
+
+# Key for (our hand, opponent hand) as card indices. Both hands sorted. Minimum over suit permutations.
+# Works on (N, 2) arrays of card indices, for batch generation of all matchups.
+def preflop_matchup_keys(our_indices, oppn_indices):
+    keys = None
+    for permutation in suit_permutation_indices:
+        our_permuted = np.sort(permutation[our_indices], axis=1)
+        oppn_permuted = np.sort(permutation[oppn_indices], axis=1)
+        perm_keys = ((our_permuted[:, 0] * 52 + our_permuted[:, 1]) * 52 + oppn_permuted[:, 0]) * 52 + oppn_permuted[:, 1]
+        keys = perm_keys if keys is None else np.minimum(keys, perm_keys)
+    return keys
+
+def preflop_matchup_key(our_cards, oppn_cards):
+    our_indices = np.array([[card.index for card in our_cards]], dtype=np.int64)
+    oppn_indices = np.array([[card.index for card in oppn_cards]], dtype=np.int64)
+    return int(preflop_matchup_keys(our_indices, oppn_indices)[0])
+
+# Decode key back to (our cards, opponent cards)
+def preflop_matchup_cards(key):
+    indices = []
+    for i in range(4):
+        indices.append(key % 52)
+        key //= 52
+    indices.reverse()
+    return ([card_from_index(indices[0]), card_from_index(indices[1])], [card_from_index(indices[2]), card_from_index(indices[3])])
+
+# All matchups we need to store: one key per suit-isomorphic (our, oppn) pair, keeping only the smaller
+# of the two directions.
+def all_preflop_matchup_keys():
+    hands = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+    (our_rows, oppn_rows) = np.triu_indices(len(hands), 1)
+    our_indices = hands[our_rows]
+    oppn_indices = hands[oppn_rows]
+    disjoint = np.all(our_indices[:, :, np.newaxis] != oppn_indices[:, np.newaxis, :], axis=(1, 2))
+    our_indices = our_indices[disjoint]
+    oppn_indices = oppn_indices[disjoint]
+    keys = np.minimum(preflop_matchup_keys(our_indices, oppn_indices), preflop_matchup_keys(oppn_indices, our_indices))
+    return np.unique(keys)
+
+# Sample in chunks, to keep memory bounded.
+def generate_preflop_class_table(num_samples=PREFLOP_CLASS_SAMPLES, chunk_samples=100000, seed=0):
+    print('generating preflop equity vs random hand, for %d hand classes, %d samples each...' % (NUM_PREFLOP_CLASSES, num_samples))
+    now = time.time()
+    class_win = np.zeros(NUM_PREFLOP_CLASSES, dtype=np.float64)
+    class_tie = np.zeros(NUM_PREFLOP_CLASSES, dtype=np.float64)
+    class_categories = np.zeros((NUM_PREFLOP_CLASSES, len(HIGH_HAND_CATEGORIES)), dtype=np.float64)
+    class_rngs = PokerRandom(seed).spawn(NUM_PREFLOP_CLASSES)
+    for class_index in range(NUM_PREFLOP_CLASSES):
+        for start in range(0, num_samples, chunk_samples):
+            chunk_size = min(chunk_samples, num_samples - start)
+            equity = holdem_equity(preflop_class_cards(class_index), [], num_samples=chunk_size, use_preflop_tables=False,
+                                   rng=class_rngs[class_index])
+            class_win[class_index] += equity.win * chunk_size / num_samples
+            class_tie[class_index] += equity.tie * chunk_size / num_samples
+            class_categories[class_index] += np.array(equity.category_values) * chunk_size / num_samples
+        print('%s\twin %.4f\ttie %.4f' % (preflop_class_string(class_index), class_win[class_index], class_tie[class_index]))
+    path = save_table_npz(PREFLOP_CLASSES_FILE, win=class_win, tie=class_tie, categories=class_categories,
+                          samples=np.array([num_samples]))
+    print('%.1fs to generate preflop classes table. Saved to %s' % (time.time() - now, path))
+
+# Equity for a chunk of matchup keys. Top level function, so it works with multiprocessing.
+def preflop_matchups_chunk(chunk_task):
+    (keys, num_samples, seed, chunk) = chunk_task
+    rng = PokerRandom(seed, spawn_key=(chunk,))
+    win = np.zeros(len(keys), dtype=np.float64)
+    tie = np.zeros(len(keys), dtype=np.float64)
+    categories = np.zeros((len(keys), len(HIGH_HAND_CATEGORIES)), dtype=np.float64)
+    oppn_categories = np.zeros((len(keys), len(HIGH_HAND_CATEGORIES)), dtype=np.float64)
+    for i in range(len(keys)):
+        (our_cards, oppn_cards) = preflop_matchup_cards(int(keys[i]))
+        equity = holdem_equity(our_cards, [], oppn_cards=oppn_cards, num_samples=num_samples, exact_threshold=0, use_preflop_tables=False,
+                               rng=rng)
+        win[i] = equity.win
+        tie[i] = equity.tie
+        categories[i] = equity.category_values
+        oppn_categories[i] = equity.oppn_category_values
+    return (win, tie, categories, oppn_categories)
+
+def generate_preflop_matchup_table(num_samples=PREFLOP_MATCHUP_SAMPLES, workers=1, chunk_size=500, seed=0):
+    keys = all_preflop_matchup_keys()
+    print('generating preflop equity for %d matchups, %d samples each, %d workers...' % (len(keys), num_samples, workers))
+    now = time.time()
+    chunk_tasks = [(keys[start:start+chunk_size], num_samples, seed, start // chunk_size) for start in range(0, len(keys), chunk_size)]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        chunk_results = pool.map(preflop_matchups_chunk, chunk_tasks, chunksize=1)
+        pool.close()
+        pool.join()
+    else:
+        chunk_results = map(preflop_matchups_chunk, chunk_tasks)
+    (win, tie, categories, oppn_categories) = [np.concatenate(chunk_arrays) for chunk_arrays in zip(*chunk_results)]
+    path = save_table_npz(PREFLOP_MATCHUPS_FILE, keys=keys, win=win.astype(np.float32), tie=tie.astype(np.float32),
+                          categories=categories.astype(np.float32), oppn_categories=oppn_categories.astype(np.float32),
+                          samples=np.array([num_samples]))
+    print('%.1fs to generate preflop matchups table. Saved to %s' % (time.time() - now, path))
+
+# Lazy load. Unlike the evaluator tables, never generate on the fly (takes a long time). Missing tables --> None
+_preflop_tables = {}
+def preflop_table(filename):
+    if not filename in _preflop_tables:
+        if os.path.exists(poker_table_path(filename)):
+            data = np.load(poker_table_path(filename))
+            _preflop_tables[filename] = dict([(name, data[name]) for name in data.files])
+        else:
+            print('preflop table %s not found. Will simulate preflop equity instead' % poker_table_path(filename))
+            _preflop_tables[filename] = None
+    return _preflop_tables[filename]
+
+# Preflop equity from tables, or None if not available. Vs random hand if oppn_cards empty.
+# Category values are for our hand vs this opponent [opponent's cards change them, like AsKs vs QsJs]. Matchup tables
+# from before category odds were stored --> None, so the caller samples instead.
+def preflop_equity_lookup(our_cards, oppn_cards):
+    classes_table = preflop_table(PREFLOP_CLASSES_FILE)
+    if classes_table is None:
+        return None
+    class_index = preflop_class_index(our_cards)
+    equity = HoldemEquityResult()
+    if not oppn_cards:
+        equity.category_values = list(classes_table['categories'][class_index])
+        equity.win = float(classes_table['win'][class_index])
+        equity.tie = float(classes_table['tie'][class_index])
+        equity.sample_size = int(classes_table['samples'][0])
+    else:
+        matchups_table = preflop_table(PREFLOP_MATCHUPS_FILE)
+        if matchups_table is None or not 'categories' in matchups_table:
+            return None
+        keys = matchups_table['keys']
+        key = preflop_matchup_key(our_cards, oppn_cards)
+        reverse_key = preflop_matchup_key(oppn_cards, our_cards)
+        position = np.searchsorted(keys, min(key, reverse_key))
+        assert position < len(keys) and keys[position] == min(key, reverse_key), 'Preflop matchup missing from table %s' % [hand_string(our_cards), hand_string(oppn_cards)]
+        win = float(matchups_table['win'][position])
+        tie = float(matchups_table['tie'][position])
+        categories = [float(x) for x in matchups_table['categories'][position]]
+        oppn_categories = [float(x) for x in matchups_table['oppn_categories'][position]]
+        if key <= reverse_key:
+            (equity.win, equity.tie) = (win, tie)
+            (equity.category_values, equity.oppn_category_values) = (categories, oppn_categories)
+        else:
+            (equity.win, equity.tie) = (1.0 - win - tie, tie)
+            (equity.category_values, equity.oppn_category_values) = (oppn_categories, categories)
+        equity.sample_size = int(matchups_table['samples'][0])
+    equity.loss = 1.0 - equity.win - equity.tie
+    equity.value = equity.win + 0.5 * equity.tie
+    # stdev of per-sample results (1.0, 0.5, 0.0), same as if we had sampled
+    equity.stdev = math.sqrt(max(equity.win + 0.25 * equity.tie - equity.value ** 2, 0.0))
+    return equity
+
+#######################################################################
+## Batch equity, for many (hand, board, opponent) situations at once.
+## Situations equal up to suit permutation are computed once. The rest are grouped by street (board size,
+## known opponent or not), since then all have the same number of cards left, and completions. So each group
+## is one (situations x runouts) array of card positions, mapped to each situation's remaining cards and ranked in batch.
+#######################################################################
+EQUITY_BATCH_MAX_ROWS = 2000000 # runouts ranked at once, to keep memory bounded
+
+# Same as HoldemEquityResult, with (N,) arrays. Categories are (N, len(HIGH_HAND_CATEGORIES))
+class HoldemEquityBatchResult(object):
+    def __init__(self, size):
+        self.win = np.zeros(size)
+        self.tie = np.zeros(size)
+        self.loss = np.zeros(size)
+        self.value = np.zeros(size)
+        self.stdev = np.zeros(size)
+        self.category_values = np.zeros((size, len(HIGH_HAND_CATEGORIES)))
+        self.sample_size = np.zeros(size, dtype=np.int64)
+        self.exact = np.zeros(size, dtype=bool)
+
+    def __len__(self):
+        return len(self.value)
+
+    def set_result(self, i, equity):
+        (self.win[i], self.tie[i], self.loss[i], self.value[i], self.stdev[i]) = (equity.win, equity.tie, equity.loss, equity.value, equity.stdev)
+        self.category_values[i] = equity.category_values
+        self.sample_size[i] = equity.sample_size
+        self.exact[i] = equity.exact
+
+    # Single HoldemEquityResult, for row i
+    def result(self, i):
+        equity = HoldemEquityResult()
+        (equity.win, equity.tie, equity.loss, equity.value, equity.stdev) = (self.win[i], self.tie[i], self.loss[i], self.value[i], self.stdev[i])
+        equity.category_values = list(self.category_values[i])
+        equity.sample_size = int(self.sample_size[i])
+        equity.exact = bool(self.exact[i])
+        return equity
+
+    # Rows in given order (with repeats)
+    def take(self, rows):
+        batch = HoldemEquityBatchResult(0)
+        for name in ['win', 'tie', 'loss', 'value', 'stdev', 'category_values', 'sample_size', 'exact']:
+            setattr(batch, name, getattr(self, name)[rows])
+        return batch
+
+# Equity for situation i: hands[i] vs opponents[i] (random hand if None/empty), with boards[i] community cards [0, 3, 4 or 5].
+# Same results as holdem_equity() for each situation [exact, sampled or preflop tables], as arrays in input order.
+def equity_batch(hands, boards, opponents=None, samples=HOLDEM_EQUITY_SAMPLES, exact_threshold=HOLDEM_EQUITY_EXACT_THRESHOLD,
+                 use_preflop_tables=True, sampling=SAMPLING_MC, rng=None):
+    assert len(boards) == len(hands), 'Need board for every hand. %d hands, %d boards' % (len(hands), len(boards))
+    if opponents is None:
+        opponents = [[] for hand in hands]
+    assert len(opponents) == len(hands), 'Need opponent (or None) for every hand. %d hands, %d opponents' % (len(hands), len(opponents))
+
+    # Unique situations, up to suit permutation. Board is one group (order of board cards does not matter).
+    unique_keys = {}
+    situations = []
+    situation_rows = np.zeros(len(hands), dtype=np.int64)
+    for i in range(len(hands)):
+        (hand, board, oppn) = (list(hands[i]), list(boards[i]), list(opponents[i] or []))
+        assert len(hand) == 2, 'Need holdem hand for equity. Given %s' % hand_string(hand)
+        assert len(board) in [0, 3, 4, 5], 'Illegal community cards %s' % hand_string(board)
+        key = isomorphic_key([hand, oppn, board])
+        if not key in unique_keys:
+            unique_keys[key] = len(situations)
+            situations.append((hand, board, oppn))
+        situation_rows[i] = unique_keys[key]
+
+    # Group by street, and compute each group in batch.
+    streets = {}
+    for u in range(len(situations)):
+        (hand, board, oppn) = situations[u]
+        streets.setdefault((len(board), len(oppn)), []).append(u)
+    unique_result = HoldemEquityBatchResult(len(situations))
+    for (street, street_rows) in streets.items():
+        street_situations = [situations[u] for u in street_rows]
+        preflop_results = None
+        if use_preflop_tables and street[0] == 0:
+            preflop_results = [preflop_equity_lookup(hand, oppn) for (hand, board, oppn) in street_situations]
+        if preflop_results and all(preflop_results):
+            for (u, equity) in zip(street_rows, preflop_results):
+                unique_result.set_result(u, equity)
+            continue
+        street_result = equity_batch_street(street_situations, samples, exact_threshold, sampling=sampling, rng=rng)
+        for name in ['win', 'tie', 'loss', 'value', 'stdev', 'category_values', 'sample_size', 'exact']:
+            getattr(unique_result, name)[street_rows] = getattr(street_result, name)
+    return unique_result.take(situation_rows)
+
+# Equity for situations [(hand, board, oppn)] with the same board and opponent sizes. Sampled, or exact (all the same).
+# Stratified sampling is stratified for each situation.
+def equity_batch_street(situations, samples, exact_threshold, sampling=SAMPLING_MC, rng=None):
+    (hand, board, oppn) = situations[0]
+    (board_known, oppn_known) = (len(board), len(oppn))
+    board_needed = 5 - board_known
+    oppn_needed = 2 - oppn_known
+    num_remaining = 52 - 2 - board_known - oppn_known
+    num_completions = choose(num_remaining, board_needed) * choose(num_remaining - board_needed, oppn_needed)
+    exact = (num_completions <= exact_threshold)
+    num_samples = num_completions if exact else samples
+
+    # Known cards: (M, 2 + board + oppn) card indices. Remaining deck for each: (M, num_remaining)
+    known = np.array([[card.index for card in hand + board + oppn] for (hand, board, oppn) in situations], dtype=np.int64)
+    live = np.ones((len(situations), 52), dtype=bool)
+    live[np.arange(len(situations))[:, np.newaxis], known] = False
+    remaining = np.nonzero(live)[1].reshape((len(situations), num_remaining))
+
+    # Completions, as positions in the remaining deck. Same for every situation, if exact.
+    # Exact completions are board by board, num_oppn opponent hands for each. Our rank only needs each board once.
+    if exact:
+        positions = np.hstack(enumerate_completions(np.arange(num_remaining), board_needed, oppn_needed))
+        num_oppn = choose(num_remaining - board_needed, oppn_needed)
+
+    result = HoldemEquityBatchResult(len(situations))
+    num_categories = len(HIGH_HAND_CATEGORIES)
+    chunk_size = max(1, EQUITY_BATCH_MAX_ROWS // num_samples)
+    for start in range(0, len(situations), chunk_size):
+        rows = np.arange(start, min(start + chunk_size, len(situations)))
+        sample_rows = np.repeat(rows, num_samples)
+        if exact:
+            chunk_positions = np.tile(positions, (len(rows), 1))
+        elif sampling == SAMPLING_STRATIFIED:
+            chunk_positions = sample_cards_stratified(np.arange(num_remaining), num_samples, board_needed + oppn_needed, rng=rng, blocks=len(rows))
+        else:
+            chunk_positions = sample_cards_without_replacement(np.arange(num_remaining), len(sample_rows), board_needed + oppn_needed, rng=rng)
+        draws = remaining[sample_rows[:, np.newaxis], chunk_positions]
+        chunk_known = known[sample_rows]
+        our_hands = chunk_known[:, :2]
+        boards = np.hstack((chunk_known[:, 2:2+board_known], draws[:, :board_needed]))
+        oppn_hands = np.hstack((chunk_known[:, 2+board_known:], draws[:, board_needed:]))
+        if exact and num_oppn > 1:
+            our_ranks = np.repeat(hand_rank_cards_batch(card_index_hash_tags[np.hstack((our_hands, boards))[::num_oppn]]), num_oppn)
+        else:
+            our_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((our_hands, boards))])
+        our_ranks = our_ranks.reshape((len(rows), num_samples))
+        oppn_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((oppn_hands, boards))]).reshape((len(rows), num_samples))
+
+        result.win[rows] = np.mean(our_ranks < oppn_ranks, axis=1)
+        result.tie[rows] = np.mean(our_ranks == oppn_ranks, axis=1)
+        category_index = high_hand_category_index_by_rank[our_ranks] + num_categories * np.arange(len(rows))[:, np.newaxis]
+        result.category_values[rows] = np.bincount(category_index.ravel(), minlength=len(rows) * num_categories).reshape((len(rows), num_categories)) / float(num_samples)
+        if sampling == SAMPLING_STRATIFIED and not exact:
+            results = np.where(our_ranks < oppn_ranks, 1.0, np.where(our_ranks == oppn_ranks, 0.5, 0.0))
+            result.stdev[rows] = stratified_stdev(results, chunk_positions[:, 0].reshape((len(rows), num_samples)), num_remaining)
+    result.loss = 1.0 - result.win - result.tie
+    result.value = result.win + 0.5 * result.tie
+    # stdev of per-sample results (1.0, 0.5, 0.0). Zero if exact, same as holdem_equity()
+    if not exact and sampling != SAMPLING_STRATIFIED:
+        result.stdev = np.sqrt(np.maximum(result.win + 0.25 * result.tie - result.value ** 2, 0.0))
+    result.sample_size[:] = num_samples
+    result.exact[:] = exact
+    return result
+
+#######################################################################
+## Range equity. A range is a weight for each of the 1326 two-card combos (or for each of the 169 classes).
+## Card removal: a combo counts only if it shares no card with the board, our hand, or the other player's combo.
+## So P(our combo a, their combo b, runout) ~ w_a * w_b, for all disjoint (a, b, runout).
+## Turn and river: exact, for every river. On a full board, showdown of all 1326 combos vs a range is O(n log n):
+## sort by rank, and cumulative weights. Then subtract combos sharing a card with ours (per card, same trick),
+## and add back our own combo [shares both cards, so subtracted twice].
+## Flop and preflop: sample (our combo, their combo, runout) triples, from exactly that distribution.
+#######################################################################
+NUM_HOLDEM_COMBOS = 1326
+RANGE_EQUITY_SAMPLES = 1000
+RANGE_RANK_SHIFT = 8192 # > any hand rank. Key (card, rank) for per-card sorting.
+
+holdem_combos = combination_indices(52, 2).astype(np.int64) # (1326, 2) card indices
+holdem_combo_masks = (np.int64(1) << holdem_combos[:, 0]) | (np.int64(1) << holdem_combos[:, 1])
+holdem_combo_index = np.zeros((52, 52), dtype=np.int64)
+holdem_combo_index[holdem_combos[:, 0], holdem_combos[:, 1]] = np.arange(NUM_HOLDEM_COMBOS)
+holdem_combo_index[holdem_combos[:, 1], holdem_combos[:, 0]] = np.arange(NUM_HOLDEM_COMBOS)
+# (52, 51) combos that contain each card
+card_combos = np.array([[holdem_combo_index[card, other] for other in range(52) if other != card] for card in range(52)], dtype=np.int64)
+holdem_combo_classes = np.array([preflop_class_index([card_from_index(c0), card_from_index(c1)]) for (c0, c1) in holdem_combos], dtype=np.int64)
+
+def holdem_combo(cards):
+    return holdem_combo_index[cards[0].index, cards[1].index]
+
+# 1326 combo weights, from 1326 weights, 169 class weights (AA, AKs... see preflop_class_index), or None (random hand).
+def range_weights(weights=None):
+    if weights is None:
+        return np.ones(NUM_HOLDEM_COMBOS)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) == NUM_PREFLOP_CLASSES:
+        return weights[holdem_combo_classes]
+    assert len(weights) == NUM_HOLDEM_COMBOS, 'Range needs %d combo or %d class weights. Given %d' % (NUM_HOLDEM_COMBOS, NUM_PREFLOP_CLASSES, len(weights))
+    return weights
+
+# Range of given hands [[Card]], equal weights (or given weights).
+def range_from_hands(hands, weights=None):
+    range_combos = np.zeros(NUM_HOLDEM_COMBOS)
+    for i in range(len(hands)):
+        range_combos[holdem_combo(hands[i])] = 1.0 if weights is None else weights[i]
+    return range_combos
+
+# Combos disjoint from each other. (1326, 1326) bool, built once.
+_holdem_combos_disjoint = None
+def holdem_combos_disjoint():
+    global _holdem_combos_disjoint
+    if _holdem_combos_disjoint is None:
+        _holdem_combos_disjoint = (holdem_combo_masks[:, np.newaxis] & holdem_combo_masks[np.newaxis, :]) == 0
+    return _holdem_combos_disjoint
+
+def cards_mask(card_indices):
+    mask = np.int64(0)
+    for index in card_indices:
+        mask |= np.int64(1) << np.int64(index)
+    return mask
+
+# Ranks of all 1326 combos, on each of (R, 5) full boards. Combos that use a board card get WHEEL_RANK (not used).
+def combo_ranks_on_boards(boards):
+    boards = np.asarray(boards, dtype=np.int64)
+    num_boards = len(boards)
+    hands = np.empty((num_boards, NUM_HOLDEM_COMBOS, 7), dtype=np.int64)
+    hands[:, :, :2] = holdem_combos[np.newaxis, :, :]
+    hands[:, :, 2:] = boards[:, np.newaxis, :]
+    board_masks = np.zeros(num_boards, dtype=np.int64)
+    for k in range(boards.shape[1]):
+        board_masks |= np.int64(1) << boards[:, k]
+    blocked = (holdem_combo_masks[np.newaxis, :] & board_masks[:, np.newaxis]) != 0
+    ranks = np.full((num_boards, NUM_HOLDEM_COMBOS), WHEEL_RANK, dtype=np.int64)
+    ranks[~blocked] = hand_rank_cards_batch(card_index_hash_tags[hands[~blocked]])
+    return (ranks, blocked)
+
+# Showdown of every combo vs range weights, on one full board. Returns (win, tie, total) weight arrays (1326,).
+# Only counts opponent combos disjoint from ours. Weights of combos blocked by the board must already be zero.
+def range_showdown(ranks, oppn_weights):
+    order = np.argsort(ranks, kind='mergesort')
+    sorted_ranks = ranks[order]
+    cumulative = np.concatenate(([0.0], np.cumsum(oppn_weights[order])))
+    better = cumulative[np.searchsorted(sorted_ranks, ranks, side='left')] # lower rank is a better hand
+    not_worse = cumulative[np.searchsorted(sorted_ranks, ranks, side='right')]
+    total = np.full(NUM_HOLDEM_COMBOS, cumulative[-1])
+
+    # Same, for combos that contain each card. Keys (card, rank) in one sorted array.
+    card_keys = (np.arange(52)[:, np.newaxis] * RANGE_RANK_SHIFT + ranks[card_combos]).ravel()
+    card_order = np.argsort(card_keys, kind='mergesort')
+    sorted_keys = card_keys[card_order]
+    card_cumulative = np.concatenate(([0.0], np.cumsum(oppn_weights[card_combos].ravel()[card_order])))
+    for k in range(2):
+        card_base = holdem_combos[:, k] * RANGE_RANK_SHIFT
+        start = card_cumulative[np.searchsorted(sorted_keys, card_base, side='left')]
+        better -= card_cumulative[np.searchsorted(sorted_keys, card_base + ranks, side='left')] - start
+        not_worse -= card_cumulative[np.searchsorted(sorted_keys, card_base + ranks, side='right')] - start
+        total -= card_cumulative[np.searchsorted(sorted_keys, card_base + RANGE_RANK_SHIFT, side='left')] - start
+    not_worse += oppn_weights
+    total += oppn_weights
+    return (total - not_worse, not_worse - better, total)
+
+# Our hand vs a range (1326 or 169 weights, None = random hand). Exact on turn and river, sampled before.
+def hand_vs_range_equity(our_cards, community_cards, oppn_range=None, num_samples=RANGE_EQUITY_SAMPLES, rng=None):
+    assert len(our_cards) == 2, 'Need holdem hand for equity. Given %s' % hand_string(our_cards)
+    our_range = np.zeros(NUM_HOLDEM_COMBOS)
+    our_range[holdem_combo(our_cards)] = 1.0
+    return range_equity(our_range, oppn_range, community_cards, num_samples=num_samples, rng=rng)
+
+# Equity of our range vs opponent range, given 0, 3, 4 or 5 community cards.
+def range_equity(our_range, oppn_range, community_cards, num_samples=RANGE_EQUITY_SAMPLES, rng=None):
+    assert len(community_cards) in [0, 3, 4, 5], 'Illegal community cards %s' % hand_string(community_cards)
+    board_indices = [card.index for card in community_cards]
+    board_mask = cards_mask(board_indices)
+    board_blocked = (holdem_combo_masks & board_mask) != 0
+    our_weights = np.where(board_blocked, 0.0, range_weights(our_range))
+    oppn_weights = np.where(board_blocked, 0.0, range_weights(oppn_range))
+    assert our_weights.sum() > 0 and oppn_weights.sum() > 0, 'Empty range, after removing board cards %s' % hand_string(community_cards)
+    if len(board_indices) >= 4:
+        return range_equity_exact(our_weights, oppn_weights, board_indices)
+    return range_equity_sampled(our_weights, oppn_weights, board_indices, num_samples, rng=rng)
+
+# Every river (if turn), showdown of both ranges. Runout can not use a card from either combo.
+def range_equity_exact(our_weights, oppn_weights, board_indices):
+    if len(board_indices) == 5:
+        boards = np.array([board_indices], dtype=np.int64)
+    else:
+        rivers = [index for index in range(52) if not index in board_indices]
+        boards = np.array([board_indices + [river] for river in rivers], dtype=np.int64)
+    (ranks, blocked) = combo_ranks_on_boards(boards)
+    win = np.zeros(NUM_HOLDEM_COMBOS)
+    tie = np.zeros(NUM_HOLDEM_COMBOS)
+    total = np.zeros(NUM_HOLDEM_COMBOS)
+    category_weights = np.zeros(len(HIGH_HAND_CATEGORIES))
+    for b in range(len(boards)):
+        board_oppn_weights = np.where(blocked[b], 0.0, oppn_weights)
+        (board_win, board_tie, board_total) = range_showdown(ranks[b], board_oppn_weights)
+        board_our_weights = np.where(blocked[b], 0.0, our_weights)
+        win += board_our_weights * board_win
+        tie += board_our_weights * board_tie
+        total += board_our_weights * board_total
+        category_weights += np.bincount(high_hand_category_index_by_rank[ranks[b]], weights=board_our_weights * board_total,
+                                        minlength=len(HIGH_HAND_CATEGORIES))
+    equity = HoldemEquityResult()
+    total_weight = total.sum()
+    equity.win = win.sum() / total_weight
+    equity.tie = tie.sum() / total_weight
+    equity.loss = 1.0 - equity.win - equity.tie
+    equity.value = equity.win + 0.5 * equity.tie
+    equity.category_values = list(category_weights / total_weight)
+    equity.sample_size = len(boards)
+    equity.exact = True
+    with np.errstate(invalid='ignore', divide='ignore'):
+        equity.combo_values = np.where(total > 0, (win + 0.5 * tie) / total, np.nan)
+    return equity
+
+# Sample (our combo, their combo, runout). Our combo from its marginal [our weight x weight of disjoint opponent combos],
+# their combo given ours, then runout from cards left.
+def range_equity_sampled(our_weights, oppn_weights, board_indices, num_samples, rng=None):
+    rng = poker_random(rng)
+    disjoint = holdem_combos_disjoint()
+    our_marginal = our_weights * disjoint.dot(oppn_weights)
+    our_combos = rng.np.choice(NUM_HOLDEM_COMBOS, size=num_samples, p=our_marginal / our_marginal.sum())
+    oppn_cumulative = np.cumsum(disjoint[our_combos] * oppn_weights[np.newaxis, :], axis=1)
+    targets = rng.np.random_sample(num_samples) * oppn_cumulative[:, -1]
+    oppn_combos = np.minimum((oppn_cumulative <= targets[:, np.newaxis]).sum(axis=1), NUM_HOLDEM_COMBOS - 1)
+
+    # Runout from cards not on the board, and not in either hand. Smallest random keys, among live cards.
+    board_needed = 5 - len(board_indices)
+    keys = rng.np.random_sample((num_samples, 52))
+    keys[:, board_indices] = 2.0
+    rows = np.arange(num_samples)[:, np.newaxis]
+    keys[rows, holdem_combos[our_combos]] = 2.0
+    keys[rows, holdem_combos[oppn_combos]] = 2.0
+    runouts = np.argpartition(keys, board_needed - 1, axis=1)[:, :board_needed]
+    boards = np.hstack((np.tile(np.array(board_indices, dtype=np.int64), (num_samples, 1)), runouts))
+
+    our_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((holdem_combos[our_combos], boards))])
+    oppn_ranks = hand_rank_cards_batch(card_index_hash_tags[np.hstack((holdem_combos[oppn_combos], boards))])
+    return equity_result_from_ranks(our_ranks, oppn_ranks)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate preflop equity tables for Hold\'em.')
+    parser.add_argument('-class_samples', '--class_samples', type=int, default=PREFLOP_CLASS_SAMPLES, help='samples per hand class, vs random hand')
+    parser.add_argument('-matchup_samples', '--matchup_samples', type=int, default=PREFLOP_MATCHUP_SAMPLES, help='samples per matchup')
+    parser.add_argument('-workers', '--workers', type=int, default=1, help='processes for matchups table')
+    parser.add_argument('--skip_matchups', action='store_true', help='only generate the 169 classes table')
+    parser.add_argument('-seed', '--seed', type=int, default=0, help='base random seed (tables are reproducible, for any number of workers)')
+    args = parser.parse_args()
+
+    generate_preflop_class_table(num_samples=args.class_samples, seed=args.seed)
+    if not args.skip_matchups:
+        generate_preflop_matchup_table(num_samples=args.matchup_samples, workers=args.workers, seed=args.seed)
@@ -1,14 +1,23 @@
+import os
 import sys
+import csv
+import time
 import logging
 import math
+import sqlite3
+import collections
 import re
 import random
 import numpy as np
 import scipy.stats as ss
 import itertools
+import argparse # command line arguements parsing
 from poker_hashes import *
 from poker_util import *
 from poker_lib import *
+from poker_tables import *
+from holdem_equity import * # vectorized allin/equity simulation
+from hand_isomorphism import * # canonical form and index, up to suit permutation
 
 """
 An extension of poker_lib for Hold'em games: Texas Hold'em, and Omaha Hold'em.
@@ -50,13 +59,13 @@ HOLDEM_ROUNDS_SET = {PREFLOP_ROUND, FLOP_ROUND, TURN_ROUND, RIVER_ROUND}
 HOLDEM_VALUE_KEYS = ['best_value'] + [categoryName[category] for category in HIGH_HAND_CATEGORIES]
 
 # For allin simulation... use cache so we don't sim same thing for each bet (same street). 
-# Clear once in a while... in case lots of hands, to save memory, etc.
-POKER_VALUES_CACHE_MAX = 1000
+# Least recently used values dropped, in case lots of hands, to save memory, etc.
+POKER_VALUES_CACHE_MAX = 10000
 
 # Cashier for Texas Holdem. Evaluates hands, as well as compares hands.
 class HoldemCashier(PayoutTable):
     # Compare hands.
-    # TODO: Hand split pots, other % payouts. Should really output [hand_id: % pot]
+    # NOTE: Returns None on ties. For split pots, see showdown_shares.
     def showdown(self, hands):
         #print('using HoldemCashier to compare hands')
         # As a hack... output hand with best (2-7) rank. Ties go to best position...
@@ -73,17 +82,18 @@ class HoldemCashier(PayoutTable):
                 #raise NotImplementedError()
         return best_hand
 
+    # Share of the pot for each hand [same order]. Best rank wins, ties split evenly.
+    def showdown_shares(self, hands):
+        for hand in hands:
+            hand.evaluate()
+        best_rank = min([hand.rank for hand in hands])
+        num_winners = len([hand for hand in hands if hand.rank == best_rank])
+        return [(1.0 / num_winners if hand.rank == best_rank else 0.0) for hand in hands]
+
 # Evaluate a 2-card hold'em hand, with 3+ community cards
 # NOTE: Can use 0-2 from dealt_cards and the rest from community.
 # TODO: Add game type (or new function) to support Omaha when we get there (needs two cards exclusively)
-# NOTE: Will raise an exception if not enough cards.
-exclude_1_choose_6 = [{0}, {1}, {2}, {3}, {4}, {5}]
-exclude_2_choose_7 = [{0,1}, {0,2}, {0,3}, {0,4}, {0,5}, {0,6}, 
-                      {1,2}, {1,3}, {1,4}, {1,5}, {1,6},
-                      {2,3}, {2,4}, {2,5}, {2,6},
-                      {3,4}, {3,5}, {3,6},
-                      {4,5}, {4,6},
-                      {5,6}]
+# NOTE: Uses precomputed 5-7 card tables (see poker_tables), rather than trying all 5-card subsets. Same rank scale.
 def hand_rank_community_cards(dealt_cards, community_cards):
     assert len(dealt_cards) == 2, 'Need holdem hand for eval. Given %s' % dealt_cards
     all_cards = dealt_cards + community_cards
@@ -93,69 +103,212 @@ def hand_rank_community_cards(dealt_cards, community_cards):
     if len(all_cards) < 5 or len(all_cards) > 7:
         #print('Illegal number of cards for evaluation! %s' % hand_string(all_cards))
         return
-    elif len(all_cards) == 5:
-        return hand_rank_five_card(all_cards)
-    elif len(all_cards) == 6:
-        exclude_array = exclude_1_choose_6
-    elif len(all_cards) == 7:
-        exclude_array = exclude_2_choose_7
-
-    # Try every draw, and return the best rank
-    best_rank = -1
-    for exclude_index in exclude_array:
-        exclude_cards = []
-        include_cards = []
-        for index in range(len(all_cards)):
-            card = all_cards[index]
-            if index in exclude_index:
-                exclude_cards.append(card)
-            else:
-                include_cards.append(card)
-        #print('trying hand %s with excluded %s' % (hand_string(include_cards), hand_string(exclude_cards)))
-        rank = hand_rank_five_card(include_cards)
-        if best_rank < 0 or rank < best_rank:
-            #print('best hand!')
-            best_rank = rank
-    return best_rank
+    return hand_rank_cards(all_cards)
+
+# Combine two cache entries (value, stdev, categories, sample_count, exact), for the same situation.
+# Values and categories weighted by samples. Stdev (per sample) pooled, including spread between the two means.
+# Exact entry wins over any samples.
+def merge_cached_values(old_entry, new_entry):
+    (old_value, old_stdev, old_categories, old_count, old_exact) = old_entry
+    (new_value, new_stdev, new_categories, new_count, new_exact) = new_entry
+    if old_exact or not new_count:
+        return old_entry
+    if new_exact or not old_count:
+        return new_entry
+    count = old_count + new_count
+    value = (old_value * old_count + new_value * new_count) / float(count)
+    square_sum = old_count * old_stdev ** 2 + new_count * new_stdev ** 2 + old_count * new_count * (old_value - new_value) ** 2 / float(count)
+    stdev = math.sqrt(square_sum / count)
+    categories = new_categories
+    if old_categories and new_categories:
+        categories = [(old_c * old_count + new_c * new_count) / float(count) for (old_c, new_c) in zip(old_categories, new_categories)]
+    elif old_categories:
+        categories = old_categories
+    return (value, stdev, categories, count, False)
 
 # Move this out of Holdem... if values cache goes outside of Holdem
+# Bounded LRU: when over cache_max entries, drop the least recently used. Counts hits and misses, to see if cache helps.
 class HoldemValuesCache:
     def __init__(self, cache_max = POKER_VALUES_CACHE_MAX):
         self.cache_max = cache_max
-        self.values_map = {}
+        self.values_map = collections.OrderedDict() # least recently used first
+        self.hits = 0
+        self.reverse_hits = 0 # subset of hits, from (oppn, our) entry
+        self.misses = 0
+        self.evictions = 0
+        self.compute_seconds = 0.0 # time to compute the values inserted
+        self.computed = 0
 
     # Assume that all cards given as [Card] array.
-    # NOTE: Assumes that inputs are NOT canonicalized or sorted
+    # NOTE: Inputs do not need to be canonicalized or sorted. Key is the same for all suit-equivalent situations.
     def key(self, our_hand, oppn_hand, flop, turn, river):
-        return '{}/{}:{}/{}/{}'.format(hand_string(our_hand), hand_string(oppn_hand), 
-                                   hand_string(flop), hand_string(turn), hand_string(river))
+        return isomorphic_key([our_hand, oppn_hand, flop, turn, river])
     
-    # Standard dictionary insert
-    def insert(self, our_hand, oppn_hand, flop, turn, river, value, stdev, categories = []):
+    # Insert, or add more samples to existing entry. Seconds = time it took to compute (for stats).
+    def insert(self, our_hand, oppn_hand, flop, turn, river, value, stdev, categories = [], sample_count = 1, exact = False, seconds = 0.0):
         key = self.key(our_hand, oppn_hand, flop, turn, river)
         # print('~> cache insert key: %s\t val: %s' % (key, [value, stdev]))
-        self.values_map[key] = (value, stdev, categories)
-
-    # Cache lookup: (value, stdev). Returns (None, None) if not found.
-    def lookup(self, our_hand, oppn_hand, flop, turn, river):
+        self.insert_key(key, (value, stdev, categories, sample_count, exact))
+        self.compute_seconds += seconds
+        self.computed += 1
+
+    def insert_key(self, key, entry):
+        if key in self.values_map:
+            entry = merge_cached_values(self.values_map[key], entry)
+        self.remember(key, entry)
+
+    # Move to most recent, and evict if full.
+    def remember(self, key, entry):
+        if key in self.values_map:
+            del self.values_map[key]
+        self.values_map[key] = entry
+        while len(self.values_map) > self.cache_max:
+            self.values_map.popitem(last=False)
+            self.evictions += 1
+
+    # Cache lookup: (value, stdev, categories). Returns (None, None, None) if not found.
+    # min_samples = treat entries with fewer samples as missing (caller simulates more, and inserts)
+    def lookup(self, our_hand, oppn_hand, flop, turn, river, min_samples = 0):
         key = self.key(our_hand, oppn_hand, flop, turn, river)
+        entry = self.lookup_key(key)
+        if entry and (entry[4] or entry[3] >= min_samples):
+            self.hits += 1
+            return entry[:3]
+
+        # Reverse key: opponent's value vs our hand is (1 - value). Tie counted as half, so exact.
+        # NOTE: We can not use 'reverse key' if returning category estimates [categories unique per hand]. Or vs random hand.
+        if oppn_hand:
+            reverse_entry = self.lookup_key(self.key(oppn_hand, our_hand, flop, turn, river))
+            if reverse_entry and not reverse_entry[2] and (reverse_entry[4] or reverse_entry[3] >= min_samples):
+                self.hits += 1
+                self.reverse_hits += 1
+                (value, stdev, categories, sample_count, exact) = reverse_entry
+                return (1.0 - value, stdev, [])
+
+        self.misses += 1
+        return (None, None, None)
+
+    def lookup_key(self, key):
+        entry = self.values_map.get(key)
+        if entry is not None:
+            self.remember(key, entry)
+        return entry
+
+    # Time not spent recomputing values: hits, at average cost of computing a value.
+    def time_saved(self):
+        if not self.computed:
+            return 0.0
+        return self.hits * self.compute_seconds / self.computed
+
+    def stats_string(self):
+        lookups = self.hits + self.misses
+        return ('values cache: %d entries, %d hits (%d reverse), %d misses (%.1f%% hit rate), %d evictions, %.2fs saved' %
+                (len(self.values_map), self.hits, self.reverse_hits, self.misses, 100.0 * self.hits / max(lookups, 1), self.evictions, self.time_saved()))
+
+    # Nothing to clear, since LRU stays within cache_max. Kept for callers that clear between hands.
+    def clear_cache_if_full(self):
+        pass
+
+# Where to keep values between runs. Shared by all workers (read-mostly).
+POKER_VALUES_CACHE_FILE = os.environ.get('POKER_VALUES_CACHE_FILE', poker_table_path('holdem_values.sqlite'))
+POKER_VALUES_CACHE_FLUSH_SIZE = 200 # write new values to disk in batches
+POKER_VALUES_CACHE_TIMEOUT = 60.0 # seconds, to wait on another worker's write
+
+# Same interface as HoldemValuesCache, backed by SQLite file. In-memory map in front of it.
+# - keyed by isomorphic key (card group sizes, index), so all suit-equivalent situations share an entry
+# - stores (value, stdev, categories, sample_count, exact). New samples for the same situation accumulate
+# - WAL journal: readers never block, writers batch (one transaction per flush)
+# NOTE: One connection per process, opened lazily. So safe to create before forking workers.
+class HoldemValuesDiskCache(HoldemValuesCache):
+    def __init__(self, cache_file = POKER_VALUES_CACHE_FILE, cache_max = POKER_VALUES_CACHE_MAX):
+        HoldemValuesCache.__init__(self, cache_max = cache_max)
+        self.cache_file = cache_file
+        self.pending_map = {} # new samples, not yet on disk
+        self.connection = None
+        self.connection_pid = None
+        self.disk_reads = 0
+
+    def connect(self):
+        if self.connection is None or self.connection_pid != os.getpid():
+            cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+            if not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    pass # created by another process
+            self.connection = sqlite3.connect(self.cache_file, timeout = POKER_VALUES_CACHE_TIMEOUT, isolation_level = None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS holdem_values (sizes TEXT, idx INTEGER, value REAL, stdev REAL, categories TEXT, ' +
+                                    'sample_count INTEGER, exact INTEGER, PRIMARY KEY (sizes, idx))')
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def select_entry(self, key):
+        (sizes, index) = key
+        row = self.connect().execute('SELECT value, stdev, categories, sample_count, exact FROM holdem_values WHERE sizes=? AND idx=?',
+                                     (','.join([str(size) for size in sizes]), index)).fetchone()
+        if not row:
+            return None
+        (value, stdev, categories, sample_count, exact) = row
+        categories = [float(c) for c in categories.split(',')] if categories else []
+        return (value, stdev, categories, sample_count, bool(exact))
+
+    # Memory first, then disk. Disk entries stay in memory, for the next lookup.
+    def lookup_key(self, key):
+        entry = HoldemValuesCache.lookup_key(self, key)
+        if entry is None:
+            entry = self.select_entry(key)
+            if entry is not None:
+                self.disk_reads += 1
+            # Evicted from memory, before written to disk.
+            if key in self.pending_map:
+                entry = merge_cached_values(entry, self.pending_map[key]) if entry else self.pending_map[key]
+            if entry is not None:
+                self.remember(key, entry)
+        return entry
+
+    def insert_key(self, key, entry):
+        # If not in memory, load from disk first. So memory entry has all samples.
+        self.lookup_key(key)
+        HoldemValuesCache.insert_key(self, key, entry)
+        if key in self.pending_map:
+            entry = merge_cached_values(self.pending_map[key], entry)
+        self.pending_map[key] = entry
+        if len(self.pending_map) >= POKER_VALUES_CACHE_FLUSH_SIZE:
+            self.flush()
+
+    # Write new samples to disk, merged with whatever is there now (other workers may have added samples).
+    def flush(self):
+        if not self.pending_map:
+            return
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for (key, entry) in self.pending_map.items():
+                disk_entry = self.select_entry(key)
+                if disk_entry is not None:
+                    entry = merge_cached_values(disk_entry, entry)
+                (value, stdev, categories, sample_count, exact) = entry
+                connection.execute('INSERT OR REPLACE INTO holdem_values VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   (','.join([str(size) for size in key[0]]), int(key[1]), float(value), float(stdev),
+                                    ','.join(['%.6f' % c for c in categories]), int(sample_count), int(exact)))
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        self.pending_map = {}
+
+    # Between hands. Memory entries may be evicted any time, since values are on disk.
+    def clear_cache_if_full(self):
+        self.flush()
 
-        # NOTE: We can not use 'reverse key' if returning category estimates [categories unique per hand]
-        #reverse_key = self.key(oppn_hand, our_hand, flop, turn, river) # -1 * value
-
-        if self.values_map and self.values_map.has_key(key):
-            return self.values_map[key]
-        #elif self.values_map and self.values_map.has_key(reverse_key):
-        #    (value, stdev, categories) =  self.values_map[reverse_key]
-        #    return (1.0 - value, stdev)
-        else:
-            return (None, None, None)
+    def stats_string(self):
+        return '%s, %d from disk' % (HoldemValuesCache.stats_string(self), self.disk_reads)
 
-    # Clear the cache... if over the (recommended) max.
-    # Only clear between hands, and when too big (in case 20k hands, etc)
-    def clear_cache_if_full(self):
-        if len(self.values_map) > self.cache_max:
-            self.values_map = {}
+    def __len__(self):
+        self.flush()
+        return self.connect().execute('SELECT COUNT(*) FROM holdem_values').fetchone()[0]
     
 
 # Community cards. Not part of the deck. But also not really a hand. 
@@ -281,3 +434,143 @@ class HoldemHand:
         return 'Holdem hand: %s Community %s (rank: %d, category: %s)' % (hand_string(self.dealt_cards),
                                                                           self.community,
                                                                           self.rank, self.category_name)
+
+
+#######################################################################
+## Expected hand strength, for abstraction (hand buckets) and CNN side targets.
+## Hand strength (HS) = equity vs random hand, on the river. EHS = E[HS] over runouts. EHS2 = E[HS^2] rewards draws.
+## And histogram of HS over runouts (N equal bins on [0, 1]) -- full distribution, not just the average.
+## Nested enumeration: every runout, and on each river board, every opponent hand. All 1326 combos ranked at once
+## per board (see combo_ranks_on_boards), so many hands on the same board share runouts and ranks.
+## Exact if at most HAND_STRENGTH_EXACT_RUNOUTS runouts (flop and later). Otherwise sample runouts (preflop).
+#######################################################################
+HAND_STRENGTH_BINS = 10
+HAND_STRENGTH_EXACT_RUNOUTS = 1176 # C(49, 2) flop runouts ~1s. Lower this, to sample the flop instead.
+HAND_STRENGTH_SAMPLES = 500 # runouts, if not exact
+HAND_STRENGTH_CHUNK = 256 # boards ranked at once (memory)
+
+class HandStrengthResult(object):
+    def __init__(self, num_bins=HAND_STRENGTH_BINS):
+        self.ehs = 0.0
+        self.ehs2 = 0.0
+        self.histogram = np.zeros(num_bins) # odds of river HS in each bin
+        self.sample_size = 0 # or number of runouts, if exact
+        self.exact = False
+
+    def __str__(self):
+        return 'EHS %.4f EHS2 %.4f histogram %s, %d %s' % (self.ehs, self.ehs2, [round(x, 4) for x in self.histogram],
+                                                           self.sample_size, 'runouts (exact)' if self.exact else 'samples')
+
+# EHS, EHS2 and HS histogram for each of hands [[Card, Card]], on the same community cards [0, 3, 4 or 5].
+# Runouts shared by all hands. Runouts that use a hand's cards, are skipped for that hand.
+def hand_strength_features(hands, community_cards, num_bins=HAND_STRENGTH_BINS, num_samples=HAND_STRENGTH_SAMPLES,
+                           exact_runouts=HAND_STRENGTH_EXACT_RUNOUTS, rng=None):
+    assert len(community_cards) in [0, 3, 4, 5], 'Illegal community cards %s' % hand_string(community_cards)
+    board_indices = [card.index for card in community_cards]
+    # With just one hand, deal runouts around its cards too. Otherwise, only around the board.
+    dead_indices = set(board_indices + ([card.index for card in hands[0]] if len(hands) == 1 else []))
+    remaining_indices = np.array([index for index in range(52) if not index in dead_indices], dtype=np.int64)
+    board_needed = 5 - len(board_indices)
+    exact = choose(len(remaining_indices), board_needed) <= exact_runouts
+    if exact:
+        runouts = remaining_indices[combination_indices(len(remaining_indices), board_needed).astype(np.int64)]
+    else:
+        runouts = sample_cards_without_replacement(remaining_indices, num_samples, board_needed, rng=rng)
+    boards = np.hstack((np.tile(np.array(board_indices, dtype=np.int64), (len(runouts), 1)), runouts))
+
+    # HS for every (hand, runout). NaN if runout uses the hand's cards.
+    hand_combos = np.array([holdem_combo(hand) for hand in hands], dtype=np.int64)
+    disjoint = holdem_combos_disjoint()[hand_combos] # (H, 1326)
+    strengths = np.full((len(hands), len(boards)), np.nan)
+    for start in range(0, len(boards), HAND_STRENGTH_CHUNK):
+        (ranks, blocked) = combo_ranks_on_boards(boards[start:start+HAND_STRENGTH_CHUNK])
+        for h in range(len(hands)):
+            live = disjoint[h][np.newaxis, :] & ~blocked # (R, 1326) opponent hands
+            our_ranks = ranks[:, hand_combos[h]][:, np.newaxis]
+            wins = (live & (ranks > our_ranks)).sum(axis=1)
+            ties = (live & (ranks == our_ranks)).sum(axis=1)
+            num_live = live.sum(axis=1)
+            valid = ~blocked[:, hand_combos[h]]
+            strengths[h, start:start+len(ranks)][valid] = (wins[valid] + 0.5 * ties[valid]) / num_live[valid].astype(np.float64)
+
+    results = []
+    for h in range(len(hands)):
+        hand_strengths = strengths[h][~np.isnan(strengths[h])]
+        result = HandStrengthResult(num_bins)
+        result.ehs = hand_strengths.mean()
+        result.ehs2 = (hand_strengths ** 2).mean()
+        bins = np.minimum((hand_strengths * num_bins).astype(np.int64), num_bins - 1)
+        result.histogram = np.bincount(bins, minlength=num_bins) / float(len(hand_strengths))
+        result.sample_size = len(hand_strengths)
+        result.exact = exact
+        results.append(result)
+    return results
+
+def hand_strength(hand, community_cards, num_bins=HAND_STRENGTH_BINS, num_samples=HAND_STRENGTH_SAMPLES,
+                  exact_runouts=HAND_STRENGTH_EXACT_RUNOUTS, rng=None):
+    return hand_strength_features([hand], community_cards, num_bins=num_bins, num_samples=num_samples,
+                                  exact_runouts=exact_runouts, rng=rng)[0]
+
+# Bulk mode. For event CSV [with header, see TRIPLE_DRAW_EVENT_HEADER], add ehs, ehs2 and ehs_histogram for 'hand'.
+# Events grouped by board, so each board's runouts are ranked once, for all hands seen on it.
+# Rows that are not a hold'em hand [or can't parse] get empty values.
+HAND_STRENGTH_CSV_KEYS = ['ehs', 'ehs2', 'ehs_histogram']
+def hand_strength_csv(input_filename, output_filename, num_bins=HAND_STRENGTH_BINS, num_samples=HAND_STRENGTH_SAMPLES,
+                      exact_runouts=HAND_STRENGTH_EXACT_RUNOUTS, rng=None):
+    csv_reader = csv.reader(open(input_filename, 'rb'), lineterminator='\n')
+    header = next(csv_reader)
+    csv_key_map = CreateMapFromCSVKey(header)
+    lines = [line for line in csv_reader]
+
+    # (hand, board) for every line, if we can parse it.
+    situations = [None for line in lines]
+    board_hands = {}
+    for i in range(len(lines)):
+        try:
+            hand = [card_from_string(card) for card in hand_string_to_array(lines[i][csv_key_map['hand']])]
+            board = [card_from_string(card) for card in (hand_string_to_array(lines[i][csv_key_map['best_draw']]) +
+                                                         hand_string_to_array(lines[i][csv_key_map['hand_after']]))]
+        except (KeyError, IndexError):
+            continue
+        if len(hand) != 2 or not len(board) in [0, 3, 4, 5]:
+            continue
+        board_key = tuple(sorted([card.index for card in board]))
+        hand_key = tuple(sorted([card.index for card in hand]))
+        situations[i] = (board_key, hand_key)
+        if not board_key in board_hands:
+            board_hands[board_key] = {}
+        board_hands[board_key][hand_key] = hand
+
+    now = time.time()
+    features = {}
+    for board_key in board_hands.keys():
+        hand_keys = board_hands[board_key].keys()
+        results = hand_strength_features([board_hands[board_key][hand_key] for hand_key in hand_keys],
+                                         [card_from_index(index) for index in board_key], num_bins=num_bins,
+                                         num_samples=num_samples, exact_runouts=exact_runouts, rng=rng)
+        for (hand_key, result) in zip(hand_keys, results):
+            features[(board_key, hand_key)] = result
+    print('%.2fs to compute hand strength for %d situations, on %d boards' % (time.time() - now, len(features), len(board_hands)))
+
+    csv_writer = csv.writer(open(output_filename, 'wb'))
+    csv_writer.writerow(header + HAND_STRENGTH_CSV_KEYS)
+    for i in range(len(lines)):
+        if situations[i] is None:
+            csv_writer.writerow(lines[i] + ['' for key in HAND_STRENGTH_CSV_KEYS])
+            continue
+        result = features[situations[i]]
+        csv_writer.writerow(lines[i] + [result.ehs, result.ehs2, [round(x, 5) for x in result.histogram]])
+    print('wrote %d lines to %s' % (len(lines), output_filename))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add hand strength features (EHS, EHS2, histogram) to hold\'em event CSV.')
+    parser.add_argument('-input', '--input', required=True, help='event CSV, with header')
+    parser.add_argument('-output', '--output', required=True, help='output CSV, with ehs, ehs2 and ehs_histogram added')
+    parser.add_argument('-bins', '--bins', type=int, default=HAND_STRENGTH_BINS, help='histogram bins')
+    parser.add_argument('-samples', '--samples', type=int, default=HAND_STRENGTH_SAMPLES, help='runouts to sample, if not exact')
+    parser.add_argument('-exact_runouts', '--exact_runouts', type=int, default=HAND_STRENGTH_EXACT_RUNOUTS, help='enumerate runouts, if at most this many')
+    parser.add_argument('-seed', '--seed', type=int, default=None, help='random seed, for reproducible samples')
+    args = parser.parse_args()
+
+    hand_strength_csv(args.input, args.output, num_bins=args.bins, num_samples=args.samples, exact_runouts=args.exact_runouts,
+                      rng=(PokerRandom(args.seed) if args.seed is not None else None))
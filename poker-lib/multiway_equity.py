@@ -0,0 +1,146 @@
+import sys
+import time
+import argparse # command line arguements parsing
+import numpy as np
+from poker_lib import *
+from poker_util import *
+from poker_tables import *
+from holdem_equity import HOLDEM_EQUITY_SAMPLES, HOLDEM_EQUITY_EXACT_THRESHOLD
+
+"""
+Multiway (3-10 players) allin equity, with split pots. Hold'em high, and 2-7 lowball (one draw to come, or pat).
+
+Every player's expected share of the pot. Winners split the pot evenly, so 3-way tie for best hand = 1/3 each.
+
+All runouts sampled (or enumerated) at once as card index arrays. All players ranked in one batch evaluation
+[(runouts x players) hands], then best rank per runout, and shares. So cost grows linearly with number of players.
+"""
+
+MULTIWAY_MAX_PLAYERS = 10
+
+# Results of a multiway equity calculation. Arrays, one value per player.
+class MultiwayEquityResult(object):
+    def __init__(self, num_players):
+        self.num_players = num_players
+        self.value = np.zeros(num_players) # expected share of the pot
+        self.win = np.zeros(num_players) # odds of winning the whole pot
+        self.tie = np.zeros(num_players) # odds of splitting the pot (any number of ways)
+        self.stdev = np.zeros(num_players) # stdev of per-sample pot shares. Not the stdev of the average.
+        self.sample_size = 0 # or number of runouts, if exact
+        self.exact = False
+
+    def __str__(self):
+        return '\n'.join(['player %d: equity %.4f (win %.4f, tie %.4f) +-%.4f stdev' % (i, self.value[i], self.win[i], self.tie[i], self.stdev[i])
+                          for i in range(self.num_players)] + ['%d %s' % (self.sample_size, 'runouts (exact)' if self.exact else 'samples')])
+
+# Pot shares from (R, N) ranks, lower is better. Each runout, best rank(s) split the pot.
+def pot_shares_from_ranks(ranks):
+    best_ranks = ranks.min(axis=1)
+    winners = (ranks == best_ranks[:, np.newaxis])
+    num_winners = winners.sum(axis=1)
+    return winners / num_winners[:, np.newaxis].astype(np.float64)
+
+def multiway_result_from_ranks(ranks, exact=False):
+    (num_runouts, num_players) = ranks.shape
+    shares = pot_shares_from_ranks(ranks)
+    equity = MultiwayEquityResult(num_players)
+    equity.value = shares.mean(axis=0)
+    equity.win = (shares == 1.0).mean(axis=0)
+    equity.tie = ((shares > 0.0) & (shares < 1.0)).mean(axis=0)
+    equity.stdev = shares.std(axis=0)
+    equity.sample_size = num_runouts
+    equity.exact = exact
+    return equity
+
+# Card indices, not in any of the given card lists.
+def remaining_card_indices(*card_lists):
+    dead_indices = set([card.index for cards in card_lists for card in cards])
+    return np.array([index for index in range(52) if not index in dead_indices], dtype=np.int64)
+
+# Expected pot share for each hold'em player. hands = [[Card, Card] or None (random hand)], and 0, 3, 4 or 5 community cards.
+# Enumerate all runouts if there are few enough (and no random hands). Otherwise sample.
+def holdem_multiway_equity(hands, community_cards, num_samples=HOLDEM_EQUITY_SAMPLES, exact_threshold=HOLDEM_EQUITY_EXACT_THRESHOLD, rng=None):
+    num_players = len(hands)
+    assert 2 <= num_players <= MULTIWAY_MAX_PLAYERS, 'Need 2-%d players for multiway equity. Given %d' % (MULTIWAY_MAX_PLAYERS, num_players)
+    assert len(community_cards) in [0, 3, 4, 5], 'Illegal community cards %s' % hand_string(community_cards)
+    for hand in hands:
+        assert hand is None or len(hand) == 2, 'Need holdem hand for equity. Given %s' % hand_string(hand)
+    known_hands = [hand for hand in hands if hand is not None]
+    remaining_indices = remaining_card_indices(community_cards, *known_hands)
+    board_needed = 5 - len(community_cards)
+    random_hands = num_players - len(known_hands)
+    cards_needed = board_needed + 2 * random_hands
+    assert cards_needed <= len(remaining_indices), 'Not enough cards left for %d players' % num_players
+
+    # Runouts: random hands first (2 columns each), then the rest of the board.
+    exact = (random_hands == 0 and choose(len(remaining_indices), board_needed) <= exact_threshold)
+    if exact:
+        runouts = remaining_indices[combination_indices(len(remaining_indices), board_needed).astype(np.int64)]
+    else:
+        runouts = sample_cards_without_replacement(remaining_indices, num_samples, cards_needed, rng=rng)
+    num_runouts = len(runouts)
+    boards = np.hstack((np.tile(np.array([card.index for card in community_cards], dtype=np.int64), (num_runouts, 1)),
+                        runouts[:, 2 * random_hands:]))
+
+    # All players' 7-card hands, evaluated in one batch.
+    player_cards = np.empty((num_players, num_runouts, 7), dtype=np.int64)
+    player_cards[:, :, 2:] = boards[np.newaxis, :, :]
+    random_hand = 0
+    for i in range(num_players):
+        if hands[i] is None:
+            player_cards[i, :, :2] = runouts[:, 2 * random_hand:2 * random_hand + 2]
+            random_hand += 1
+        else:
+            player_cards[i, :, :2] = [card.index for card in hands[i]]
+    ranks = hand_rank_cards_batch(card_index_hash_tags[player_cards.reshape((num_players * num_runouts, 7))])
+    return multiway_result_from_ranks(ranks.reshape((num_players, num_runouts)).T, exact=exact)
+
+# Expected pot share for each 2-7 lowball player. Given cards each player keeps, all draw to 5 cards from the same deck,
+# and showdown (no more draws). Pat hands keep all 5. Exact if only one player draws (and few enough draws).
+def deuce_multiway_equity(kept_hands, num_samples=HOLDEM_EQUITY_SAMPLES, exact_threshold=HOLDEM_EQUITY_EXACT_THRESHOLD, dead_cards=[], rng=None):
+    num_players = len(kept_hands)
+    assert 2 <= num_players <= MULTIWAY_MAX_PLAYERS, 'Need 2-%d players for multiway equity. Given %d' % (MULTIWAY_MAX_PLAYERS, num_players)
+    for hand in kept_hands:
+        assert len(hand) <= 5, 'Can not keep more than 5 cards. Given %s' % hand_string(hand)
+    remaining_indices = remaining_card_indices(dead_cards, *kept_hands)
+    draws_needed = [5 - len(hand) for hand in kept_hands]
+    cards_needed = sum(draws_needed)
+    assert cards_needed <= len(remaining_indices), 'Not enough cards left for %d players to draw %d' % (num_players, cards_needed)
+
+    exact = (len([draws for draws in draws_needed if draws > 0]) <= 1 and choose(len(remaining_indices), cards_needed) <= exact_threshold)
+    if exact:
+        draws = remaining_indices[combination_indices(len(remaining_indices), cards_needed).astype(np.int64)]
+    else:
+        draws = sample_cards_without_replacement(remaining_indices, num_samples, cards_needed, rng=rng)
+    num_runouts = len(draws)
+
+    # Each player's final 5 cards: kept cards, then the next draws_needed columns.
+    player_cards = np.empty((num_players, num_runouts, 5), dtype=np.int64)
+    column = 0
+    for i in range(num_players):
+        num_kept = len(kept_hands[i])
+        player_cards[i, :, :num_kept] = [card.index for card in kept_hands[i]]
+        player_cards[i, :, num_kept:] = draws[:, column:column + draws_needed[i]]
+        column += draws_needed[i]
+    ranks = deuce_rank_five_card_batch(card_index_hash_tags[player_cards.reshape((num_players * num_runouts, 5))])
+    return multiway_result_from_ranks(ranks.reshape((num_players, num_runouts)).T, exact=exact)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multiway allin equity, with split pots.')
+    parser.add_argument('-hands', '--hands', required=True, help='comma separated hands, like AsKd,QhQc,?? [?? for random hand]. For deuce, cards kept [- for none]')
+    parser.add_argument('-board', '--board', default='', help='community cards, like 2c7d9h [holdem]')
+    parser.add_argument('-format', '--format', default='holdem', help='holdem or deuce')
+    parser.add_argument('-samples', '--samples', type=int, default=HOLDEM_EQUITY_SAMPLES, help='runouts to sample, if not exact')
+    parser.add_argument('-seed', '--seed', type=int, default=None, help='random seed, for reproducible samples')
+    args = parser.parse_args()
+
+    rng = PokerRandom(args.seed) if args.seed is not None else None
+    now = time.time()
+    if args.format == 'deuce':
+        kept_hands = [card_array_from_string(hand.replace('-', '')) for hand in args.hands.split(',')]
+        equity = deuce_multiway_equity(kept_hands, num_samples=args.samples, rng=rng)
+    else:
+        hands = [None if hand == '??' else card_array_from_string(hand) for hand in args.hands.split(',')]
+        equity = holdem_multiway_equity(hands, card_array_from_string(args.board), num_samples=args.samples, rng=rng)
+    print(equity)
+    print('%.3fs' % (time.time() - now))
@@ -51,6 +51,8 @@ parser.add_argument('-CNN_old_model_tag', '--CNN_old_model_tag', default=None, h
 parser.add_argument('-CNN_other_old_model', '--CNN_other_old_model', default=None, help='pass for p2 = other old model (or 3rd model)') # and a third model, 
 parser.add_argument('-compare_models', '--compare_models', action='store_true', help="pass for model A vs model B. Needs to input exactly two models") # Useful for A/B testing. Should auto-detect when a model is DNN or CNN. Leave model_2 empty for comp with heuristic. Crashes if 3 models given.
 parser.add_argument('-hand_history', '--hand_history', default=None, help='shortcut to generate CSV from ACPC file (line per hand). NLH only') # Instead of fresh hands, give hand history, and generate CSV
+parser.add_argument('-seed', '--seed', type=int, default=None, help='random seed, to repeat a run exactly')
+parser.add_argument('-values_cache', '--values_cache', nargs='?', const=POKER_VALUES_CACHE_FILE, default=None, help='keep allin values in SQLite file, between hands and runs (shared by workers)')
 args = parser.parse_args()
 
 """
@@ -280,24 +282,24 @@ def best_five_draws(hand_draws_vector):
     return best_draws
 
 # Stochastic, but always positive boost, for "best_draw" from 0-32 model, in num_draw model.
-def best_draw_value_boost():
+def best_draw_value_boost(rng=None):
     # 0.5 * (5 x max(0, noise))
-    noise = 0.5 * (max(0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)) + max(0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)) + max(0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)) + max(0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)) + max(0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)) )
+    noise = 0.5 * np.maximum(0.0, poker_random(rng).np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA, size=5)).sum()
     # 2 x noise_average
     noise += PREDICTION_VALUE_NOISE_AVERAGE * 2.0
     return noise
 
 # Actually a demotion. Suppress 'pat' draw, as model learns to suggest it way too often.
 # NOTE: Especially useful to let other alternatives to 'best_draw' thrive.
-def pat_draw_value_boost():
-    return -0.5 * best_draw_value_boost()
+def pat_draw_value_boost(rng=None):
+    return -0.5 * best_draw_value_boost(rng)
 
 # Similarly, demote 3 & 4 card draws, late in the hand. Reason is the same.
 # These trigger when normal draw is bad. But still... taking 3 or 4 cards late isn't the answer. Consider alternatives.
-def draw_many_value_boost():
-    return -1.0 * best_draw_value_boost()
-def draw_very_many_value_boost():
-    return -2.0 * best_draw_value_boost()
+def draw_many_value_boost(rng=None):
+    return -1.0 * best_draw_value_boost(rng)
+def draw_very_many_value_boost(rng=None):
+    return -2.0 * best_draw_value_boost(rng)
 
 # Should inherit from more general player... when we need one. (For example, manual player who chooses his own moves and own draws)
 class TripleDrawAIPlayer():
@@ -322,6 +324,7 @@ class TripleDrawAIPlayer():
         self.use_action_percent_model = False # Make moves from CNN action-values (with noise added), or from action percentages from CNN?
         self.is_dense_model = False # neural network is DNN?
         self.is_human = False
+        self.rng = poker_random() # PokerRandom context, for noise and random choices. Dealer passes its own.
 
         # Special cases for NLH
         self.imitate_CFR_betting = False # Try to check/bet at ration learned from CFR training??
@@ -409,7 +412,7 @@ class TripleDrawAIPlayer():
             draw_model_rate -= (num_draws - 1) * NUM_DRAW_MODEL_RATE_REDUCE_BY_DRAW
 
         # Another hack. Don't use draw model with CNN_1 (remove if we want to build from it)
-        if draw_recommendations and USE_NUM_DRAW_MODEL and self.player_tag() != 'CNN_1' and self.player_tag() != 'CNN_1_per' and random.random() <= draw_model_rate:
+        if draw_recommendations and USE_NUM_DRAW_MODEL and self.player_tag() != 'CNN_1' and self.player_tag() != 'CNN_1_per' and self.rng.random.random() <= draw_model_rate:
             # The point isn't to over-rule 0-32 model in close cases. The point is to look for *clear advantages* to 
             # snowing a hand, or breaking a hand. Therefore, add a bonus to the move already preferred by 0-32 model.
             if FAVOR_DEFAULT_NUM_DRAW_MODEL:
@@ -421,9 +424,9 @@ class TripleDrawAIPlayer():
                     # NOTE: Boost the pat draw... but less... if model recommends breaking.
                     if drawCategoryNumCardsKept[action] == default_num_kept:
                         if action == KEEP_5_CARDS:
-                            noise = abs(pat_draw_value_boost())
+                            noise = abs(pat_draw_value_boost(rng=self.rng))
                         else:
-                            noise = best_draw_value_boost()
+                            noise = best_draw_value_boost(rng=self.rng)
                         prediction[0] += noise
                         if debug:
                             print('\tBoosted %d-card draw by %.3f' % (5-default_num_kept, noise))
@@ -431,25 +434,25 @@ class TripleDrawAIPlayer():
                     # NOTE: DO *not* demote pat... if it's the recommended move
                     # TODO: Also do not demote pat... if it's close in value to the recommended move
                     if action == KEEP_5_CARDS and drawCategoryNumCardsKept[action] != default_num_kept:
-                        noise = pat_draw_value_boost()
+                        noise = pat_draw_value_boost(rng=self.rng)
                         prediction[0] += noise
                         if debug:
                             print('\tBoosted pat draw by %.3f' % (noise))
                     # Also demote 3,4,5 card draws (and 2-card draw on final round). Look for other alteratives, even in a tough spot. Especially late in the hand.
                     if (num_draws < 3) and (action == KEEP_2_CARDS) and drawCategoryNumCardsKept[action] != default_num_kept:
-                        noise = draw_many_value_boost()
+                        noise = draw_many_value_boost(rng=self.rng)
                         prediction[0] += noise
                         if debug:
                             print('\tBoosted %d-draw by %.3f' % (5-drawCategoryNumCardsKept[action], noise))
                     elif (num_draws < 3) and (action == KEEP_0_CARDS or action == KEEP_1_CARDS) and drawCategoryNumCardsKept[action] != default_num_kept:
                         # Almost no reason at all to draw 4+ cards. Strongly consider any other option
-                        noise = draw_very_many_value_boost()
+                        noise = draw_very_many_value_boost(rng=self.rng)
                         prediction[0] += noise
                         if debug:
                             print('\tBoosted %d-draw by %.3f' % (5-drawCategoryNumCardsKept[action], noise))
                     elif (num_draws == 1) and (action == KEEP_3_CARDS) and drawCategoryNumCardsKept[action] != default_num_kept:
                         # Demote 2-card draw on the final round. If close... better to stand pat or take 1 card. 
-                        noise = pat_draw_value_boost()
+                        noise = pat_draw_value_boost(rng=self.rng)
                         prediction[0] += noise
                         if debug:
                             print('\tBoosted %d-draw by %.3f' % (5-drawCategoryNumCardsKept[action], noise))
@@ -609,7 +612,7 @@ class TripleDrawAIPlayer():
         bets_input_layer = None
         if self.bets_output_array:
             # TODO: Also track input layer, for faster evaluation...
-            index = random.randrange(0, len(self.bets_output_array))
+            index = self.rng.random.randrange(0, len(self.bets_output_array))
             bets_layer, bets_input_layer = self.bets_output_array[index]
             if debug:
                 print('chose draws model %d in %d-length models index...' % (index, len(self.bets_output_array)))
@@ -706,7 +709,7 @@ class TripleDrawAIPlayer():
                 for prediction in value_predictions:
                     action = prediction[1]
                     noise = 0.0
-                    noise = np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)
+                    noise = self.rng.np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)
                     noise *= NUM_DRAW_MODEL_NOISE_FACTOR
                     # TODO: Do we want to exclude some draws from noise? Like 4, 5 card draws that we prefer to discourage...
                     prediction[0] += noise
@@ -727,7 +730,7 @@ class TripleDrawAIPlayer():
     def draw_random(self, deck=None):
         draw_string = ''
         for i in range(0,5):
-            if random.random() > 0.50:
+            if self.rng.random.random() > 0.50:
                 draw_string += '%d' % i
 
         discards = self.draw_hand.draw(draw_string)
@@ -753,7 +756,7 @@ class TripleDrawAIPlayer():
         bets_input_layer = None
         if self.bets_output_array:
             # TODO: Also track input layer, for faster evaluation...
-            index = random.randrange(0, len(self.bets_output_array))
+            index = self.rng.random.randrange(0, len(self.bets_output_array))
             bets_layer, bets_input_layer = self.bets_output_array[index]
             if debug:
                 print('chose bets model %d in %d-length models index...' % (index, len(self.bets_output_array)))
@@ -1094,7 +1097,7 @@ class TripleDrawAIPlayer():
                             print('Close_bet ratio %.3f too *wide*. Take highest value play' % close_bet_ratio)
                     else:
                         # NOTE: Dumb, but if paranoid, see the coin.
-                        coin = np.random.random()
+                        coin = self.rng.np.random_sample()
                         if debug:
                             print('Close_bet ratio %.3f close enough. Flip coin %.4f to aggro or not.' % (close_bet_ratio, coin))
                         if coin <= aggro_rate:
@@ -1131,7 +1134,7 @@ class TripleDrawAIPlayer():
                             print('Close_bet ratio %.3f too *wide*. Take highest value play' % close_bet_ratio)
                     else:
                         # NOTE: Dumb, but if paranoid, see the coin.
-                        coin = np.random.random()
+                        coin = self.rng.np.random_sample()
                         if debug:
                             print('Close_bet ratio %.3f close enough. Flip coin %.4f to call or fold.' % (close_bet_ratio, coin))
                         if coin >= fold_rate:
@@ -1206,13 +1209,13 @@ class TripleDrawAIPlayer():
 
             # We can, and if possible we should, also sample from the bet sizes
             # most likely made by CFR training (or by other good training examples)
-            if BET_SIZE_FROM_PROBABILITY_VECTOR and np.random.random() <= BET_SIZE_FROM_PROBABILITY_RATE:
+            if BET_SIZE_FROM_PROBABILITY_VECTOR and self.rng.np.random_sample() <= BET_SIZE_FROM_PROBABILITY_RATE:
                 # Point estimates, for a player to make a bet in different sizes
                 # Do we bet as vector recommends, or over-sample the aggressive bet? Mostly, the recommended.
-                bet_aggressively = True if np.random.random() <= BET_AGGRESSIVELY_PROBABILITY_RATE else False
+                bet_aggressively = True if self.rng.np.random_sample() <= BET_AGGRESSIVELY_PROBABILITY_RATE else False
                 sampled_bet_size = sample_smoothed_bet_probability_vector(bets = bet_sizes_vector, bet_size_probs = bet_sizes_rates, 
                                                                           pot_size = pot_size, min_bet = min_bet, max_bet = stack_size,
-                                                                          aggressive_betting = bet_aggressively)
+                                                                          aggressive_betting = bet_aggressively, rng = self.rng)
                 if debug:
                     print('\tsampling recommends:\t%d\tfrom p-vector: %s' % (sampled_bet_size, bet_sizes_rates)) 
                 recommended_bet_size = np.clip(sampled_bet_size, min_bet, stack_size)
@@ -1305,7 +1308,7 @@ class TripleDrawAIPlayer():
 
                         # Better, "tail" approach is the Gumbel distribution
                         # http://docs.scipy.org/doc/numpy/reference/generated/numpy.random.gumbel.html
-                        noise = np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)
+                        noise = self.rng.np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)
 
                     # And boost bet/raise somewhat more or less, than the other actions.
                     if action in ALL_BETS_SET:
@@ -1320,7 +1323,7 @@ class TripleDrawAIPlayer():
 
                         # If we are pat, consider boosting the bet value. Too many checks after patting (not only on snow)
                         # (similarly, though less, tend to bet when we took fewer cards than apponent)
-                        draws_ahead_boost = 3.0 * PREDICTION_VALUE_NOISE_AVERAGE +  max([0.0, np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA), np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA), np.random.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)])
+                        draws_ahead_boost = 3.0 * PREDICTION_VALUE_NOISE_AVERAGE +  max([0.0, self.rng.np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA), self.rng.np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA), self.rng.np.gumbel(PREDICTION_VALUE_NOISE_MU, PREDICTION_VALUE_NOISE_BETA)])
                         if BOOST_PAT_BET_ACTION_NOISE and cards_kept == 5 and opponent_cards_kept != 5:
                             if debug:
                                 print('considering boosting the *bet* for pat hand. Opponent won\'t bet hand for us!')
@@ -1387,13 +1390,13 @@ class TripleDrawAIPlayer():
             # A. Add noise to action values, and take action with highest post-noise value. This is a good option. Directly from RL
             # B. If good action% model... just take the action based on %
             best_action = None
-            if (not adjusted_values_to_fix_impossibility) and (not adjust_bet_better_draw) and (not negative_river_call_value) and USE_ACTION_PERCENTAGE and self.use_action_percent_model and np.random.rand() <= ACTION_PERCENTAGE_CHOICE_RATE:
+            if (not adjusted_values_to_fix_impossibility) and (not adjust_bet_better_draw) and (not negative_river_call_value) and USE_ACTION_PERCENTAGE and self.use_action_percent_model and self.rng.np.rand() <= ACTION_PERCENTAGE_CHOICE_RATE:
                 # Sampled choice, from available actions, based on action% from neural net output.
                 # NOTE: Need to explicitly round... to avoid annoying numpy/float32 issues
                 probabilities = np.array([max(int(action_tuple[0] * 100000), 0) / 100000.0 for action_tuple in action_percentge])
                 remainder = 1.0 - probabilities.sum()
                 probabilities[0] += remainder
-                choice = np.random.choice([action_tuple[1] for action_tuple in action_percentge], 
+                choice = self.rng.np.choice([action_tuple[1] for action_tuple in action_percentge], 
                                           p=probabilities)
                 best_action = choice
                 if debug:
@@ -1544,7 +1547,7 @@ class TripleDrawAIPlayer():
             weighted_bets_sample = np.sort(np.append(sample_reasonable_beta, sample_all_bets))
 
             print('With reasonable bets and all_bets, sample size %s: %s' % (weighted_bets_sample.shape, weighted_bets_sample))
-            bet_amount = np.random.choice(weighted_bets_sample, 1)
+            bet_amount = self.rng.np.choice(weighted_bets_sample, 1)
             print('choice: %s' % bet_amount)
 
 
@@ -1676,7 +1679,7 @@ class TripleDrawAIPlayer():
         action_distribution = action_probs
 
         # Then sample a single action, from this distribution.
-        choice_action = np.random.choice(len(allowed_actions), 1, p = action_distribution)
+        choice_action = self.rng.np.choice(len(allowed_actions), 1, p = action_distribution)
         #print('choice: %s' % allowed_actions[choice_action[0]])
 
         # Bet amount only applies to bets and raises...
@@ -1685,9 +1688,9 @@ class TripleDrawAIPlayer():
     # Nobody said that... some actions can't be more random than others!
     def choose_random_action(self, actions, round):
         if actions:
-            random_choice = random.sample(actions, 1)
+            random_choice = self.rng.random.sample(actions, 1)
             # Act here, if we re-sample, to fold less, etc
-            if random_choice[0] == FOLD_HAND and random.random() <= RE_CHOOSE_FOLD_DELTA:
+            if random_choice[0] == FOLD_HAND and self.rng.random.random() <= RE_CHOOSE_FOLD_DELTA:
                 print('re-considering FOLD')
                 return self.choose_random_action(actions, round)
             return random_choice[0]
@@ -1923,8 +1926,9 @@ def game_round(round, cashier, player_button=None, player_blind=None,
                button_hand_string = None, blind_hand_string = None,
                board_string = None, bets_string = None,
                csv_writer=None, csv_header_map=None,
-               player_button_average=0.0, player_blind_average=0.0):
+               player_button_average=0.0, player_blind_average=0.0, allin_values_cache=None, rng=None):
     print('\n-- New Round %d --\n' % round)
+    rng = poker_random(rng) # shuffles, and all random choices in the hand
     # Performance suffers... a lot, over time. Can we improve this with garbage collection?
     # NOTE: Not really, but doesn't hurt. If you want to improve performance, need to purge the theano-cache
     # "theano-cache purge" --> on GPU
@@ -1937,7 +1941,7 @@ def game_round(round, cashier, player_button=None, player_blind=None,
         print(('--> gc %d took %.1f seconds...\n' % (round, time.time() - now)))
 
     # Shuffle deck *before* any hand setup. 
-    deck = PokerDeck(shuffle=True)
+    deck = PokerDeck(shuffle=True, rng=rng)
 
     # If we are passed strings for p1_hand, p2_hand, and/or the board...
     # ...parse those cards. And set them in the correct deck order.
@@ -1972,7 +1976,7 @@ def game_round(round, cashier, player_button=None, player_blind=None,
 
     # HACK: Set players to "imitate CFR ratio" some X% of the time
     for player in [player_blind, player_button]:
-        if IMITATE_CFR_AGGRO_STRATEGY and np.random.random() < IMITATE_CFR_BETTING_PERCENTAGE: 
+        if IMITATE_CFR_AGGRO_STRATEGY and rng.np.random_sample() < IMITATE_CFR_BETTING_PERCENTAGE: 
             player.imitate_CFR_betting = True
             print('Setting player %s to use IMITATE_CFR_BETTING for next hand.' % (player.player_tag()))
         elif IMITATE_CFR_AGGRO_STRATEGY:
@@ -1980,7 +1984,7 @@ def game_round(round, cashier, player_button=None, player_blind=None,
             player.imitate_CFR_betting = False
             print('Setting player %s with IMITATE_CFR_BETTING *off* for next hand.' % (player.player_tag()))
 
-    dealer = TripleDrawDealer(deck=deck, player_button=player_button, player_blind=player_blind, format=FORMAT)
+    dealer = TripleDrawDealer(deck=deck, player_button=player_button, player_blind=player_blind, format=FORMAT, rng=rng)
     dealer.play_single_hand(bets_string=bets_string) # Pass empty bets string, to allow players to make actual choices
 
     winners = dealer.get_hand_result(cashier)
@@ -1997,7 +2001,8 @@ def game_round(round, cashier, player_button=None, player_blind=None,
     print('\nFull hand history...')
     # Shared object, so that if we generate "allin value" simulation for actions... don't recompute exact same
     now = time.time() 
-    allin_values_cache = HoldemValuesCache()
+    if allin_values_cache is None:
+        allin_values_cache = HoldemValuesCache()
     for event in dealer.hand_history:
         # Also, pass running average, to the update (average is per-player). 
         # NOTE: It's a hack, but good to see running stats for that player so far.
@@ -2011,7 +2016,7 @@ def game_round(round, cashier, player_button=None, player_blind=None,
         event.update_result(winners, final_bets, hand_num=round, running_average=running_average)
         print(event)
         if csv_header_map:
-            event_line = event.csv_output(csv_header_map, allin_cache=allin_values_cache)
+            event_line = event.csv_output(csv_header_map, allin_cache=allin_values_cache, rng=rng)
             print(event_line)
 
         # Write events, for training.
@@ -2019,6 +2024,8 @@ def game_round(round, cashier, player_button=None, player_blind=None,
         if csv_writer:
             csv_writer.writerow(event_line)
     # TODO: Flush buffer here?
+    # Shared cache: write new values to disk (if persistent), and keep memory bounded.
+    allin_values_cache.clear_cache_if_full()
 
     # How long did it take to calculate & print(everything?)
 
@@ -2032,6 +2039,7 @@ def game_round(round, cashier, player_button=None, player_blind=None,
             print('\n--> Bets strings do not match! (issue with allins?)\n')
         # assert game_log == bets_string, 'Bets strings do not match! (issue with allins?)'
     print('%.2fs to write CSV (simulate allin values, etc)' % (time.time() - now))
+    print(allin_values_cache.stats_string())
 
     # If we are tracking results... return results (wins/losses for player by order
     bb_result = dealer.hand_history[0].margin_result
@@ -2372,13 +2380,22 @@ def chomp_hand_history_line(line):
 # For now... just rush toward full games, and skip details, or fill in with hacks.
 def play(sample_size, output_file_name=None, draw_model_filename=None, holdem_model_filename=None,
          bets_model_filename=None, old_bets_model_filename=None, other_old_bets_model_filename=None, 
-         human_player=None, compare_models=None, hand_history_filename=None):
+         human_player=None, compare_models=None, hand_history_filename=None, values_cache_filename=None, seed=None):
     # If we're given a path to ACPC history file, open a connection, and we'll process lines one at a time.
     history_line_reader = None
     if hand_history_filename:
         # Will throw error if file path is unreadable...
         history_line_reader = open(hand_history_filename, 'rU')
 
+    # Seeded random streams, so that a run can be repeated exactly. Otherwise, global random.
+    rng = PokerRandom(seed) if seed is not None else None
+
+    # Allin values, shared across hands. Also on disk (and across runs) if file given.
+    if values_cache_filename:
+        allin_values_cache = HoldemValuesDiskCache(cache_file=values_cache_filename)
+    else:
+        allin_values_cache = HoldemValuesCache()
+
     # If we get lines back... create two players, name them, and use randomness going forward.
     if history_line_reader:
         # Just setup dummy players. 
@@ -2477,7 +2494,8 @@ def play(sample_size, output_file_name=None, draw_model_filename=None, holdem_mo
                                                     board_string = board_string, bets_string = bets_string,
                                                     csv_writer=csv_writer, csv_header_map=csv_header_map,
                                                     player_button_average = np.mean(player_one_results),
-                                                    player_blind_average = np.mean(player_two_results))
+                                                    player_blind_average = np.mean(player_two_results),
+                                                    allin_values_cache = allin_values_cache, rng = rng)
                 player_one_result = sb_result
                 player_two_result = bb_result
             else:
@@ -2486,7 +2504,8 @@ def play(sample_size, output_file_name=None, draw_model_filename=None, holdem_mo
                                                     board_string = board_string, bets_string = bets_string,
                                                     csv_writer=csv_writer, csv_header_map=csv_header_map,
                                                     player_button_average = np.mean(player_two_results),
-                                                    player_blind_average = np.mean(player_one_results))
+                                                    player_blind_average = np.mean(player_one_results),
+                                                    allin_values_cache = allin_values_cache, rng = rng)
                 player_two_result = sb_result
                 player_one_result = bb_result
 
@@ -2552,6 +2571,8 @@ if __name__ == '__main__':
 
     # Alternatively, load ACPC histories (NLH only) 
     hand_history_filename = args.hand_history
+    values_cache_filename = args.values_cache
+    seed = args.seed
 
     # TODO: Take num samples from command line.
     play(sample_size=samples, output_file_name=output_file_name,
@@ -2562,4 +2583,6 @@ if __name__ == '__main__':
          other_old_bets_model_filename=other_old_bets_model_filename, 
          human_player=human_player,
          compare_models=compare_models,
-         hand_history_filename=hand_history_filename)
+         hand_history_filename=hand_history_filename,
+         values_cache_filename=values_cache_filename,
+         seed=seed)
@@ -8,7 +8,6 @@ import scipy.stats as ss
 import itertools
 from poker_hashes import *
 from poker_util import *
-# import cards_to_python_ext # BOOST.Python for function cards_to_python_ext.canonical_board("7h7dAhKd2h9c",0,2)
 
 """
 Author: Nikolai Yakovenko
@@ -21,6 +20,15 @@ Python implementation for draw poker hand processing
 # Why? Get better ground truth -- in all cases. Either under-sample or over-sample, for rare, high-value events.
 ROYAL_DRAW_MULTIPLIER = 10
 
+# Importance sampling (instead of the multiplier). Fraction of tries that complete a rare hand [royal, straight flush, quads].
+IMPORTANCE_SAMPLING_FRACTION = 0.2
+
+# Adaptive racing between draws. Sample in batches, drop draws that are clearly worse than the leader.
+ADAPTIVE_BATCH_TRIES = 100 # samples per live draw, per round
+ADAPTIVE_CONFIDENCE_Z = 3.0 # confidence bound, in standard errors
+ADAPTIVE_TARGET_STDEV = 0.01 # stop sampling a draw, once its average is this precise
+ADAPTIVE_DROPPED_FRACTION = 0.25 # fresh samples for each dropped draw [fraction of tries], since race samples are biased low
+
 # definitions for poker hands
 CLUB	= 0x8000
 DIAMOND = 0x4000
@@ -432,87 +440,57 @@ def card_hash_tag(suit, value):
     #print(format(hash_tag, '#032b'))
     return hash_tag
 
+# Integer index [0, 51] for a card. Same order as a fresh (unshuffled) PokerDeck: clubs 2-A, diamonds, hearts, spades.
+def card_index(card):
+    return suits_to_matrix[card.suit] * len(ranksArray) + card.value
+
+# And hash tags, for all 52 indices. So int arrays of card indices can go straight to batch evaluation.
+card_index_hash_tags = np.array([card_hash_tag(suit, value) for suit in suitsArray for value in ranksArray], dtype=np.int64)
+
 # A bit more involved than you think. Encodes the card in C-style, for lib lookup, hand evaluation, etc.
 # NOTE: Re-uses naming conventions from C-code for convenience.
+# NOTE: All 52 cards are interned. Card(suit, value) always returns the same object, so equality is identity,
+# and hash is the [0, 51] index. Cheap for deck lookups, sets, and cache keys. Treat cards as immutable.
 class Card(object):
-    def __init__(self, suit, value):
-        self.suit = suit
-        self.value = value
-        # self.tag = ## does not appear to be used in game logic?
-
-        # 32-bit encoding
-        self.hashTag = card_hash_tag(suit, value)
+    __slots__ = ('suit', 'value', 'hashTag', 'index')
+    interned_cards = {}
+
+    def __new__(cls, suit, value):
+        card = cls.interned_cards.get((suit, value))
+        if card is None:
+            assert suit in suits_to_matrix and value in valueSymbol, 'Invalid card suit %s value %s' % (suit, value)
+            card = object.__new__(cls)
+            card.suit = suit
+            card.value = value
+            # self.tag = ## does not appear to be used in game logic?
+
+            # 32-bit encoding
+            card.hashTag = card_hash_tag(suit, value)
+            card.index = card_index(card)
+            cls.interned_cards[(suit, value)] = card
+        return card
 
     # Other TODOs
     def __str__(self):
         return '%s%s' % (valueSymbol[self.value], suitSymbol[self.suit])
 
     def __eq__(self, other):
-        return (self.suit == other.suit and self.value == other.value)
-
-# Given arrays of cards, some of them empty, return same format, after canonical
-# cards_to_python_ext.canonical_board("7h7dAhKd2h9c",0,2)
-# Valid inputs: empty input, preflop only, preflop + board, board only [turn only not allowed]
-def holdem_cards_canonical_form(cards_array, flop_array, turn_array, river_array):
-    # A. combine all cards in one array
-    all_cards = cards_array + flop_array + turn_array + river_array
-    all_cards_string = ''.join(str(card) for card in all_cards)
-    #print(all_cards_string)
-    if not all_cards_string:
-        return (cards_array, flop_array, turn_array, river_array)
-    # B. recognize bounds (flop to turn?)
-    lower_bound = 0 if cards_array else 1
-    upper_bound = lower_bound
-    if flop_array:
-        if turn_array:
-            if river_array:
-                upper_bound = 3
-            else:
-                upper_bound = 2
-        else:
-            upper_bound = 1
-    else:
-        upper_bound = 0
-
-    # C. Run C-library
-    #all_cards_canonical_string = cards_to_python_ext.canonical_board(all_cards_string, lower_bound, upper_bound)
-    all_cards_canonical_string = all_cards_string
-    #print(all_cards_canonical_string)
-    
-    # D. Translate back to card arrays
-    all_cards_canonical_array = []
-    for i in range(len(all_cards_canonical_string) // 2):
-        card = card_from_string(all_cards_canonical_string[i*2:i*2+2])
-        all_cards_canonical_array.append(card)
-
-    canonical_index = 0
-    # Preflop, if applies
-    if cards_array:
-        new_cards_array = [all_cards_canonical_array[canonical_index], all_cards_canonical_array[canonical_index+1]]
-        canonical_index += 2
-    else:
-        new_cards_array = []
+        return self is other
 
-    if flop_array:
-        new_flop_array = [all_cards_canonical_array[canonical_index], all_cards_canonical_array[canonical_index+1], all_cards_canonical_array[canonical_index+2]]
-        canonical_index += 3
-    else:
-        new_flop_array = []
+    def __ne__(self, other):
+        return self is not other
 
-    if turn_array:
-        new_turn_array = [all_cards_canonical_array[canonical_index]]
-        canonical_index += 1
-    else:
-        new_turn_array = []
+    def __hash__(self):
+        return self.index
 
-    if river_array:
-        new_river_array = [all_cards_canonical_array[canonical_index]]
-        canonical_index += 1
-    else:
-        new_river_array = []
+    # Pickle and copy back to the same interned card.
+    def __reduce__(self):
+        return (Card, (self.suit, self.value))
 
-    # Updated arrays... with all cards in canonical formz
-    return (new_cards_array, new_flop_array, new_turn_array, new_river_array)
+# All 52 cards, by index.
+all_cards_by_index = [Card(suit=suit, value=rank) for suit in suitsArray for rank in ranksArray]
+def card_from_index(index):
+    return all_cards_by_index[index]
 
 # card from string Ks
 def card_from_string(card_str):
@@ -543,18 +521,18 @@ def card_array_from_string(card_str):
 # NOTE: array of cards, not strings.
 def hand_suit_scrambles(hand_array):
     # to-string of hands seen
-    unique_strings = set([])
+    unique_hand_keys = set([])
     uniques = [] # output of card arrays
     
     for suit_scramble in all_suit_scrambles_maps:
         new_hand = [Card(suit=suit_scramble[card.suit], value=card.value) for card in hand_array]
-        new_hand_string = hand_string(new_hand)
-        if not(new_hand_string in unique_strings):
+        new_hand_key = tuple(new_hand)
+        if not(new_hand_key in unique_hand_keys):
             uniques.append(new_hand)
-            unique_strings.add(new_hand_string)
+            unique_hand_keys.add(new_hand_key)
 
     #print('for hand %s, found %d unique hands equivalent by suit permutation' % (hand_string(hand_array), len(uniques)))
-    #print(unique_strings)
+    #print(unique_hand_keys)
 
     return uniques
 
@@ -607,6 +585,15 @@ def hand_category_deuce(val):
     if (val > ACE_HI_MIN_RANK):     return DEUCE_KING;
     return DEUCE_ACE_OR_BETTER;
 
+# Lowball categories, best to worst, for indexing.
+DEUCE_CATEGORIES = [DEUCE_WHEEL, DEUCE_SEVEN, DEUCE_EIGHT, DEUCE_NINE, DEUCE_TEN, DEUCE_JACK, DEUCE_QUEEN, DEUCE_KING,
+                    DEUCE_ACE_OR_BETTER]
+deuce_categories_index = {x:DEUCE_CATEGORIES.index(x) for x in DEUCE_CATEGORIES}
+
+# Rank -> index in HIGH_HAND_CATEGORIES (and DEUCE_CATEGORIES), for counting categories in batch. Index 0 unused.
+high_hand_category_index_by_rank = np.array([0] + [high_hand_categories_index[hand_category(rank)] for rank in range(1, WORST_HAND_RANK)], dtype=np.int64)
+deuce_category_index_by_rank = np.array([0] + [deuce_categories_index[hand_category_deuce(rank)] for rank in range(1, WORST_HAND_RANK)], dtype=np.int64)
+
 # Binary search, on products array. Not sure why no better way... but as long as it works.
 def hard_findit(key):
     low = 0
@@ -696,6 +683,53 @@ def deuce_rank_five_card(hand):
     # Otherwise, we're dealing with a pair+ hand (but not straight or flush.
     return DEUCE_PAIR_RANK
 
+###########################################################
+# Batch evaluation. Same lookup tables as above, as numpy arrays, so we can rank N hands at once.
+# Input is (N, 5) array of 32-bit card hashTag ints (see card_hash_tag), output is (N,) array of ranks.
+# NOTE: Results match hand_rank_five_card and deuce_rank_five_card exactly. Inputs assumed valid (no duplicate cards).
+flushes_array = np.array(flushes, dtype=np.int32)
+unique5_array = np.array(unique5, dtype=np.int32)
+products_array = np.array(products, dtype=np.int64)
+values_array = np.array(values, dtype=np.int32)
+lo_hands_deuce_array = np.array(lo_hands_deuce, dtype=np.int32)
+
+# Shared bit ops for both batch evaluators: unique-rank hash q, and flush mask.
+def hash_tags_unique_and_flush(hash_tags):
+    hash_tags = np.asarray(hash_tags, dtype=np.int64)
+    assert hash_tags.ndim == 2 and hash_tags.shape[1] == 5, 'Need (N, 5) array of hash tags. Given %s' % (hash_tags.shape,)
+    q = np.bitwise_or.reduce(hash_tags, axis=1) >> 16
+    is_flush = (np.bitwise_and.reduce(hash_tags, axis=1) & 0xF000) != 0
+    return (hash_tags, q, is_flush)
+
+# Batch version of hand_rank_five_card. Binary search (hard_findit) replaced by np.searchsorted on sorted products.
+def hand_rank_five_card_batch(hash_tags):
+    (hash_tags, q, is_flush) = hash_tags_unique_and_flush(hash_tags)
+
+    # Straights and high card hands, first. Zero means a paired hand.
+    ranks = unique5_array[q]
+
+    # Paired hands, the hard way. Product of primes, and lookup in sorted products.
+    paired = (ranks == 0)
+    if np.any(paired):
+        q_hard = np.prod(hash_tags[paired] & 0xFF, axis=1)
+        ranks[paired] = values_array[np.searchsorted(products_array, q_hard)]
+
+    # Flushes and straight flushes override.
+    ranks[is_flush] = flushes_array[q[is_flush]]
+    return ranks
+
+# Batch version of deuce_rank_five_card.
+def deuce_rank_five_card_batch(hash_tags):
+    (hash_tags, q, is_flush) = hash_tags_unique_and_flush(hash_tags)
+    ranks = lo_hands_deuce_array[q]
+    ranks[ranks == 0] = DEUCE_PAIR_RANK
+    ranks[is_flush] = DEUCE_FLUSH_RANK
+    return ranks
+
+# Helper for simulators: [[Card]] hands -> (N, 5) array of hash tags, ready for batch evaluation.
+def hands_to_hash_tags(hands):
+    return np.array([[card.hashTag for card in hand] for hand in hands], dtype=np.int64)
+
 # Helper function to turn a poker hand (array of cards) into 2D array.
 # if pad_to_fit... pass along to card input creator, to create 14x14 array instead of 4x13
 # NOTE: 17x17 padding!
@@ -824,6 +858,27 @@ class PayoutTable(object):
     def payout(self, hand):
         raise NotImplementedError()
 
+    # Lookup array for batch simulation: payout for every rank in [1, 7462]. Index 0 unused.
+    # NOTE: Requires payout_rank(rank)
+    def payout_rank_array(self):
+        if not hasattr(self, 'rank_payouts'):
+            self.rank_payouts = np.array([0] + [self.payout_rank(rank) for rank in range(1, WORST_HAND_RANK)], dtype=np.float64)
+        return self.rank_payouts
+
+    # Payout for each of HIGH_HAND_CATEGORIES. Only for tables that pay by category [same payout for every rank in it].
+    def payout_category_array(self):
+        rank_payouts = self.payout_rank_array()
+        category_payouts = np.zeros(len(HIGH_HAND_CATEGORIES))
+        for i in range(len(HIGH_HAND_CATEGORIES)):
+            payouts = set(rank_payouts[1:][high_hand_category_index_by_rank[1:] == i])
+            assert len(payouts) == 1, 'Payout table not by category. %s pays %s' % (categoryName[HIGH_HAND_CATEGORIES[i]], sorted(payouts))
+            category_payouts[i] = payouts.pop()
+        return category_payouts
+
+# Value of a draw for payout table, from its category histogram. Same as simulating with that table.
+def category_histogram_value(category_histogram, payout_table):
+    return float(np.dot(category_histogram, payout_table.payout_category_array()))
+
 # "976-9-6" Jacks or Better -- with 100% long-term payout.
 # As described here: 
 """
@@ -851,9 +906,12 @@ jacks_or_better_table_976_9_6 = {ROYAL_FLUSH: 976,
                                  JACKS_OR_BETTER: 1,
                                  ONE_PAIR: 0,
                                  HIGH_CARD: 0}
+# Standard "9/6" Jacks or Better [800 for royal, with max coins]. 99.54% long-term payout.
+jacks_or_better_table_9_6 = dict(jacks_or_better_table_976_9_6)
+jacks_or_better_table_9_6[ROYAL_FLUSH] = 800
 class JacksOrBetter(PayoutTable):
-    def __init__(self):
-        self.payout_table = jacks_or_better_table_976_9_6
+    def __init__(self, payout_table=jacks_or_better_table_976_9_6):
+        self.payout_table = payout_table
 
     # Takes in PokerHand object, evaluates on final hand...
     def payout(self, hand):
@@ -885,6 +943,117 @@ def is_royal_flush_draw(cards):
             return False
     return True
 
+# Rare, high-payout final hands, for importance sampling: royal flushes, other straight flushes, and quads.
+# Returns (masks, categories): 52-bit card mask of each 5-card hand, and its category [RARE_HAND_CATEGORIES].
+RARE_HAND_CATEGORIES = [ROYAL_FLUSH, STRAIGHT_FLUSH, FOUR_OF_A_KIND]
+_rare_draw_hands = None
+def rare_draw_hands():
+    global _rare_draw_hands
+    if _rare_draw_hands is None:
+        card_at = {(card.suit, card.value): card for card in all_cards_by_index}
+        hands = []
+        straights = [ranksArray[i:i+5] for i in range(len(ranksArray) - 4)] + [[Ace, Deuce, Trey, Four, Five]]
+        for suit in suitsArray:
+            for straight in straights:
+                hands.append([card_at[(suit, rank)] for rank in straight])
+        for rank in ranksArray:
+            quads = [card_at[(suit, rank)] for suit in suitsArray]
+            hands += [quads + [kicker] for kicker in all_cards_by_index if kicker.value != rank]
+        masks = np.array([sum([1 << card.index for card in hand]) for hand in hands], dtype=np.int64)
+        categories = np.array([hand_category(hand_rank_five_card(hand)) for hand in hands], dtype=np.int64)
+        _rare_draw_hands = (masks, categories)
+    return _rare_draw_hands
+
+# (N,) card masks with k bits each -> (N, k) card indices, in index order.
+def card_masks_to_indices(masks, num_cards):
+    bits = (masks[:, np.newaxis] >> np.arange(52, dtype=np.int64)) & 1
+    return np.nonzero(bits)[1].reshape((len(masks), num_cards))
+
+# Sample (tries, num_cards) array of cards from remaining_indices (card indices), without replacement in each row.
+# The num_cards smallest of uniform random keys are a uniform random subset. Sorted by key, so in random order,
+# and any first k columns are also a uniform sample.
+# NOTE: argpartition alone leaves the chosen cards in an order that depends on deck position. Do not skip the sort.
+def sample_cards_without_replacement(remaining_indices, tries, num_cards, rng=None):
+    remaining_indices = np.asarray(remaining_indices)
+    if num_cards == 0:
+        return np.zeros((tries, 0), dtype=remaining_indices.dtype)
+    keys = poker_random(rng).np.random_sample((tries, len(remaining_indices)))
+    if num_cards < len(remaining_indices):
+        chosen = np.argpartition(keys, num_cards - 1, axis=1)[:, :num_cards]
+        chosen_keys = np.take_along_axis(keys, chosen, axis=1)
+        chosen = np.take_along_axis(chosen, np.argsort(chosen_keys, axis=1), axis=1)
+    else:
+        chosen = np.argsort(keys, axis=1)
+    return remaining_indices[chosen]
+
+# Sampling modes for runouts. Plain Monte Carlo, or stratified on the first card (see below).
+SAMPLING_MC = 'mc'
+SAMPLING_STRATIFIED = 'stratified'
+SAMPLING_MODES = [SAMPLING_MC, SAMPLING_STRATIFIED]
+
+# Stratified version of sample_cards_without_replacement. Same (tries, num_cards) output.
+# First card: every remaining card gets an equal share of tries (remainder on random cards), instead of random counts.
+# Second card: within each first card stratum, a random permutation of the other cards. No repeats until all are used.
+# Other cards: uniform random keys, as above. Every row is still a uniform random sample, so averages are unbiased.
+# With blocks > 1, returns (blocks * tries) rows. Each consecutive block of tries is stratified on its own.
+def sample_cards_stratified(remaining_indices, tries, num_cards, rng=None, blocks=1):
+    remaining_indices = np.asarray(remaining_indices)
+    if num_cards == 0:
+        return np.zeros((blocks * tries, 0), dtype=remaining_indices.dtype)
+    rng = poker_random(rng)
+    num_remaining = len(remaining_indices)
+    rows = np.arange(blocks * tries)
+    block_rows = rows // tries
+    sample = rows % tries
+
+    # Random order of strata, per block. So the remainder [tries % num_remaining] lands on random cards.
+    strata_order = np.argsort(rng.np.random_sample((blocks, num_remaining)), axis=1)
+    first = strata_order[block_rows, sample % num_remaining]
+    keys = rng.np.random_sample((blocks * tries, num_remaining))
+    if num_cards >= 2:
+        # Per (block, stratum), random order of all positions, with the stratum card itself last.
+        order_keys = rng.np.random_sample((blocks, num_remaining, num_remaining))
+        order_keys[:, np.arange(num_remaining), np.arange(num_remaining)] = 2.0
+        stratum_orders = np.argsort(order_keys, axis=2)
+        second = stratum_orders[block_rows, first, (sample // num_remaining) % (num_remaining - 1)]
+        keys[rows, second] = -1.0
+    keys[rows, first] = -2.0
+    if num_cards < num_remaining:
+        chosen = np.argpartition(keys, num_cards - 1, axis=1)[:, :num_cards]
+        chosen_keys = np.take_along_axis(keys, chosen, axis=1)
+        chosen = np.take_along_axis(chosen, np.argsort(chosen_keys, axis=1), axis=1)
+    else:
+        chosen = np.argsort(keys, axis=1)
+    return remaining_indices[chosen]
+
+# Sample runouts in either mode.
+def sample_cards(remaining_indices, tries, num_cards, sampling=SAMPLING_MC, rng=None):
+    assert sampling in SAMPLING_MODES, 'Unknown sampling mode %s' % sampling
+    if sampling == SAMPLING_STRATIFIED:
+        return sample_cards_stratified(remaining_indices, tries, num_cards, rng=rng)
+    return sample_cards_without_replacement(remaining_indices, tries, num_cards, rng=rng)
+
+# Number of ways to choose k from n. Exact integer, and fast for large n (product of k terms, not factorials)
+def choose(n, k):
+    if k < 0 or k > n:
+        return 0
+    k = min(k, n - k)
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+# All k-subsets of range(n), as (C(n,k), k) array of positions. Cached, since draws share them.
+# Example: any 3-card discard, from 47 remaining cards, uses combination_indices(47, 3)
+combination_indices_cache = {}
+def combination_indices(n, k):
+    if not (n, k) in combination_indices_cache:
+        num_combos = choose(n, k)
+        combos = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), k)),
+                             dtype=np.int8, count=num_combos * k).reshape((num_combos, k))
+        combination_indices_cache[(n, k)] = combos
+    return combination_indices_cache[(n, k)]
+
 # Possibly overkill, but a wrapper on simulating a situation.
 # In short, array of results, best result, average result
 # NOTE: For simplification, for now... result = scalar reward only (no debug)
@@ -897,20 +1066,76 @@ class HandSimResult(object):
 
         # Actual results
         self.results = []
+        self.weights = None # importance sampling weights [uniform odds / sampling odds] for results, if any
         self.average_value = 0.0
+
+        # Odds of each final hand category [HIGH_HAND_CATEGORIES, DEUCE_CATEGORIES]. Paytable-independent.
+        # Value for any category paytable is a dot product. See category_histogram_value()
+        self.category_histogram = None
+        self.deuce_category_histogram = None
         self.best_value = 0.0
+        self.sample_count = 0
+        self.average_stdev = 0.0 # standard error of average_value. Zero if exact.
+        self.exact = False
+
+        # Comparison with the best draw, if samples paired (common random numbers). See compare_to_best()
+        self.difference_stdev = None # standard error of (this value - best value)
+        self.variance_reduction = None # variance of difference if independent samples / variance of paired difference
 
     # Doesn't update averages.
     def add_result(self, value):
         self.results.append(value)
 
+    # All results at once (numpy array, from batch simulation). Doesn't update averages.
+    def set_results(self, values, weights=None):
+        self.results = values
+        self.weights = weights
+
+    # Results from final hand ranks. Payouts, and category histograms [weighted, if importance weights].
+    def set_rank_results(self, ranks, rank_payouts, weights=None):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        self.set_results(rank_payouts[ranks], weights)
+        self.set_category_histograms(ranks, weights)
+
+    def set_category_histograms(self, ranks, weights=None):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        self.category_histogram = np.bincount(high_hand_category_index_by_rank[ranks], weights=weights,
+                                              minlength=len(HIGH_HAND_CATEGORIES)) / float(len(ranks))
+        self.deuce_category_histogram = np.bincount(deuce_category_index_by_rank[ranks], weights=weights,
+                                                    minlength=len(DEUCE_CATEGORIES)) / float(len(ranks))
+
+    # With importance weights, average and stdev of weighted results. Best value is still the best payout seen.
     def evaluate(self):
-        self.average_value = np.mean(self.results)
+        weighted_results = self.results if self.weights is None else np.asarray(self.results) * self.weights
+        self.average_value = np.mean(weighted_results)
         self.best_value = np.max(self.results)
+        self.sample_count = len(self.results)
+        if self.exact:
+            self.average_stdev = 0.0
+        else:
+            self.average_stdev = np.std(weighted_results) / math.sqrt(self.sample_count)
+
+    # With common random numbers, sample i of every draw uses the same deck ordering. So differences are paired.
+    # Compare variance of paired differences, to what we'd get from independent samples of the same size.
+    # NOTE: Royal flush draws get more samples. Compare on the shared prefix.
+    def compare_to_best(self, best_result):
+        num_paired = min(len(self.results), len(best_result.results))
+        results = np.asarray(self.results[:num_paired], dtype=np.float64)
+        best_results = np.asarray(best_result.results[:num_paired], dtype=np.float64)
+        paired_variance = np.var(results - best_results)
+        independent_variance = np.var(results) + np.var(best_results)
+        self.difference_stdev = math.sqrt(paired_variance / num_paired)
+        if paired_variance > 0:
+            self.variance_reduction = independent_variance / paired_variance
+        else:
+            self.variance_reduction = None
 
     def __str__(self):
         self.evaluate()
-        return '%d sample:\t%.2f average\t%.2f maximum' % (len(self.results), self.average_value, self.best_value)
+        output = '%d sample:\t%.2f average\t%.2f maximum' % (len(self.results), self.average_value, self.best_value)
+        if self.variance_reduction:
+            output += '\t%.3f diff stdev\t%.1fx variance reduction' % (self.difference_stdev, self.variance_reduction)
+        return output
 
     def __lt__(self, sim_result_2):
         return self.average_value < sim_result_2.average_value
@@ -967,37 +1192,52 @@ class PokerHand(object):
     # For thrown away cards, draws from deck, evaluates hand. Return rank, and return cards to the deck, with a shuffle.
     def draw_in_place(self, deck, draw_set, debug_delta=0.000):
         dummy_hand = []
-        cards_return = []
-        # A. fill dummy hand with cards kept (defined by draw_set)
-        # B. add dummy cards from deck
+        # A. sample cards drawn, without removing them from the deck (nothing to return, or reshuffle)
+        draw_cards = [all_cards_by_index[index] for index in deck.sample_indices(5 - len(draw_set))]
+        # B. fill dummy hand with cards kept (defined by draw_set), and cards drawn
         for i in range(5):
             if i in draw_set:
                 dummy_hand.append(self.dealt_cards[i])
             else:
-                draw_card = deck.deal_single(track_deal=False)
-                dummy_hand.append(draw_card)
-                cards_return.append(draw_card)
+                dummy_hand.append(draw_cards.pop())
 
         # C. evaluate hand, save value
         dummy_rank = hand_rank_five_card(dummy_hand)
 
         # print(it once in a while...)
-        if random.random() <= debug_delta or dummy_rank <= 1:
+        if deck.rng.random.random() <= debug_delta or dummy_rank <= 1:
             print('dummy_hand [%d] %s' % (dummy_rank, ','.join([str(card) for card in dummy_hand])))
 
-        # D. return drawn cards to deck & shuffle it
-        deck.return_cards(cards_return, shuffle=True)
-
-        # E. exit with hand evaluation
+        # D. exit with hand evaluation
         return dummy_rank
         
 
     # For "dealt_cards", tries every possible draw X times, and saves results in a matrix.
     # NOTE: We *completely* ignore draw_cards, final_hand, etc. 
     # NOTE: At the end, deck should contain cards it started with. Possibly, re-shuffled.
-    def simulate_all_draws(self, deck, tries, payout_table, debug=True):
+    # NOTE: vectorized=True samples all draws at once with numpy, and ranks them in batch. Same results structure.
+    # NOTE: exact=True enumerates every possible draw instead (ignores tries). No sampling noise.
+    # NOTE: common_random_numbers=True (vectorized) shares deck orderings between draws. Less noise in comparing draws.
+    # NOTE: adaptive=True races the draws, with total budget of tries per draw. Bad draws get fewer samples.
+    # NOTE: importance=True oversamples rare hands [royal, straight flush, quads] and reweights. Unbiased, no royal hacks.
+    def simulate_all_draws(self, deck, tries, payout_table, debug=True, vectorized=False, exact=False, common_random_numbers=False,
+                           adaptive=False, importance=False):
         if debug:
             print('\nsimulating all draws for dealt hand [%s]' % (','.join([str(card) for card in self.dealt_cards])))
+        if exact:
+            self.sim_results = self.simulate_all_draws_exact(deck, payout_table)
+        elif importance:
+            self.sim_results = self.simulate_all_draws_importance(deck, tries, payout_table)
+        elif adaptive:
+            self.sim_results = self.simulate_all_draws_adaptive(deck, tries, payout_table)
+        elif vectorized or common_random_numbers:
+            self.sim_results = self.simulate_all_draws_vectorized(deck, tries, payout_table, common_random_numbers=common_random_numbers)
+        else:
+            self.simulate_all_draws_loop(deck, tries, payout_table)
+        self.finish_simulate_all_draws(debug=debug, paired=common_random_numbers)
+
+    # Original simulation. Draw, evaluate and return cards to the deck, one trial at a time.
+    def simulate_all_draws_loop(self, deck, tries, payout_table):
         self.sim_results = []
         for i in range(len(all_draw_patterns)):
             draw_pattern = all_draw_patterns[i]
@@ -1019,6 +1259,7 @@ class PokerHand(object):
             sim_result.draw_cards = draw_cards
             sim_result.draw_string = hand_string(draw_cards)
 
+            hand_ranks = []
             for x in range(tries_local):
                 # Returns hand rank, and puts cards back in the deck
                 hand_rank = self.draw_in_place(deck, draw_pattern)
@@ -1033,13 +1274,252 @@ class PokerHand(object):
                 hand_payout = payout_table.payout_rank(hand_rank)
                 #print('\t$%d' % hand_payout)
                 sim_result.add_result(hand_payout)
+                hand_ranks.append(hand_rank)
+            sim_result.set_category_histograms(hand_ranks)
 
             #print('for draw_pattern %s, sim result %s\n' %  (str(draw_pattern), str(sim_result)))
             
             # Hack, as we just use fixed order of all_draw_patterns to match results
             sim_result.evaluate()
             self.sim_results.append(sim_result)
-        
+
+    # Numpy version of the simulation. Draw replacement cards for all patterns at once, as [0, 51] card indices.
+    # Rank all final hands in one batch, and apply payout table via rank -> payout lookup array.
+    # Same tries (and royal draw multiplier, and royal knock-down hack) as the loop version above.
+    # With common_random_numbers, all draws share the same random deck orderings. Try i, discarding m cards,
+    # gets the first m cards of ordering i. Independent samples otherwise.
+    # NOTE: Does not change the deck.
+    def simulate_all_draws_vectorized(self, deck, tries, payout_table, common_random_numbers=False):
+        remaining_indices = np.array(deck.card_indices())
+        rank_payouts = payout_table.payout_rank_array()
+
+        draws_tries = []
+        for i in range(len(all_draw_patterns)):
+            draws_tries.append((i, self.draw_tries(all_draw_patterns[i], tries)))
+        draws_ranks = self.sample_draw_ranks(remaining_indices, draws_tries, common_random_numbers=common_random_numbers, rng=deck.rng)
+
+        sim_results = []
+        for i in range(len(all_draw_patterns)):
+            sim_result = self.new_sim_result(i)
+            sim_result.set_rank_results(draws_ranks[i], rank_payouts)
+            sim_result.evaluate()
+            sim_results.append(sim_result)
+        return sim_results
+
+    # Hack: 10x tries if royal flush possiblity...
+    def draw_tries(self, draw_pattern, tries):
+        if is_royal_flush_draw([self.dealt_cards[draw_pos] for draw_pos in draw_pattern]):
+            return tries * ROYAL_DRAW_MULTIPLIER
+        return tries
+
+    # Empty result, for draw i in all_draw_patterns
+    def new_sim_result(self, i):
+        sim_result = HandSimResult()
+        sim_result.draw_index = i
+        sim_result.draw_cards = [self.dealt_cards[draw_pos] for draw_pos in all_draw_patterns[i]]
+        sim_result.draw_string = hand_string(sim_result.draw_cards)
+        return sim_result
+
+    # Sample final hand ranks for [(draw i, number of tries)], in one batch. Returns [ranks array], in the same order.
+    # Every row gets 5 new cards. Pattern keeping k cards, replaces the last 5-k
+    # For common random numbers, top 5 cards of each shared ordering, in order.
+    def sample_draw_ranks(self, remaining_indices, draws_tries, common_random_numbers=False, rng=None):
+        dealt_indices = [card.index for card in self.dealt_cards]
+        total_tries = sum([num_tries for (i, num_tries) in draws_tries])
+        if common_random_numbers:
+            orderings_keys = poker_random(rng).np.random_sample((max([num_tries for (i, num_tries) in draws_tries]), len(remaining_indices)))
+            orderings = remaining_indices[np.argsort(orderings_keys, axis=1)[:, :5]]
+        else:
+            draws = sample_cards_without_replacement(remaining_indices, total_tries, 5, rng=rng)
+
+        final_hands = np.empty((total_tries, 5), dtype=np.int64)
+        royal_rows = np.zeros(total_tries, dtype=bool)
+        start = 0
+        for (i, num_tries) in draws_tries:
+            draw_pattern = all_draw_patterns[i]
+            end = start + num_tries
+            num_kept = len(draw_pattern)
+            final_hands[start:end, :num_kept] = [dealt_indices[draw_pos] for draw_pos in sorted(draw_pattern)]
+            if common_random_numbers:
+                final_hands[start:end, num_kept:] = orderings[:num_tries, :(5 - num_kept)]
+            else:
+                final_hands[start:end, num_kept:] = draws[start:end, num_kept:]
+            royal_rows[start:end] = is_royal_flush_draw([self.dealt_cards[draw_pos] for draw_pos in draw_pattern])
+            start = end
+
+        hand_ranks = hand_rank_five_card_batch(card_index_hash_tags[final_hands])
+
+        # HACK! If we did *not* expect royal flush for this number of tried (example: []), knock Royal --> str8 flush.
+        hand_ranks[(hand_ranks == 1) & (~royal_rows)] += 1
+
+        draws_ranks = []
+        start = 0
+        for (i, num_tries) in draws_tries:
+            draws_ranks.append(hand_ranks[start:start + num_tries])
+            start += num_tries
+        return draws_ranks
+
+    # Race all draws, for the same total budget as simulate_all_draws_vectorized() [with royal multiplier].
+    # Each round, sample a batch for every live draw. Then drop draws whose upper confidence bound is below
+    # the leader's lower bound, and stop sampling draws already known to target precision.
+    # Once the others are dropped, the rest of the budget goes to the leader (best_value precision matters most).
+    # Royal draws still get ROYAL_DRAW_MULTIPLIER x batch, since rare payouts make early stdev unreliable.
+    # A draw is dropped when its average happens to be low, so its race samples are biased low. Instead, report dropped
+    # draws from fresh samples [dropped_fraction x tries], independent of the race. Reserved from the budget, when dropped.
+    # NOTE: Dropped draws have fewer samples than tries. Check sample_count and average_stdev.
+    # NOTE: Does not change the deck.
+    def simulate_all_draws_adaptive(self, deck, tries, payout_table, batch_tries=ADAPTIVE_BATCH_TRIES,
+                                    confidence_z=ADAPTIVE_CONFIDENCE_Z, target_stdev=ADAPTIVE_TARGET_STDEV,
+                                    dropped_fraction=ADAPTIVE_DROPPED_FRACTION):
+        remaining_indices = np.array(deck.card_indices())
+        rank_payouts = payout_table.payout_rank_array()
+        budget = sum([self.draw_tries(draw_pattern, tries) for draw_pattern in all_draw_patterns])
+        dropped_tries = max(int(tries * dropped_fraction), 1)
+
+        draws_results = [[] for i in range(len(all_draw_patterns))]
+        live_draws = range(len(all_draw_patterns))
+        dropped_draws = []
+        spent = 0
+        reserved = 0
+        while live_draws:
+            # Last round shrinks to what is left of the budget.
+            round_weight = sum([self.draw_tries(all_draw_patterns[i], 1) for i in live_draws])
+            round_tries = min(batch_tries, (budget - spent - reserved) // round_weight)
+            if round_tries < 1:
+                break
+            draws_tries = [(i, self.draw_tries(all_draw_patterns[i], round_tries)) for i in live_draws]
+            draws_ranks = self.sample_draw_ranks(remaining_indices, draws_tries, rng=deck.rng)
+            for ((i, num_tries), ranks) in zip(draws_tries, draws_ranks):
+                draws_results[i].append(ranks)
+                spent += num_tries
+
+            # Averages and standard errors, for all draws still in the race.
+            averages = {}
+            stdevs = {}
+            counts = {}
+            for i in live_draws:
+                results = rank_payouts[np.concatenate(draws_results[i])]
+                counts[i] = len(results)
+                averages[i] = np.mean(results)
+                stdevs[i] = np.std(results) / math.sqrt(len(results))
+            leader = max(live_draws, key=lambda i: averages[i])
+            leader_lower_bound = averages[leader] - confidence_z * stdevs[leader]
+
+            still_live = []
+            for i in live_draws:
+                if i != leader and averages[i] + confidence_z * stdevs[i] < leader_lower_bound:
+                    dropped_draws.append(i) # clearly worse
+                    reserved += self.draw_tries(all_draw_patterns[i], dropped_tries)
+                    continue
+                if stdevs[i] < target_stdev and counts[i] >= self.draw_tries(all_draw_patterns[i], tries):
+                    continue # precise enough. But never stop before full tries [with royal multiplier], since missing rare hands looks precise.
+                still_live.append(i)
+            live_draws = still_live
+
+        # Fresh samples for dropped draws. Race samples only decided which draws to drop.
+        if dropped_draws:
+            draws_tries = [(i, self.draw_tries(all_draw_patterns[i], dropped_tries)) for i in dropped_draws]
+            draws_ranks = self.sample_draw_ranks(remaining_indices, draws_tries, rng=deck.rng)
+            for ((i, num_tries), ranks) in zip(draws_tries, draws_ranks):
+                draws_results[i] = [ranks]
+
+        sim_results = []
+        for i in range(len(all_draw_patterns)):
+            sim_result = self.new_sim_result(i)
+            sim_result.set_rank_results(np.concatenate(draws_results[i]), rank_payouts)
+            sim_result.evaluate()
+            sim_results.append(sim_result)
+        return sim_results
+
+    # Importance sampling, for rare high payouts. Uniform tries can easily miss a royal (or get lucky, and hit one).
+    # For each draw, a fraction of tries instead complete a rare hand [royal, straight flush, quads] still possible
+    # with the kept cards. Split equally among those categories, uniform within each. The rest are uniform completions.
+    # Every try weighted by p/q = (uniform odds) / (odds under this mix), so weighted averages are unbiased.
+    # Same tries for every draw. No royal draw multiplier, and no royal knock-down hack.
+    # NOTE: Does not change the deck.
+    def simulate_all_draws_importance(self, deck, tries, payout_table, fraction=IMPORTANCE_SAMPLING_FRACTION):
+        remaining_indices = np.array(deck.card_indices())
+        remaining_mask = np.int64(sum([1 << int(index) for index in remaining_indices]))
+        dealt_indices = [card.index for card in self.dealt_cards]
+        rank_payouts = payout_table.payout_rank_array()
+        (rare_masks, rare_categories) = rare_draw_hands()
+        rng = poker_random(deck.rng)
+        draws = sample_cards_without_replacement(remaining_indices, tries * len(all_draw_patterns), 5, rng=rng)
+
+        final_hands = np.empty((tries * len(all_draw_patterns), 5), dtype=np.int64)
+        weights = np.ones(tries * len(all_draw_patterns))
+        for i in range(len(all_draw_patterns)):
+            rows = np.arange(i * tries, (i + 1) * tries)
+            kept_indices = [dealt_indices[draw_pos] for draw_pos in sorted(all_draw_patterns[i])]
+            kept_mask = np.int64(sum([1 << index for index in kept_indices]))
+            num_kept = len(kept_indices)
+            final_hands[rows, :num_kept] = kept_indices
+            final_hands[rows, num_kept:] = draws[rows, num_kept:]
+
+            # Rare hands we can still make: all kept cards in the hand, and the rest still in the deck.
+            reachable = ((rare_masks & kept_mask) == kept_mask) & ((rare_masks & ~(kept_mask | remaining_mask)) == 0)
+            targets = [rare_masks[reachable & (rare_categories == category)] for category in RARE_HAND_CATEGORIES]
+            targets = [category_targets for category_targets in targets if len(category_targets)]
+            if not targets:
+                continue
+            category_fraction = fraction / len(targets)
+            num_completions = float(choose(len(remaining_indices), 5 - num_kept))
+            choices = rng.np.random_sample(tries)
+            ratios = np.full(tries, 1.0 - fraction)
+            for t in range(len(targets)):
+                target_rows = rows[(choices >= t * category_fraction) & (choices < (t + 1) * category_fraction)]
+                if len(target_rows) and num_kept < 5:
+                    picked = targets[t][rng.np.randint(len(targets[t]), size=len(target_rows))]
+                    final_hands[target_rows, num_kept:] = card_masks_to_indices(picked & ~kept_mask, 5 - num_kept)
+            # p/q, for where each final hand landed [uniform tries can land on a rare hand too].
+            final_masks = np.bitwise_or.reduce(np.int64(1) << final_hands[rows], axis=1)
+            for t in range(len(targets)):
+                ratios += np.isin(final_masks, targets[t]) * (category_fraction * num_completions / len(targets[t]))
+            weights[rows] = 1.0 / ratios
+
+        hand_ranks = hand_rank_five_card_batch(card_index_hash_tags[final_hands])
+        sim_results = []
+        for i in range(len(all_draw_patterns)):
+            sim_result = self.new_sim_result(i)
+            sim_result.set_rank_results(hand_ranks[i * tries:(i + 1) * tries], rank_payouts, weights[i * tries:(i + 1) * tries])
+            sim_result.evaluate()
+            sim_results.append(sim_result)
+        return sim_results
+
+    # Exact values for all draws. For m cards discarded, every m-card completion from the remaining deck is equally likely.
+    # Completions for the same m share one array of combinations, so at most 1 + 5*47 + ... + C(47,5) ~ 2.6M hands per dealt hand.
+    # No royal draw multiplier or royal knock-down hack needed. These averages are exact.
+    # NOTE: Does not change the deck.
+    def simulate_all_draws_exact(self, deck, payout_table):
+        remaining_indices = np.array(deck.card_indices())
+        dealt_indices = [card.index for card in self.dealt_cards]
+        rank_payouts = payout_table.payout_rank_array()
+
+        sim_results = []
+        for i in range(len(all_draw_patterns)):
+            draw_pattern = all_draw_patterns[i]
+            num_kept = len(draw_pattern)
+            completions = remaining_indices[combination_indices(len(remaining_indices), 5 - num_kept)]
+            final_hands = np.empty((len(completions), 5), dtype=np.int64)
+            final_hands[:, :num_kept] = [dealt_indices[draw_pos] for draw_pos in sorted(draw_pattern)]
+            final_hands[:, num_kept:] = completions
+            hand_ranks = hand_rank_five_card_batch(card_index_hash_tags[final_hands])
+
+            sim_result = self.new_sim_result(i)
+            sim_result.exact = True
+            sim_result.set_rank_results(hand_ranks, rank_payouts)
+            sim_result.evaluate()
+            sim_results.append(sim_result)
+        return sim_results
+
+    # Debug output, and choose the best draw. Same for all simulation modes.
+    # If paired samples, also compare every draw to the best one (variance reduction).
+    def finish_simulate_all_draws(self, debug=True, paired=False):
+        if paired:
+            best_result = max(self.sim_results)
+            for sim_result in self.sim_results:
+                sim_result.compare_to_best(best_result)
+
         # print([draw pattern] : [result])
         if debug:
             print('All %d sim results for hand [%s]:' % (len(self.sim_results), ','.join([str(card) for card in self.dealt_cards])))
@@ -1121,15 +1601,14 @@ class PokerHand(object):
 
 
 # Wrapper around a poker deck. Supports dealing and shuffling.
+# rng = PokerRandom context for shuffles (default: global random)
 class PokerDeck(object):
-    def __init__(self, shuffle=True):
-        self.cards = []
-        for suit in suitsArray:
-            for rank in ranksArray:
-                card = Card(suit=suit, value=rank)
-                self.cards.append(card)
+    def __init__(self, shuffle=True, rng=None):
+        self.rng = poker_random(rng)
+        # Interned cards, in index order (suit by suit)
+        self.cards = list(all_cards_by_index)
         if (shuffle):
-            random.shuffle(self.cards)
+            self.rng.random.shuffle(self.cards)
         # Just cards, in order, for now.
         self.dealt_cards = [] # Given to players
         self.discard_cards = [] # Returned to the deck
@@ -1151,8 +1630,9 @@ class PokerDeck(object):
     def deal_cards(self, cards_array, track_deal=False):
         deal_cards = []
         deck_after = []
+        cards_set = set(cards_array)
         for card in self.cards:
-            if card in cards_array:
+            if card in cards_set:
                 deal_cards.append(card)
                 if track_deal:
                     self.dealt_cards.append(card)
@@ -1171,6 +1651,14 @@ class PokerDeck(object):
         cards = self.deal(num_cards=1, track_deal=track_deal)
         return cards[0]
 
+    # Indices of cards in the deck, in deal order (last card is dealt first).
+    def card_indices(self):
+        return [card.index for card in self.cards]
+
+    # Sample k card indices without replacement, without removing them from the deck.
+    def sample_indices(self, num_cards):
+        return [card.index for card in self.rng.random.sample(self.cards, num_cards)]
+
     # put cards back in the deck... (for local simulation, etc)
     def return_cards(self, cards_return, shuffle=True):
         #print('returning cards %s to deck' % hand_string(cards_return))
@@ -1178,7 +1666,7 @@ class PokerDeck(object):
             self.cards.append(card)
 
         if shuffle:
-            random.shuffle(self.cards)
+            self.rng.random.shuffle(self.cards)
         
     # Put discards in the "back" of the deck.
     def take_discards(self, discards):
@@ -1187,7 +1675,7 @@ class PokerDeck(object):
 
     # Shuffle cards remaining in the deck.
     def shuffle(self):
-        random.shuffle(self.cards)
+        self.rng.random.shuffle(self.cards)
 
     # Remove card from the deck. Returns the card, or None of not found
     def remove_card(self, card):
@@ -1205,3 +1693,143 @@ class PokerDeck(object):
             self.cards.insert(pos, card_pop)
         else:
             print('Card %s not found in deck! Ignoring set_card' % card)
+
+# Alternative deck for simulations, with the same interface as PokerDeck.
+# Cards are [0, 51] indices in an int array: live cards in order[0:size], top of the deck at the end (like PokerDeck).
+# Returning dealt cards [return_cards(), HoldemCommunityHand.undeal()] is O(1) per card, so a simulated deal is undone in O(1).
+# Also keeps a 64-bit mask of live cards, for fast membership checks.
+# NOTE: cards is a read-only tuple [not the deck's own list, like PokerDeck]. Change the deck with its methods.
+# NOTE: shuffle() is lazy. Instead of shuffling the whole deck, each card is dealt from a random live position
+# (partial Fisher-Yates). Same distribution as shuffle-then-deal, but O(1) per card, and no reshuffle after returns.
+class BitmaskPokerDeck(object):
+    def __init__(self, shuffle=True, rng=None):
+        self.rng = poker_random(rng)
+        self.random = self.rng.random.random # called for every card dealt
+        self.order = range(52)
+        self.position = range(52) # position of each card index in self.order
+        self.size = 52
+        self.live_mask = (1 << 52) - 1
+        self.randomized = shuffle
+        self.dealt_cards = [] # Given to players
+        self.discard_cards = [] # Returned to the deck
+
+    # Live cards, in deal order (last card is dealt first). Fixes the order if deck was lazily shuffled. Read-only.
+    @property
+    def cards(self):
+        self.fix_order()
+        return tuple([all_cards_by_index[index] for index in self.order[:self.size]])
+
+    # Indices of live cards. If lazily shuffled, order is not random [no need to fix it, for sampling].
+    def card_indices(self):
+        return self.order[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, card):
+        return bool(self.live_mask & (1 << card.index))
+
+    def swap(self, i, j):
+        order = self.order
+        (order[i], order[j]) = (order[j], order[i])
+        self.position[order[i]] = i
+        self.position[order[j]] = j
+
+    # Deal top card, index only. If randomized, first swap a random live card to the top.
+    def deal_index(self):
+        assert self.size > 0, 'Can not deal from an empty deck!'
+        if self.randomized:
+            self.swap(int(self.random() * self.size), self.size - 1)
+        self.size -= 1
+        index = self.order[self.size]
+        self.live_mask &= ~(1 << index)
+        return index
+
+    # pops cards from deck, returns objects, keeps reference
+    def deal(self, num_cards, track_deal=True):
+        deal_cards = [all_cards_by_index[self.deal_index()] for x in range(num_cards)]
+        if track_deal:
+            self.dealt_cards.extend(deal_cards)
+        return deal_cards
+
+    # shortcut, for single card
+    def deal_single(self, track_deal=True):
+        cards = self.deal(num_cards=1, track_deal=track_deal)
+        return cards[0]
+
+    # remove specific cards, to simulate draw
+    def deal_cards(self, cards_array, track_deal=False):
+        for card in cards_array:
+            assert card in self, 'Card %s not in the deck!' % card
+            self.remove_card(card)
+            if track_deal:
+                self.dealt_cards.append(card)
+        # Return in the same order...
+        return cards_array
+
+    # Sample k card indices without replacement, without removing them from the deck (partial Fisher-Yates).
+    def sample_indices(self, num_cards):
+        assert num_cards <= self.size, 'Can not sample %d cards from %d' % (num_cards, self.size)
+        sample = []
+        for x in range(num_cards):
+            top = self.size - 1 - x
+            self.swap(int(self.random() * (top + 1)), top)
+            sample.append(self.order[top])
+        self.randomized = True # order of live cards changed
+        return sample
+
+    # put cards back in the deck... (for local simulation, etc)
+    # Returned cards go on top of the deck, like PokerDeck. If shuffle, deck is randomized (lazily).
+    def return_cards(self, cards_return, shuffle=True):
+        for card in cards_return:
+            index = card.index
+            assert not (self.live_mask & (1 << index)), 'Card %s already in the deck!' % card
+            self.swap(self.position[index], self.size)
+            self.size += 1
+            self.live_mask |= (1 << index)
+        if shuffle:
+            self.randomized = True
+
+    # Put discards in the "back" of the deck.
+    def take_discards(self, discards):
+        for card in discards:
+            self.discard_cards.append(card)
+
+    # Shuffle cards remaining in the deck. Lazy, see above.
+    def shuffle(self):
+        self.randomized = True
+
+    # If lazily shuffled, actually shuffle live cards. Needed before anything that depends on exact order.
+    def fix_order(self):
+        if self.randomized:
+            for top in range(self.size - 1, 0, -1):
+                self.swap(int(self.random() * (top + 1)), top)
+            self.randomized = False
+
+    # Remove card from the deck. Returns the card, or None of not found
+    # O(1) if randomized. Otherwise, keep order of the other cards.
+    def remove_card(self, card):
+        index = card.index
+        if not (self.live_mask & (1 << index)):
+            print('Can not find card %s in deck!' % card)
+            return None
+        pos = self.position[index]
+        if self.randomized:
+            self.swap(pos, self.size - 1)
+        else:
+            for i in range(pos, self.size - 1):
+                self.swap(i, i + 1)
+        self.size -= 1
+        self.live_mask &= ~(1 << index)
+        return card
+
+    # Swaps card into given position
+    def set_card(self, card, pos=0):
+        self.fix_order()
+        card_pop = self.remove_card(card)
+        if card_pop:
+            self.return_cards([card_pop], shuffle=False)
+            for i in range(self.size - 1, pos, -1):
+                self.swap(i, i - 1)
+        else:
+            print('Card %s not found in deck! Ignoring set_card' % card)
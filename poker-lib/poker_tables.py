@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import itertools
+import numpy as np
+from poker_hashes import *
+from poker_lib import *
+
+"""
+Precomputed lookup tables for poker hand evaluation, generated once, saved to disk, and loaded lazily.
+
+Tables are built from the classic 5-card hashes (poker_hashes), so ranks are on the same [1, 7462] scale.
+Run this file directly to (re)generate all tables.
+"""
+
+# Where to keep generated tables. Override with env variable, if we want tables on a shared/fast disk.
+POKER_TABLES_DIR = os.environ.get('POKER_TABLES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables'))
+
+def poker_table_path(filename):
+    return os.path.join(POKER_TABLES_DIR, filename)
+
+# Write to temp file, then rename. So that parallel workers never read a half-written table.
+def save_table_npz(filename, **arrays):
+    if not os.path.isdir(POKER_TABLES_DIR):
+        try:
+            os.makedirs(POKER_TABLES_DIR)
+        except OSError:
+            pass # created by another process
+    path = poker_table_path(filename)
+    tmp_path = '%s.%d.tmp.npz' % (path, os.getpid())
+    np.savez(tmp_path, **arrays)
+    os.rename(tmp_path, path)
+    return path
+
+#######################################################################
+## 5, 6 and 7-card evaluator.
+## Without a flush, hand rank depends only on the multiset of card ranks. Uniquely identified by product of primes.
+## With 5+ cards of a suit, hand is (at best) a flush. With 7 cards or less, that also beats any paired hand.
+## So two tables: best rank by product of primes (no flush), and best flush rank by 13-bit rank mask of the flush suit.
+#######################################################################
+SEVEN_CARD_TABLES_FILE = 'seven_card_ranks.npz'
+
+# Rank of 5-card hand (no flush) from its ranks only. Same logic as hand_rank_five_card.
+def rank_five_card_no_flush(card_ranks):
+    q = 0
+    product = 1
+    for rank in card_ranks:
+        q |= (1 << rank)
+        product *= hashPrimes[rank]
+    s = unique5[q]
+    if s:
+        return s
+    return values[hard_findit(product)]
+
+# Best rank, for each multiset of 5-7 card ranks (max 4 of each rank). Sorted by product of primes.
+def generate_rank_multiset_table():
+    five_card_ranks = {}
+    products_ranks = []
+    for num_cards in [5, 6, 7]:
+        for card_ranks in itertools.combinations_with_replacement(ranksArray, num_cards):
+            if max([card_ranks.count(rank) for rank in set(card_ranks)]) > 4:
+                continue
+            best_rank = 0
+            for five_ranks in itertools.combinations(card_ranks, 5):
+                if not five_ranks in five_card_ranks:
+                    five_card_ranks[five_ranks] = rank_five_card_no_flush(five_ranks)
+                rank = five_card_ranks[five_ranks]
+                if not best_rank or rank < best_rank:
+                    best_rank = rank
+            product = 1
+            for rank in card_ranks:
+                product *= hashPrimes[rank]
+            products_ranks.append((product, best_rank))
+    products_ranks.sort()
+    multiset_products = np.array([p for (p, r) in products_ranks], dtype=np.int64)
+    multiset_ranks = np.array([r for (p, r) in products_ranks], dtype=np.uint16)
+    return (multiset_products, multiset_ranks)
+
+# Best flush (or straight flush) rank, for 13-bit mask of ranks in one suit. Zero if fewer than 5 cards.
+def generate_flush_table():
+    flush_ranks = np.zeros(1 << 13, dtype=np.uint16)
+    for mask in range(1 << 13):
+        mask_ranks = [rank for rank in ranksArray if mask & (1 << rank)]
+        if len(mask_ranks) < 5:
+            continue
+        flush_ranks[mask] = min([flushes[sum([1 << rank for rank in five_ranks])] for five_ranks in itertools.combinations(mask_ranks, 5)])
+    return flush_ranks
+
+def generate_seven_card_tables():
+    print('generating 5-7 card rank tables...')
+    now = time.time()
+    (multiset_products, multiset_ranks) = generate_rank_multiset_table()
+    flush_ranks = generate_flush_table()
+    path = save_table_npz(SEVEN_CARD_TABLES_FILE, multiset_products=multiset_products,
+                          multiset_ranks=multiset_ranks, flush_ranks=flush_ranks)
+    print('%.1fs to generate %d rank multisets, and flushes table. Saved to %s' % (time.time() - now, len(multiset_products), path))
+
+# Lazy load (generate if missing). Dict copy of multisets, for fast scalar lookup.
+_seven_card_tables = None
+def seven_card_tables():
+    global _seven_card_tables
+    if _seven_card_tables is None:
+        if not os.path.exists(poker_table_path(SEVEN_CARD_TABLES_FILE)):
+            generate_seven_card_tables()
+        data = np.load(poker_table_path(SEVEN_CARD_TABLES_FILE))
+        multiset_products = data['multiset_products']
+        multiset_ranks = data['multiset_ranks'].astype(np.int32)
+        flush_ranks = data['flush_ranks'].astype(np.int32)
+        multiset_map = dict(zip(multiset_products.tolist(), multiset_ranks.tolist()))
+        _seven_card_tables = (multiset_products, multiset_ranks, flush_ranks, multiset_map, flush_ranks.tolist())
+    return _seven_card_tables
+
+# Rank any 5, 6 or 7 cards. Best 5-card rank, on the usual [1, 7462] scale.
+def hand_rank_cards(cards):
+    (multiset_products, multiset_ranks, flush_ranks, multiset_map, flush_ranks_list) = seven_card_tables()
+    product = 1
+    suit_masks = {CLUB: 0, DIAMOND: 0, HEART: 0, SPADE: 0}
+    suit_counts = {CLUB: 0, DIAMOND: 0, HEART: 0, SPADE: 0}
+    for card in cards:
+        product *= (card.hashTag & 0xFF)
+        suit_masks[card.suit] |= (1 << card.value)
+        suit_counts[card.suit] += 1
+    for suit in suitsArray:
+        if suit_counts[suit] >= 5:
+            return flush_ranks_list[suit_masks[suit]]
+    return multiset_map[product]
+
+# Batch version. Takes (N, k) array of hash tags, for k in [5, 7]. Returns (N,) ranks.
+def hand_rank_cards_batch(hash_tags):
+    (multiset_products, multiset_ranks, flush_ranks, multiset_map, flush_ranks_list) = seven_card_tables()
+    hash_tags = np.asarray(hash_tags, dtype=np.int64)
+    assert hash_tags.ndim == 2 and 5 <= hash_tags.shape[1] <= 7, 'Need (N, 5-7) array of hash tags. Given %s' % (hash_tags.shape,)
+
+    # Rank multiset, ignoring flushes.
+    product = np.prod(hash_tags & 0xFF, axis=1)
+    ranks = multiset_ranks[np.searchsorted(multiset_products, product)]
+
+    # For each suit, mask of ranks in that suit. Table returns 0 unless 5+ cards.
+    rank_bits = (hash_tags >> 16) & 0x1FFF
+    for suit in suitsArray:
+        suit_mask = np.bitwise_or.reduce(np.where(hash_tags & suit, rank_bits, 0), axis=1)
+        suit_ranks = flush_ranks[suit_mask]
+        has_flush = suit_ranks > 0
+        ranks[has_flush] = np.minimum(ranks[has_flush], suit_ranks[has_flush])
+    return ranks
+
+#######################################################################
+## Rank table for all C(52,5) = 2,598,960 five-card hands, in colex order.
+## Colex index of sorted card indices c0 < c1 < c2 < c3 < c4 is C(c0,1) + C(c1,2) + C(c2,3) + C(c3,4) + C(c4,5)
+## Row = [high rank, 2-7 rank] as uint16. ~10MB raw file, opened with np.memmap, so shared (page cache) by all workers.
+#######################################################################
+FIVE_CARD_RANKS_FILE = 'five_card_ranks.u16'
+NUM_FIVE_CARD_HANDS = 2598960
+FIVE_CARD_HIGH_COLUMN = 0
+FIVE_CARD_DEUCE_COLUMN = 1
+
+# binomials[k][n] = C(n, k) for n in [0, max_n]
+def binomials_table(max_k, max_n):
+    binomials = np.zeros((max_k + 1, max_n + 1), dtype=np.int64)
+    binomials[0, :] = 1
+    for n in range(1, max_n + 1):
+        for k in range(1, max_k + 1):
+            binomials[k][n] = binomials[k][n-1] + binomials[k-1][n-1]
+    return binomials
+colex_binomials = binomials_table(5, 52)
+
+# (N, 5) card indices [0, 51], in any order -> (N,) colex index.
+def five_card_colex_index(card_indices):
+    card_indices = np.sort(np.asarray(card_indices, dtype=np.int64), axis=1)
+    index = np.zeros(card_indices.shape[0], dtype=np.int64)
+    for k in range(5):
+        index += colex_binomials[k+1][card_indices[:, k]]
+    return index
+
+# Scalar version, for array of 5 Card objects.
+def five_card_colex_index_cards(cards):
+    card_indices = sorted([card_index(card) for card in cards])
+    index = 0
+    for k in range(5):
+        index += colex_binomials[k+1][card_indices[k]]
+    return int(index)
+
+def generate_five_card_rank_table(chunk_size = 250000):
+    print('generating rank table for all %d five-card hands...' % NUM_FIVE_CARD_HANDS)
+    now = time.time()
+    if not os.path.isdir(POKER_TABLES_DIR):
+        try:
+            os.makedirs(POKER_TABLES_DIR)
+        except OSError:
+            pass # created by another process
+    path = poker_table_path(FIVE_CARD_RANKS_FILE)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    table = np.memmap(tmp_path, dtype=np.uint16, mode='w+', shape=(NUM_FIVE_CARD_HANDS, 2))
+    all_hands = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(52), 5)),
+                            dtype=np.int8, count=NUM_FIVE_CARD_HANDS * 5).reshape((NUM_FIVE_CARD_HANDS, 5))
+    for start in range(0, NUM_FIVE_CARD_HANDS, chunk_size):
+        hands = all_hands[start:start+chunk_size]
+        hash_tags = card_index_hash_tags[hands]
+        rows = five_card_colex_index(hands)
+        table[rows, FIVE_CARD_HIGH_COLUMN] = hand_rank_five_card_batch(hash_tags)
+        table[rows, FIVE_CARD_DEUCE_COLUMN] = deuce_rank_five_card_batch(hash_tags)
+    table.flush()
+    del table
+    os.rename(tmp_path, path)
+    print('%.1fs to generate five-card rank table. Saved to %s' % (time.time() - now, path))
+
+# Lazy open (generate if missing). Read-only memory map.
+_five_card_rank_table = None
+def five_card_rank_table():
+    global _five_card_rank_table
+    if _five_card_rank_table is None:
+        if not os.path.exists(poker_table_path(FIVE_CARD_RANKS_FILE)):
+            generate_five_card_rank_table()
+        _five_card_rank_table = np.memmap(poker_table_path(FIVE_CARD_RANKS_FILE), dtype=np.uint16, mode='r',
+                                          shape=(NUM_FIVE_CARD_HANDS, 2))
+    return _five_card_rank_table
+
+# Same results as hand_rank_five_card and deuce_rank_five_card. One index computation, and one array read.
+def hand_rank_five_card_table(cards):
+    return int(five_card_rank_table()[five_card_colex_index_cards(cards), FIVE_CARD_HIGH_COLUMN])
+
+def deuce_rank_five_card_table(cards):
+    return int(five_card_rank_table()[five_card_colex_index_cards(cards), FIVE_CARD_DEUCE_COLUMN])
+
+# Batch lookup, from (N, 5) card indices. Returns (high ranks, 2-7 ranks), both (N,) int arrays.
+def five_card_ranks_from_indices(card_indices):
+    rows = five_card_rank_table()[five_card_colex_index(card_indices)]
+    return (rows[:, FIVE_CARD_HIGH_COLUMN].astype(np.int32), rows[:, FIVE_CARD_DEUCE_COLUMN].astype(np.int32))
+
+if __name__ == '__main__':
+    generate_seven_card_tables()
+    generate_five_card_rank_table()
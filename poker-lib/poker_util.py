@@ -5,6 +5,8 @@ Copyright: PokerPoker, LLC 2015
 Re-usable & utility functions, for poker game network.
 """
 
+import random
+import hashlib
 # Math functions
 import numpy as np
 from scipy.stats import beta 
@@ -24,6 +26,47 @@ PUSH_ALLIN_COMMITTED_BETS = True
 # start to push probabilty mass toward the allin bet ourselves.
 PUSH_ALLIN_COMMIT_MIN_ODDS = 1. / 2. # Note that we don't count opponent bet, in odds we'd get in callin the allin next.
 
+#######################################################################
+## Random number streams. One context object, passed down to decks, dealers, simulators and AI players.
+## Seeded context: own random.Random (shuffles, coin flips) and np.random.RandomState (bulk sampling).
+## Default (no seed): the global random and np.random modules, same as before.
+## spawn() makes children with independent streams, derived from (seed, spawn key), like NumPy's SeedSequence.
+## So shard N of a run always gets the same stream, and no two shards share one.
+#######################################################################
+class PokerRandom(object):
+    def __init__(self, seed=None, spawn_key=()):
+        self.seed = seed
+        self.spawn_key = tuple(spawn_key)
+        self.num_children = 0
+        if seed is None:
+            self.random = random
+            self.np = np.random
+        else:
+            digest = hashlib.sha256(('%d:%s' % (seed, ','.join([str(key) for key in self.spawn_key]))).encode('ascii')).hexdigest()
+            self.random = random.Random(int(digest, 16))
+            self.np = np.random.RandomState(np.array([int(digest[i:i+8], 16) for i in range(0, len(digest), 8)], dtype=np.uint32))
+
+    # Next n children. Unseeded context gives seeded children, with fresh entropy (still independent).
+    def spawn(self, n):
+        if self.seed is None:
+            return [PokerRandom(seed=random.SystemRandom().getrandbits(64)) for i in range(n)]
+        children = [PokerRandom(seed=self.seed, spawn_key=self.spawn_key + (self.num_children + i,)) for i in range(n)]
+        self.num_children += n
+        return children
+
+    def __str__(self):
+        if self.seed is None:
+            return 'PokerRandom(global)'
+        return 'PokerRandom(seed=%d, spawn_key=%s)' % (self.seed, self.spawn_key)
+
+default_poker_random = PokerRandom()
+
+# Context given, or the global streams.
+def poker_random(rng=None):
+    if rng is None:
+        return default_poker_random
+    return rng
+
 # Fill in dense features vector from sparse features map. Keys: 'key':row, Data: 'key':datum.
 def VectorFromKeysAndSparseMap(keys, sparse_data_map, default_value = 0):
     dense_data_vector = [default_value] * len(keys)
@@ -243,7 +286,7 @@ def best_bet_with_smoothing(bets, values, min_bet = 0.0, pot_size = 0.0, allin_w
 # NOTE: Minimal error checking. Feed this guy good inputs.
 def sample_smoothed_bet_probability_vector(bets, bet_size_probs, min_bet = 0.0, pot_size = 0.0, max_bet = 0.0, 
                                            aggressive_betting = AGGRESSIVE_BETSIZING, 
-                                           push_allin_committed = PUSH_ALLIN_COMMITTED_BETS, debug = True):
+                                           push_allin_committed = PUSH_ALLIN_COMMITTED_BETS, debug = True, rng = None):
     # cleanup
     bets = np.clip(bets, min_bet, max_bet)
     
@@ -330,10 +373,10 @@ def sample_smoothed_bet_probability_vector(bets, bet_size_probs, min_bet = 0.0,
     if debug:
         bet_samples = []
         for _ in range(10):
-            bet_size = np.random.choice(interped_x, p=interped_histogram)
+            bet_size = poker_random(rng).np.choice(interped_x, p=interped_histogram)
             bet_samples.append(bet_size)
         bet_samples.sort()
         print([int(bet) for bet in bet_samples])
     else:
-        bet_size = np.random.choice(interped_x, p=interped_histogram)
+        bet_size = poker_random(rng).np.choice(interped_x, p=interped_histogram)
     return bet_size
@@ -4,7 +4,12 @@ import logging
 import time
 import math
 import re
+import ast
+import json
 import random
+import os
+import argparse # command line arguements parsing
+import multiprocessing
 import numpy as np
 import scipy.stats as ss
 from poker_lib import *
@@ -41,6 +46,23 @@ for draw_pattern in all_draw_patterns:
     POKER_FULL_SIM_HEADER.append('%s_value' % draw_to_string)
     POKER_FULL_SIM_HEADER.append('%s_draw' % draw_to_string)
 
+# Median variance reduction (vs best draw), with common random numbers. Empty otherwise.
+POKER_FULL_SIM_HEADER.append('variance_reduction')
+
+# How precise is each value? Number of samples, and standard error of the average (0.0 if exact).
+# NOTE: With adaptive sampling, counts are different for each draw.
+for draw_pattern in all_draw_patterns:
+    draw_to_string = '[%s]' % ','.join([str(i) for i in list(draw_pattern)])
+    POKER_FULL_SIM_HEADER.append('%s_count' % draw_to_string)
+    POKER_FULL_SIM_HEADER.append('%s_stdev' % draw_to_string)
+
+# Paytable-independent results. Odds of each final hand category [HIGH_HAND_CATEGORIES and DEUCE_CATEGORIES], per draw.
+# Value for another category paytable is a dot product, without re-running the sim. See draw_values_for_payout_table()
+for draw_pattern in all_draw_patterns:
+    draw_to_string = '[%s]' % ','.join([str(i) for i in list(draw_pattern)])
+    POKER_FULL_SIM_HEADER.append('%s_categories' % draw_to_string)
+    POKER_FULL_SIM_HEADER.append('%s_deuce_categories' % draw_to_string)
+
 print(POKER_FULL_SIM_HEADER)
 
 # Save a fully simulated hand, in the above format!
@@ -60,11 +82,30 @@ def output_full_sim_csv(poker_hand, header_map, sample_size):
         draw_to_string = '[%s]' % ','.join([str(i) for i in list(draw_pattern)])
         output_map['%s_value' % draw_to_string] = draw_result.average_value
         output_map['%s_draw' % draw_to_string] = hand_string(draw_result.draw_cards)
+        output_map['%s_count' % draw_to_string] = draw_result.sample_count
+        output_map['%s_stdev' % draw_to_string] = draw_result.average_stdev
+        if draw_result.category_histogram is not None:
+            output_map['%s_categories' % draw_to_string] = [round(x, 7) for x in draw_result.category_histogram]
+            output_map['%s_deuce_categories' % draw_to_string] = [round(x, 7) for x in draw_result.deuce_category_histogram]
+
+    variance_reductions = [draw_result.variance_reduction for draw_result in poker_hand.sim_results if draw_result.variance_reduction]
+    if variance_reductions:
+        output_map['variance_reduction'] = np.median(variance_reductions)
         
     # Place values in correct order
     output_row = VectorFromKeysAndSparseMap(keys=header_map, sparse_data_map=output_map, default_value = '')
     return output_row
 
+# Values of all 32 draws for a different payout table [by category, like JacksOrBetter(jacks_or_better_table_9_6)],
+# from the category histograms in a saved sim CSV row. Same order as all_draw_patterns.
+def draw_values_for_payout_table(csv_row, header_map, payout_table):
+    values = []
+    for draw_pattern in all_draw_patterns:
+        draw_to_string = '[%s]' % ','.join([str(i) for i in list(draw_pattern)])
+        category_histogram = ast.literal_eval(csv_row[header_map['%s_categories' % draw_to_string]])
+        values.append(category_histogram_value(category_histogram, payout_table))
+    return values
+
 
 # Try every possible draw combination... X times. Save averages.
 # Output... average value of the best move.
@@ -76,11 +117,18 @@ def output_full_sim_csv(poker_hand, header_map, sample_size):
 #       - return cards, draw again
 #       - save values & averages
 # C. Output value of best average
-def game_full_sim(round, tries_per_draw):
+#
+# vectorized = sample & evaluate all draws at once, in numpy. Much faster, same output.
+# exact = enumerate every possible draw. No sampling noise (tries_per_draw ignored).
+# common_random_numbers = all draws share the same samples. Better comparison of draws, and choice of best draw.
+# adaptive = race the draws. Stop sampling draws that are clearly worse than the best.
+# importance = oversample royals, straight flushes and quads, and reweight. Unbiased, and less noise for royal draws.
+def game_full_sim(round, tries_per_draw, vectorized=False, exact=False, common_random_numbers=False, adaptive=False, importance=False,
+                  rng=None):
 
     print('\n-- New Round %d --\n' % round)
 
-    deck = PokerDeck(shuffle=True)
+    deck = BitmaskPokerDeck(shuffle=True, rng=rng)
     #print(deck)
     draw_hand = PokerHand()
     deal_cards = deck.deal(5)
@@ -90,7 +138,8 @@ def game_full_sim(round, tries_per_draw):
     # Now, have the hand simulate simulate every possible draw, and record results.
     # NOTE: Don't copy the deck!
     cashier = JacksOrBetter() # "976-9-6" Jacks or Better -- with 100% long-term payout.
-    draw_hand.simulate_all_draws(deck=deck, tries=tries_per_draw, payout_table=cashier, debug=False)
+    draw_hand.simulate_all_draws(deck=deck, tries=tries_per_draw, payout_table=cashier, debug=False, vectorized=vectorized, exact=exact, common_random_numbers=common_random_numbers,
+                                 adaptive=adaptive, importance=importance)
 
     #print(draw_hand)
 
@@ -101,7 +150,9 @@ def game_full_sim(round, tries_per_draw):
 
 
 # Play a number of hands. For each hand, try every possible draw X times, save as output
-def generated_cases(sample_size, tries_per_draw, output_file_name):
+# rng = PokerRandom context (default: global random streams)
+def generated_cases(sample_size, tries_per_draw, output_file_name, vectorized=False, exact=False, common_random_numbers=False, adaptive=False,
+                    importance=False, rng=None):
     round = 0
     start_time = time.time()
     short_results = []
@@ -115,12 +166,17 @@ def generated_cases(sample_size, tries_per_draw, output_file_name):
         csv_writer = None
 
     while round < sample_size:
-        hand, payout = game_full_sim(round, tries_per_draw)
+        hand, payout = game_full_sim(round, tries_per_draw, vectorized=vectorized, exact=exact, common_random_numbers=common_random_numbers,
+                                      adaptive=adaptive, importance=importance, rng=rng)
         short_results.append([hand_string(hand.best_result.draw_cards), payout])
 
         # Save hand to CSV, if output supplied.
         if csv_writer:
-            hand_csv_row = output_full_sim_csv(poker_hand=hand, header_map=csv_header_map, sample_size=tries_per_draw)
+            # For exact values, sample size is all completions for a full 5-card draw, C(47,5)
+            draw_sample_size = tries_per_draw
+            if exact:
+                draw_sample_size = max([len(sim_result.results) for sim_result in hand.sim_results])
+            hand_csv_row = output_full_sim_csv(poker_hand=hand, header_map=csv_header_map, sample_size=draw_sample_size)
             csv_writer.writerow(hand_csv_row)
 
             # Hack, to show matrix for final hand.
@@ -134,28 +190,138 @@ def generated_cases(sample_size, tries_per_draw, output_file_name):
         print('%d rounds took %.1f seconds' % (round, end_round_time - start_time))
 
     if csv_writer:
-        print('\nwrote %d rows' % len(results))
+        print('\nwrote %d rows' % round)
         output_file.close()
 
     print(short_results)
     result_values = [r[1] for r in short_results]
     print('\naverage return: %.2f\tmax return: %.1f' % (np.mean(result_values), max(result_values)))
 
+def shard_file_name(output_file_name, shard):
+    return '%s.shard%03d' % (output_file_name, shard)
+
+def shard_manifest_file_name(output_file_name):
+    return '%s.manifest' % output_file_name
+
+# Parameters of a sharded run, saved next to the shards on first run. Resume only with the same parameters,
+# else existing shards would be mixed with shards from a different random stream (or of the wrong size).
+def shard_manifest(base_seed, shard_samples, tries_per_draw, sim_options):
+    return {'base_seed': base_seed, 'shards': len(shard_samples), 'shard_samples': shard_samples,
+            'tries_per_draw': tries_per_draw, 'sim_options': dict(sim_options)}
+
+# Load manifest from a previous run (or None). If no seed given, resume with the previous run's seed.
+def check_shard_manifest(output_file_name, base_seed, shard_samples, tries_per_draw, sim_options):
+    manifest_file = shard_manifest_file_name(output_file_name)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r') as f:
+        previous = json.load(f)
+    if base_seed is None:
+        base_seed = previous['base_seed']
+    manifest = shard_manifest(base_seed, shard_samples, tries_per_draw, sim_options)
+    for key in sorted(manifest.keys()):
+        assert manifest[key] == previous[key], ('Can not resume sharded run %s: %s %s != previous %s. Use a new output, or delete old shards and %s' %
+                                                (output_file_name, key, manifest[key], previous[key], manifest_file))
+    return previous
+
+# Remove partial shard outputs, left by killed workers.
+def remove_stale_shard_files(output_file_name):
+    shard_prefix = os.path.basename(output_file_name) + '.shard'
+    shard_dir = os.path.dirname(output_file_name) or '.'
+    for file_name in os.listdir(shard_dir):
+        if file_name.startswith(shard_prefix) and file_name.endswith('.tmp'):
+            print('removing partial shard %s' % file_name)
+            os.remove(os.path.join(shard_dir, file_name))
+
+# Simulate hands for one shard, in its own process. Write to temp file, rename when complete.
+# Shard file existing means shard is done, so an interrupted run can be resumed [with same parameters, see shard manifest].
+def generate_shard(shard_task):
+    (shard, shard_samples, base_seed, tries_per_draw, output_file_name, sim_options) = shard_task
+    shard_output = shard_file_name(output_file_name, shard)
+    if os.path.exists(shard_output):
+        print('shard %d already complete: %s' % (shard, shard_output))
+        return shard_output
+    # Shards get independent (and reproducible) random streams, spawned from base seed.
+    rng = PokerRandom(base_seed, spawn_key=(shard,))
+    tmp_output = '%s.%d.tmp' % (shard_output, os.getpid())
+    generated_cases(sample_size=shard_samples, tries_per_draw=tries_per_draw, output_file_name=tmp_output, rng=rng, **sim_options)
+    os.rename(tmp_output, shard_output)
+    return shard_output
+
+# Split samples into shards, and simulate them with a pool of workers. Optionally, merge shards (in shard order).
+def generated_cases_sharded(sample_size, tries_per_draw, output_file_name, workers, shards=None, base_seed=None, merge=False, sim_options=None):
+    sim_options = dict(sim_options or {}) # copy, since it is saved in the manifest and sent to every shard
+    if not shards:
+        shards = workers
+    shard_samples = [sample_size // shards + (1 if shard < sample_size % shards else 0) for shard in range(shards)]
+
+    # Resume previous run (same parameters and seed), or save parameters for this one.
+    previous = check_shard_manifest(output_file_name, base_seed, shard_samples, tries_per_draw, sim_options)
+    if previous:
+        base_seed = previous['base_seed']
+        print('resuming sharded run, from %s' % shard_manifest_file_name(output_file_name))
+    else:
+        for shard in range(shards):
+            assert not os.path.exists(shard_file_name(output_file_name, shard)), ('Shard %s exists, but no manifest of its parameters. Delete old shards, or use a new output' %
+                                                                                  shard_file_name(output_file_name, shard))
+        if base_seed is None:
+            base_seed = int(time.time())
+        with open(shard_manifest_file_name(output_file_name), 'w') as f:
+            json.dump(shard_manifest(base_seed, shard_samples, tries_per_draw, sim_options), f, sort_keys=True)
+    remove_stale_shard_files(output_file_name)
+    print('simulating %d hands in %d shards, with %d workers. Base seed %d' % (sample_size, shards, workers, base_seed))
+    shard_tasks = []
+    for shard in range(shards):
+        shard_tasks.append((shard, shard_samples[shard], base_seed, tries_per_draw, output_file_name, sim_options))
+
+    start_time = time.time()
+    pool = multiprocessing.Pool(workers)
+    shard_outputs = pool.map(generate_shard, shard_tasks, chunksize=1)
+    pool.close()
+    pool.join()
+    print('%d shards took %.1f seconds' % (shards, time.time() - start_time))
+
+    if merge:
+        with open(output_file_name, 'w') as output_file:
+            for shard_output in shard_outputs:
+                with open(shard_output, 'r') as shard_file:
+                    for line in shard_file:
+                        output_file.write(line)
+        print('merged %d shards into %s' % (shards, output_file_name))
+
 if __name__ == '__main__':
-    # TODO: Set from command line
-    samples = 50000
-    tries_per_draw = 1000 
+    parser = argparse.ArgumentParser(description='Simulate all 32 draws for random video poker hands. Save average values to CSV.')
+    parser.add_argument('output', nargs='?', default=None, help='output CSV')
+    parser.add_argument('-samples', '--samples', type=int, default=50000, help='how many hands to simulate?')
+    parser.add_argument('-tries_per_draw', '--tries_per_draw', type=int, default=1000, help='how many tries for each draw?')
+    parser.add_argument('--vectorized', action='store_true', help='simulate all draws at once, with numpy')
+    parser.add_argument('--exact', action='store_true', help='enumerate all draws, for exact values')
+    parser.add_argument('--common_random_numbers', action='store_true', help='share samples between draws (vectorized)')
+    parser.add_argument('--adaptive', action='store_true', help='race draws, spend samples on the best draws')
+    parser.add_argument('--importance', action='store_true', help='importance sampling for rare hands (no royal multiplier)')
+    parser.add_argument('-workers', '--workers', type=int, default=0, help='simulate with a pool of N processes, output to per-shard CSVs')
+    parser.add_argument('-shards', '--shards', type=int, default=None, help='how many shards? (default: one per worker)')
+    parser.add_argument('-seed', '--seed', type=int, default=None, help='base random seed (sharded or not), to reproduce a run. Sharded runs resume with seed from manifest')
+    parser.add_argument('--merge', action='store_true', help='merge shards into output CSV, in shard order')
+    args = parser.parse_args()
+
+    samples = args.samples
+    tries_per_draw = args.tries_per_draw
 
     # default 
     output_file_name = '%d_full_sim_samples.csv' % samples
 
     # Output filename if given
-    # TODO: set via command line flagz
-    if len(sys.argv) >= 2:
-        filename = sys.argv[1]
-        output_file_name = filename
+    if args.output:
+        output_file_name = args.output
 
     print('will save %d lines to %s' % (samples, output_file_name))
 
-    # TODO: Take num samples from command line.
-    generated_cases(sample_size=samples, tries_per_draw=tries_per_draw, output_file_name=output_file_name)
+    sim_options = {'vectorized': args.vectorized, 'exact': args.exact, 'common_random_numbers': args.common_random_numbers,
+                   'adaptive': args.adaptive, 'importance': args.importance}
+    if args.workers:
+        generated_cases_sharded(sample_size=samples, tries_per_draw=tries_per_draw, output_file_name=output_file_name,
+                                workers=args.workers, shards=args.shards, base_seed=args.seed, merge=args.merge, sim_options=sim_options)
+    else:
+        rng = PokerRandom(args.seed) if args.seed is not None else None
+        generated_cases(sample_size=samples, tries_per_draw=tries_per_draw, output_file_name=output_file_name, rng=rng, **sim_options)
@@ -49,13 +49,13 @@ def output_full_sim_csv(poker_hand, result, category_values, header_map, sample_
 # A. Create deck 
 # B. Fix preflop cards we need
 # C. Empty board, preflop hand
-# D. 1000x times: deal a board, simulate allin value, save, backup & shuffle
+# D. 1000x times: deal a board, compute (exact) allin value, save, backup & shuffle
 # NOTE: Simulation takes place on the river. We want a histogram of how (preflop) hand performs over different board runouts.
-def collect_river_values(sample_size=1000, tries_per_draw=1000, csv_writer=None):
+def collect_river_values(sample_size=1000, tries_per_draw=1000, csv_writer=None, rng=None):
     
     print('\n-- Dealing out fixed hand %s --\n' % 'JsTs')
 
-    deck = PokerDeck(shuffle=True)
+    deck = BitmaskPokerDeck(shuffle=True, rng=rng)
     # Now fix the top of the deck, for cards we need...
     c1 = deck.remove_card(Card(suit=SPADE, value=Jack))
     c2 = deck.remove_card(Card(suit=SPADE, value=Ten))
@@ -67,9 +67,6 @@ def collect_river_values(sample_size=1000, tries_per_draw=1000, csv_writer=None)
     deal_cards = [c1, c2]            
     holdem_hand.deal(deal_cards)
 
-    # Our phantom opponent. Don't give him cards yet.
-    opponent_hand = HoldemHand(community = community_hand)
-    
     # OK, now we have the hand, and the deck.
     # Deal to river, evaluate, record, rewind, repeat.
     river_averages = []
@@ -84,52 +81,20 @@ def collect_river_values(sample_size=1000, tries_per_draw=1000, csv_writer=None)
         holdem_hand.evaluate()
         print(holdem_hand)
 
-        hand_results = []
-        category_results = [0.0 for category in HIGH_HAND_CATEGORIES]
-        for i in range(tries_per_draw):
-            #print('\nrewind (%s)...\n' % i)
-
-            # Return opponent cards, and river/turn cards if needed (default is full boards)
-            community_hand.rewind(deck=deck, round=dealer_round)
-            deck.return_cards(opponent_hand.dealt_cards, shuffle=False)
-            deck.shuffle()
-
-            # Deal to the end of the hand, and evaluate.
-            community_hand.deal(deck=deck, runway=True)
-            holdem_hand.evaluate()
+        # On the river, value vs random hand is exact: enumerate all (at most 990) opponent hands.
+        equity = holdem_equity(holdem_hand.dealt_cards, community_hand.cards(), oppn_cards=None, num_samples=tries_per_draw,
+                               sampling=SAMPLING_STRATIFIED, rng=deck.rng)
 
-            # Deal a random opponent hand. See how we compare
-            opponent_hand = HoldemHand(cards = deck.deal(2), community = community_hand)
-            opponent_hand.evaluate()
-        
-            #print(holdem_hand)
-            #print('\tvs')
-            #print(opponent_hand)
-
-            if holdem_hand.rank > opponent_hand.rank:
-                result = 0.0
-            elif holdem_hand.rank < opponent_hand.rank:
-                result = 1.0
-            else:
-                result = 0.5
-            hand_results.append(result)
-
-            # Record the category of our hand
-            category = holdem_hand.category
-            category_index = high_hand_categories_index[category]
-            category_results[category_index] += 1.0
-        
         # We finished given flop. Display, save.
-        print('--> Average values: %.4f %s' % (np.mean(hand_results), hand_results[0:10]))
+        print('--> Average values: %.4f %s' % (equity.value, equity))
 
-        #print((str(holdem_hand), np.mean(hand_results), [[categoryName[category], category_results[high_hand_categories_index[category]] / tries_per_draw] for category in HIGH_HAND_CATEGORIES]))
-        average_result = np.mean(hand_results)
-        category_values = [[category, category_results[high_hand_categories_index[category]] / tries_per_draw] for category in HIGH_HAND_CATEGORIES]
+        average_result = equity.value
+        category_values = [[category, equity.category_values[high_hand_categories_index[category]]] for category in HIGH_HAND_CATEGORIES]
 
         # TODO: Save to disk! 
         if csv_writer:
             hand_csv_row = output_full_sim_csv(poker_hand=holdem_hand, result=average_result, category_values=category_values, 
-                                               header_map=csv_header_map, sample_size=tries_per_draw)
+                                               header_map=csv_header_map, sample_size=equity.sample_size)
             csv_writer.writerow(hand_csv_row)
         
 
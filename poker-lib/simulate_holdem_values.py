@@ -55,11 +55,15 @@ def output_full_sim_csv(poker_hand, result, category_values, header_map, sample_
 # B. Deal a flop, turn or river if that depth is required.
 # C. Deal the rest of the hands X times, including random opponent hand, and collect the average.
 # D. Output value of best average.
-def game_full_sim(round, tries_per_draw, dealer_round=random.choice(list(HOLDEM_ROUNDS_SET))): #PREFLOP_ROUND):
+# dealer_round = None picks a random round (from rng).
+def game_full_sim(round, tries_per_draw, dealer_round=None, sampling=SAMPLING_STRATIFIED, rng=None): #PREFLOP_ROUND):
+    rng = poker_random(rng)
+    if dealer_round is None:
+        dealer_round = rng.random.choice(sorted(HOLDEM_ROUNDS_SET))
 
     print('\n-- New Round %d --\n' % round)
 
-    deck = PokerDeck(shuffle=True)
+    deck = BitmaskPokerDeck(shuffle=True, rng=rng)
     #print(deck)
     community_hand = HoldemCommunityHand()
     holdem_hand = HoldemHand(community = community_hand)
@@ -71,61 +75,19 @@ def game_full_sim(round, tries_per_draw, dealer_round=random.choice(list(HOLDEM_
     community_hand.rewind(deck=deck, round=dealer_round)
     print(holdem_hand)
 
-    # Our phantom opponent. Don't give him cards yet.
-    opponent_hand = HoldemHand(community = community_hand)
+    # Deal to the end of the hand, and a random opponent hand, tries_per_draw times. See how we compare.
+    # All at once, with int arrays (see holdem_equity)
+    equity = holdem_equity(holdem_hand.dealt_cards, community_hand.cards(), oppn_cards=None, num_samples=tries_per_draw, sampling=sampling, rng=deck.rng)
+    category_values = [[category, equity.category_values[high_hand_categories_index[category]]] for category in HIGH_HAND_CATEGORIES]
 
-    hand_results = []
-    category_results = [0.0 for category in HIGH_HAND_CATEGORIES]
-    for i in range(tries_per_draw):
-        #print('\nrewind (%s)...\n' % i)
-        community_hand.rewind(deck=deck, round=dealer_round)
-        deck.return_cards(opponent_hand.dealt_cards, shuffle=False)
-        deck.shuffle()
-        
-        # Deal to the end of the hand, and evaluate.
-        community_hand.deal(deck=deck, runway=True)
-        holdem_hand.evaluate()
-
-        # Deal a random opponent hand. See how we compare
-        opponent_hand = HoldemHand(cards = deck.deal(2), community = community_hand)
-        opponent_hand.evaluate()
-
-        # TODO: Count winners & losers...
-        if holdem_hand.rank > opponent_hand.rank:
-            #print(holdem_hand)
-            #print('\tloser')
-            #print(opponent_hand)
-            result = 0.0
-        elif holdem_hand.rank < opponent_hand.rank:
-            #print(holdem_hand)
-            #print('\twinner')
-            #print(opponent_hand)
-            result = 1.0
-        else:
-            #print(holdem_hand)
-            #print('\ttie-die')
-            #print(opponent_hand)
-            result = 0.5
-        hand_results.append(result)
-        #print('ave result: %.3f' % np.mean(hand_results))
-
-        # Record the category of our hand
-        category = holdem_hand.category
-        category_index = high_hand_categories_index[category]
-        category_results[category_index] += 1.0
-
-    print('\nrewind (%s)...\n' % i)
-    community_hand.rewind(deck=deck, round=dealer_round)
     print(holdem_hand)
-
-    print('final results vs random hand %.4f' % np.mean(hand_results))
-    print[[categoryName[category], category_results[high_hand_categories_index[category]] / tries_per_draw] for category in HIGH_HAND_CATEGORIES] 
-    #print([cat_result / tries_per_draw for cat_result in category_results])
+    print('final results vs random hand %.4f' % equity.value)
+    print([[categoryName[category], value] for (category, value) in category_values])
 
     #sys.exit(-1)
 
     # Return the hand (including community cards link), average value against random hand, and average results for all categories...
-    return (holdem_hand, np.mean(hand_results), [[category, category_results[high_hand_categories_index[category]] / tries_per_draw] for category in HIGH_HAND_CATEGORIES])
+    return (holdem_hand, equity.value, category_values)
 
     """
     # Now, have the hand simulate simulate every possible draw, and record results.
@@ -143,7 +105,8 @@ def game_full_sim(round, tries_per_draw, dealer_round=random.choice(list(HOLDEM_
 
 
 # Play a number of hands. For each hand, try every possible draw X times, save as output
-def generated_cases(sample_size, tries_per_draw, output_file_name):
+def generated_cases(sample_size, tries_per_draw, output_file_name, rng=None):
+    rng = poker_random(rng)
     round = 0
     start_time = time.time()
     short_results = []
@@ -157,7 +120,7 @@ def generated_cases(sample_size, tries_per_draw, output_file_name):
         csv_writer = None
 
     while round < sample_size:
-        hand, average_result, category_values = game_full_sim(round, tries_per_draw, dealer_round=random.choice(list(HOLDEM_ROUNDS_SET)))
+        hand, average_result, category_values = game_full_sim(round, tries_per_draw, rng=rng)
         short_results.append([hand_string(hand.dealt_cards), average_result])
 
         # Save hand to CSV, if output supplied.